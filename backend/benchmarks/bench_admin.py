@@ -0,0 +1,64 @@
+"""
+Time the admin changelists on a seeded shop.
+
+Loads users, sweets and orders with seed_shop, signs in a superuser and
+fetches each changelist page a few times, printing the timings and the
+number of queries per page.
+
+    python -m benchmarks.bench_admin --orders 1000000
+"""
+import argparse
+
+from benchmarks.common import benchmark_database, print_timings, setup_django, time_calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=10_000)
+    parser.add_argument('--sweets', type=int, default=100_000)
+    parser.add_argument('--orders', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext, override_settings
+    from django.urls import reverse
+    from django.utils import timezone
+    from shop.models import Sweet, User
+    from shop.seeding import seed_shop
+
+    with benchmark_database(), override_settings(ALLOWED_HOSTS=['*']):
+        print(f'Seeding {args.users} users, {args.sweets} sweets and {args.orders} orders...')
+        seed_shop(args.users, args.sweets, args.orders)
+        admin = User.objects.create_superuser(
+            username='bench-admin', email='bench-admin@example.com', first_name='Admin', password='x'
+        )
+        client = Client()
+        client.force_login(admin)
+
+        today = timezone.localdate()
+        buyer = User.objects.filter(role='user').order_by('pk').values_list('email', flat=True).first()
+        sweet_word = Sweet.objects.order_by('pk').values_list('name', flat=True).first().split()[0]
+        orders = reverse('admin:shop_order_changelist')
+        sweets = reverse('admin:shop_sweet_changelist')
+        pages = [
+            ('orders', orders, {}),
+            ('orders page 100', orders, {'p': 100}),
+            ('orders this month', orders, {'created_at__year': today.year, 'created_at__month': today.month}),
+            ('orders by buyer email', orders, {'q': buyer}),
+            ('orders by sweet name', orders, {'q': sweet_word}),
+            ('sweets', sweets, {}),
+            ('sweets search', sweets, {'q': sweet_word}),
+            ('users', reverse('admin:shop_user_changelist'), {}),
+        ]
+        for label, url, params in pages:
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get(url, params)
+            assert response.status_code == 200, (label, response.status_code)
+            print_timings(f'{label} ({len(queries)} queries)', time_calls(lambda: client.get(url, params), args.repeat))
+
+
+if __name__ == '__main__':
+    main()
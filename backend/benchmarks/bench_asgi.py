@@ -0,0 +1,129 @@
+"""
+WSGI thread pool versus the ASGI application with many slow clients.
+
+Every simulated client holds its connection for --client-delay seconds
+after the response is ready, like a mobile client on a slow link. A
+WSGI worker thread is stuck for that time; an ASGI coroutine is not.
+Both handlers run in this process, no HTTP server is involved.
+
+    python -m benchmarks.bench_asgi --clients 500 --threads 16
+"""
+import argparse
+import asyncio
+import io
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import benchmark_database, percentile, setup_django
+
+
+PATHS = {
+    'wsgi': '/api/sweets/',
+    'asgi': '/api/async/sweets/',
+}
+QUERY = 'page_size=20'
+
+
+def seed(count):
+    from shop.models import Sweet
+    Sweet.objects.bulk_create([Sweet(name=f'Sweet {i}', price=10, quantity=100) for i in range(count)])
+
+
+def report(label, started, finished, peak_threads):
+    # Every client arrives at `started`, so queueing counts as latency
+    timings = [at - started for at in finished]
+    elapsed = max(finished) - started
+    print(
+        f'{label:<28} {len(timings) / elapsed:8.0f} req/s   '
+        f'p50 {percentile(timings, 50) * 1000:8.1f} ms   '
+        f'p95 {percentile(timings, 95) * 1000:8.1f} ms   '
+        f'threads {peak_threads}'
+    )
+
+
+def run_wsgi(clients, threads, delay):
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.db import connections
+    application = WSGIHandler()
+    peak = [threading.active_count()]
+
+    def request(_):
+        environ = {
+            'REQUEST_METHOD': 'GET', 'PATH_INFO': PATHS['wsgi'], 'QUERY_STRING': QUERY,
+            'SERVER_NAME': 'testserver', 'SERVER_PORT': '80', 'HTTP_HOST': 'testserver',
+            'SERVER_PROTOCOL': 'HTTP/1.1', 'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr,
+            'wsgi.url_scheme': 'http', 'wsgi.multithread': True, 'wsgi.multiprocess': False,
+        }
+        result = application(environ, lambda status, headers: None)
+        try:
+            b''.join(result)
+            time.sleep(delay)  # The slow client keeps this thread busy
+        finally:
+            result.close()
+        peak[0] = max(peak[0], threading.active_count())
+        return time.perf_counter()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        finished = list(pool.map(request, range(clients)))
+        pool.map(lambda _: connections.close_all(), range(threads))
+    report(f'wsgi, {threads} threads', started, finished, peak[0])
+
+
+def run_asgi(clients, delay, path):
+    from django.core.asgi import get_asgi_application
+    application = get_asgi_application()
+    peak = [threading.active_count()]
+
+    async def request():
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': QUERY.encode(),
+            'headers': [(b'host', b'testserver')], 'server': ('testserver', 80), 'client': ('127.0.0.1', 0),
+        }
+
+        async def receive():
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+        async def send(message):
+            if message['type'] == 'http.response.body' and not message.get('more_body'):
+                await asyncio.sleep(delay)  # The slow client only parks this coroutine
+
+        await application(scope, receive, send)
+        peak[0] = max(peak[0], threading.active_count())
+        return time.perf_counter()
+
+    async def main():
+        return await asyncio.gather(*(request() for _ in range(clients)))
+
+    started = time.perf_counter()
+    finished = asyncio.run(main())
+    report(f'asgi, {path}', started, finished, peak[0])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--clients', type=int, default=500)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--client-delay', type=float, default=0.5)
+    parser.add_argument('--sweets', type=int, default=500)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.test.utils import override_settings
+
+    # Measure real reads rather than cached responses
+    with benchmark_database(), override_settings(CATALOG_CACHE_ENABLED=False, ALLOWED_HOSTS=['testserver']):
+        seed(args.sweets)
+        print(f'{args.clients} concurrent clients, {args.client_delay * 1000:.0f} ms client delay, '
+              f'GET ?{QUERY}\n')
+        run_wsgi(args.clients, args.threads, args.client_delay)
+        run_asgi(args.clients, args.client_delay, PATHS['asgi'])
+        # Sync views still work under ASGI, but each one borrows a thread
+        run_asgi(args.clients, args.client_delay, PATHS['wsgi'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Selling out one hot sweet, with and without flash-sale mode.
+
+--threads buyers purchase one unit at a time of a sweet with --stock
+units until they see it sold out, once as a regular sweet and once with
+flash_sale set. Regular purchases retry on "database is locked" (500);
+flash-sale purchases are committed in batches by one thread, and every
+request past the stock is rejected in memory. The script checks that
+orders match the stock in both runs.
+
+    python -m benchmarks.bench_flash_sale --threads 16 --stock 2000
+"""
+import argparse
+import collections
+import logging
+import threading
+import time
+
+from benchmarks.common import benchmark_database, percentile, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--stock', type=int, default=2000)
+    parser.add_argument('--late-requests', type=int, default=20,
+                        help='purchases each buyer sends after the sweet sold out')
+    args = parser.parse_args()
+
+    setup_django()
+    # Sold-out 400s are the expected outcome here, not worth a log line each
+    logging.getLogger('django.request').setLevel(logging.ERROR)
+    from django.db import connection, connections
+    from django.test import Client
+    from django.test.utils import override_settings
+    from shop.authentication import ShopRefreshToken
+    from shop.models import Order, Sweet, User
+
+    with benchmark_database(), override_settings(ALLOWED_HOSTS=['*']):
+        buyer = User.objects.create_user(username='buyer', email='buyer@example.com', first_name='Buyer')
+        token = str(ShopRefreshToken.for_user(buyer).access_token)
+        print(f'{connection.vendor}, {args.threads} threads, {args.stock} units\n')
+
+        for flash_sale in (False, True):
+            sweet = Sweet.objects.create(name=f'Hot Sweet {flash_sale}', price=10, quantity=args.stock,
+                                         flash_sale=flash_sale)
+            url = f'/api/sweets/{sweet.pk}/purchase/'
+            lock = threading.Lock()
+            timings = collections.defaultdict(list)
+            statuses = collections.Counter()
+
+            def worker():
+                client = Client(raise_request_exception=False, HTTP_AUTHORIZATION=f'Bearer {token}')
+                local = collections.defaultdict(list)
+                counts = collections.Counter()
+                late = 0
+                try:
+                    while late < args.late_requests:
+                        started = time.perf_counter()
+                        response = client.post(url, {'quantity': 1}, content_type='application/json')
+                        elapsed = time.perf_counter() - started
+                        counts[response.status_code] += 1
+                        if response.status_code == 200:
+                            local['sold'].append(elapsed)
+                        elif response.status_code == 400:
+                            local['sold out'].append(elapsed)
+                            late += 1
+                finally:
+                    connections.close_all()
+                with lock:
+                    for kind, values in local.items():
+                        timings[kind].extend(values)
+                    statuses.update(counts)
+
+            started = time.perf_counter()
+            threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+
+            sold = Order.objects.filter(sweet=sweet).count()
+            remaining = Sweet.objects.get(pk=sweet.pk).quantity
+            codes = ', '.join(f'{code}: {count}' for code, count in sorted(statuses.items()))
+            print(f'{"flash sale" if flash_sale else "regular"}: sold out in {elapsed:.2f} s '
+                  f'({codes}), consistent: {sold == args.stock and remaining == 0}')
+            for kind, values in sorted(timings.items()):
+                print(
+                    f'  {kind:<9} {len(values) / elapsed:8.0f} req/s   '
+                    f'p50 {percentile(values, 50) * 1000:7.1f} ms   p99 {percentile(values, 99) * 1000:7.1f} ms'
+                )
+            print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,246 @@
+"""
+End-to-end load test of the API with a mixed workload.
+
+Seeds --sweets sweets, --users users and --orders orders into its own
+scratch database, SCRATCH_DATABASE, with shop.seeding (as `manage.py
+seed_shop` does). Then it drives a mix of browse, search, purchase,
+restock and order-history requests through the whole Django stack, once
+per --concurrency level, for --duration seconds each. For every request
+kind it reports requests/sec, p50/p95/p99 latency and SQL queries per
+request.
+
+--save writes the results as JSON; --baseline compares this run with a
+saved one and exits non-zero when a kind got slower or issues more
+queries by more than --tolerance. `manage.py bench_load` runs the same
+benchmark.
+
+    python -m benchmarks.bench_load --sweets 100000 --orders 1000000 --users 10000 --save baseline.json
+    python manage.py bench_load --sweets 100000 --orders 1000000 --users 10000 --baseline baseline.json
+"""
+import argparse
+import collections
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import threading
+import time
+
+from benchmarks.common import benchmark_database, percentile, setup_django
+
+
+DEFAULT_MIX = 'browse=40,search=20,purchase=20,restock=5,orders=15'
+# Not the test database, so the benchmark can run while the tests do
+SCRATCH_DATABASE = 'bench_load_db.sqlite3'
+PAGE_SIZE = 20
+BUYERS = 100
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        kind, _, weight = part.partition('=')
+        if kind not in ('browse', 'search', 'purchase', 'restock', 'orders'):
+            raise argparse.ArgumentTypeError(f'unknown request kind: {kind}')
+        mix[kind] = float(weight)
+    return mix
+
+
+def run(concurrency, duration, mix, admin_token, buyer_tokens, sweet_pks, seed_value):
+    """
+    Drive the mix with `concurrency` threads; return {kind: [(seconds, queries, status)]}.
+    """
+    from django.db import connections
+    from django.test import Client
+    from shop.seeding import CATEGORY_WEIGHTS, FLAVOURS, SWEETS
+
+    words = [word.lower() for word in FLAVOURS + SWEETS]
+    categories = list(CATEGORY_WEIGHTS)
+
+    kinds, weights = zip(*mix.items())
+    deadline = time.perf_counter() + duration
+    lock = threading.Lock()
+    samples = collections.defaultdict(list)
+
+    def request(rng, kind, client, admin_client):
+        pk = rng.choice(sweet_pks)
+        # Reads ask for one page, like a client scrolling the catalog
+        if kind == 'browse':
+            if rng.random() < 0.5:
+                return client.get(f'/api/sweets/{pk}/')
+            return client.get('/api/sweets/', {'page_size': PAGE_SIZE})
+        if kind == 'search':
+            return client.get('/api/sweets/search/', {
+                'q': rng.choice(words), 'category': rng.choice(categories), 'page_size': PAGE_SIZE
+            })
+        if kind == 'orders':
+            return client.get('/api/orders/my/', {'page_size': PAGE_SIZE})
+        if kind == 'purchase':
+            return client.post(f'/api/sweets/{pk}/purchase/', {'quantity': 1}, content_type='application/json')
+        return admin_client.post(f'/api/sweets/{pk}/restock/', {'quantity': 1}, content_type='application/json')
+
+    def worker(index):
+        rng = random.Random(seed_value + index)
+        client = Client(raise_request_exception=False,
+                        HTTP_AUTHORIZATION=f'Bearer {buyer_tokens[index % len(buyer_tokens)]}')
+        admin_client = Client(raise_request_exception=False, HTTP_AUTHORIZATION=f'Bearer {admin_token}')
+        local = collections.defaultdict(list)
+        try:
+            while time.perf_counter() < deadline:
+                kind = rng.choices(kinds, weights)[0]
+                for conn in connections.all():
+                    conn.force_debug_cursor = True
+                    conn.queries_log.clear()
+                started = time.perf_counter()
+                response = request(rng, kind, client, admin_client)
+                elapsed = time.perf_counter() - started
+                queries = sum(len(conn.queries_log) for conn in connections.all())
+                local[kind].append((elapsed, queries, response.status_code))
+        finally:
+            connections.close_all()
+        with lock:
+            for kind, values in local.items():
+                samples[kind].extend(values)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples
+
+
+def summarize(samples, duration):
+    results = {}
+    for kind, values in sorted(samples.items()):
+        timings = [elapsed for elapsed, _, _ in values]
+        results[kind] = {
+            'requests': len(values),
+            'rps': round(len(values) / duration, 1),
+            'p50_ms': round(percentile(timings, 50) * 1000, 2),
+            'p95_ms': round(percentile(timings, 95) * 1000, 2),
+            'p99_ms': round(percentile(timings, 99) * 1000, 2),
+            'queries': round(sum(queries for _, queries, _ in values) / len(values), 2),
+            'errors': sum(1 for _, _, code in values if code >= 400),
+        }
+    return results
+
+
+def print_results(concurrency, results):
+    print(f'concurrency {concurrency}')
+    for kind, row in results.items():
+        print(
+            f'  {kind:<9} {row["rps"]:8.1f} req/s   p50 {row["p50_ms"]:7.1f} ms   '
+            f'p95 {row["p95_ms"]:7.1f} ms   p99 {row["p99_ms"]:7.1f} ms   '
+            f'{row["queries"]:5.1f} queries   {row["errors"]} errors'
+        )
+    print()
+
+
+def compare(baseline, current, tolerance):
+    """
+    Print the change of each measurement against the baseline and return
+    the number of regressions: p95 or queries up, or requests/sec down, by
+    more than `tolerance`.
+    """
+    regressions = 0
+    print(f'compared with baseline from {baseline["meta"]["created"]}')
+    for concurrency, kinds in current['runs'].items():
+        for kind, row in kinds.items():
+            old = baseline['runs'].get(concurrency, {}).get(kind)
+            if old is None:
+                continue
+            changes = []
+            for field, worse_when_higher in (('p95_ms', True), ('rps', False), ('queries', True)):
+                before, after = old[field], row[field]
+                change = (after - before) / before if before else 0.0
+                regressed = change > tolerance if worse_when_higher else change < -tolerance
+                regressions += regressed
+                changes.append(f'{field} {before:g} -> {after:g} ({change:+.0%}){" REGRESSION" if regressed else ""}')
+            print(f'  c={concurrency:<3} {kind:<9} ' + '   '.join(changes))
+    return regressions
+
+
+def add_arguments(parser):
+    parser.add_argument('--sweets', type=int, default=10_000)
+    parser.add_argument('--orders', type=int, default=100_000)
+    parser.add_argument('--users', type=int, default=1_000)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 8])
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX,
+                        help=f'request kinds and weights (default {DEFAULT_MIX})')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--save', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='compare with results saved by --save')
+    parser.add_argument('--tolerance', type=float, default=0.10)
+
+
+def benchmark(options):
+    """
+    Run the benchmark with parsed `options` in a configured Django.
+    Returns the number of regressions against --baseline.
+    """
+    # Expected 4xx (e.g. sold out) are counted as errors, not logged one by one
+    logging.getLogger('django.request').setLevel(logging.CRITICAL)
+    import django
+    from django.db import connection
+    from django.test.utils import override_settings
+    from shop.authentication import ShopRefreshToken
+    from shop.models import Sweet, User
+    from shop.seeding import seed_shop
+
+    mix = options.mix
+    rng = random.Random(options.seed)
+    with benchmark_database(SCRATCH_DATABASE), override_settings(ALLOWED_HOSTS=['*']):
+        started = time.perf_counter()
+        admin = seed_shop(options.users, options.sweets, options.orders, seed=options.seed)
+        # Purchases measure the buying path, not sold-out rejections
+        Sweet.objects.update(quantity=1_000_000)
+        sweet_pks = list(Sweet.objects.values_list('pk', flat=True))
+        user_pks = list(User.objects.filter(role='user').values_list('pk', flat=True))
+        buyers = User.objects.filter(pk__in=rng.sample(user_pks, min(len(user_pks), BUYERS)))
+        print(f'seeded {options.sweets} sweets, {options.users} users, {options.orders} orders '
+              f'in {time.perf_counter() - started:.1f} s ({connection.vendor})\n')
+        admin_token = str(ShopRefreshToken.for_user(admin).access_token)
+        buyer_tokens = [str(ShopRefreshToken.for_user(buyer).access_token) for buyer in buyers]
+
+        current = {
+            'meta': {
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'sweets': options.sweets, 'users': options.users, 'orders': options.orders,
+                'duration': options.duration, 'mix': mix, 'seed': options.seed,
+                'database': connection.vendor, 'python': platform.python_version(),
+                'django': django.get_version(), 'cpus': os.cpu_count(),
+            },
+            'runs': {},
+        }
+        for concurrency in options.concurrency:
+            samples = run(concurrency, options.duration, mix, admin_token, buyer_tokens, sweet_pks, options.seed)
+            current['runs'][str(concurrency)] = summarize(samples, options.duration)
+            print_results(concurrency, current['runs'][str(concurrency)])
+
+    if options.save:
+        with open(options.save, 'w') as f:
+            json.dump(current, f, indent=2)
+        print(f'saved results to {options.save}')
+    if options.baseline:
+        with open(options.baseline) as f:
+            baseline = json.load(f)
+        return compare(baseline, current, options.tolerance)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    setup_django()
+    if benchmark(args):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
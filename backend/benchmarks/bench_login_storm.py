@@ -0,0 +1,104 @@
+"""
+Catalog latency during a login storm.
+
+Measures GET /api/sweets/ while many threads hammer the login endpoint,
+once with the bounded hashing pool and once with a pool as wide as the
+storm, which behaves like hashing inline on every request thread.
+
+    python -m benchmarks.bench_login_storm --storm-threads 32
+"""
+import argparse
+import collections
+import threading
+
+from benchmarks.common import benchmark_database, print_timings, setup_django, time_calls
+
+
+PASSWORD = 'StormPass123!'
+
+
+def seed(users, sweets):
+    from django.contrib.auth.hashers import make_password
+    from shop.models import Sweet, User
+    password = make_password(PASSWORD)
+    User.objects.bulk_create([
+        User(username=f'storm{i}', email=f'storm{i}@example.com', first_name='Storm', password=password)
+        for i in range(users)
+    ])
+    Sweet.objects.bulk_create([Sweet(name=f'Sweet {i}', price=10, quantity=100) for i in range(sweets)])
+
+
+def storm(threads, users, stop, statuses):
+    """
+    Start `threads` clients logging in until `stop` is set.
+    """
+    from django.db import connections
+    from django.test import Client
+
+    lock = threading.Lock()
+
+    def worker(index):
+        client = Client()
+        attempt = 0
+        try:
+            while not stop.is_set():
+                email = f'storm{(index + attempt * threads) % users}@example.com'
+                response = client.post('/api/auth/login/', {'email': email, 'password': PASSWORD},
+                                       content_type='application/json')
+                with lock:
+                    statuses[response.status_code] += 1
+                attempt += 1
+        finally:
+            connections.close_all()
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    for thread in workers:
+        thread.start()
+    return workers
+
+
+def measure(label, repeat, storm_threads=0, users=1):
+    from django.test import Client
+    client = Client()
+    stop = threading.Event()
+    statuses = collections.Counter()
+    workers = storm(storm_threads, users, stop, statuses) if storm_threads else []
+    try:
+        timings = time_calls(lambda: client.get('/api/sweets/'), repeat)
+    finally:
+        stop.set()
+        for thread in workers:
+            thread.join()
+    print_timings(label, timings)
+    if statuses:
+        print(f'{"":<32} logins: ' + ', '.join(f'{code}: {count}' for code, count in sorted(statuses.items())))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--storm-threads', type=int, default=32)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--sweets', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.test.utils import override_settings
+
+    # Measure the real list query, not cached responses
+    with benchmark_database(), override_settings(CATALOG_CACHE_ENABLED=False, ALLOWED_HOSTS=['*']):
+        seed(args.users, args.sweets)
+        print(f'{args.sweets} sweets, {args.storm_threads} login threads\n')
+
+        measure('catalog, idle', args.repeat)
+        measure(
+            f'catalog, bounded pool ({settings.PASSWORD_HASHING_WORKERS}+{settings.PASSWORD_HASHING_QUEUE})',
+            args.repeat, args.storm_threads, args.users
+        )
+        with override_settings(PASSWORD_HASHING_WORKERS=args.storm_threads):
+            measure('catalog, unbounded hashing', args.repeat, args.storm_threads, args.users)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Reservation and confirm throughput under contention.
+
+--threads clients hammer --sweets hot sweets for --duration seconds.
+Each iteration reserves one unit and confirms the hold, or (with
+probability --direct-ratio) buys one unit without a hold. At the end the
+script checks that no sweet was oversold. Run it per DB profile:
+
+    DB_PROFILE=production python -m benchmarks.bench_reservations --threads 8 --sweets 1
+"""
+import argparse
+import collections
+import random
+import threading
+import time
+
+from benchmarks.common import benchmark_database, percentile, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--sweets', type=int, default=1, help='number of hot sweets shared by all clients')
+    parser.add_argument('--stock', type=int, default=1_000_000)
+    parser.add_argument('--direct-ratio', type=float, default=0.2)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.db import connections
+    from django.test import Client
+    from django.test.utils import override_settings
+    from shop.authentication import ShopRefreshToken
+    from shop.models import Order, Reservation, Sweet, User
+
+    with benchmark_database(), override_settings(ALLOWED_HOSTS=['*']):
+        buyer = User.objects.create_user(username='buyer', email='buyer@example.com', first_name='Buyer')
+        token = str(ShopRefreshToken.for_user(buyer).access_token)
+        pks = [sweet.pk for sweet in Sweet.objects.bulk_create([
+            Sweet(name=f'Hot Sweet {i}', price=10, quantity=args.stock) for i in range(args.sweets)
+        ])]
+
+        deadline = time.perf_counter() + args.duration
+        lock = threading.Lock()
+        timings = collections.defaultdict(list)
+        statuses = collections.Counter()
+
+        def worker(seed_value):
+            rng = random.Random(seed_value)
+            client = Client(raise_request_exception=False, HTTP_AUTHORIZATION=f'Bearer {token}')
+            local = collections.defaultdict(list)
+            counts = collections.Counter()
+
+            def post(kind, url, data=None):
+                started = time.perf_counter()
+                response = client.post(url, data or {}, content_type='application/json')
+                local[kind].append(time.perf_counter() - started)
+                counts[kind, response.status_code] += 1
+                return response
+
+            try:
+                while time.perf_counter() < deadline:
+                    pk = rng.choice(pks)
+                    if rng.random() < args.direct_ratio:
+                        post('purchase', f'/api/sweets/{pk}/purchase/', {'quantity': 1})
+                        continue
+                    response = post('reserve', f'/api/sweets/{pk}/reserve/', {'quantity': 1})
+                    if response.status_code == 201:
+                        post('confirm', f'/api/reservations/{response.json()["reservation"]["id"]}/confirm/')
+            finally:
+                connections.close_all()
+            with lock:
+                for kind, values in local.items():
+                    timings[kind].extend(values)
+                statuses.update(counts)
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        profile = settings.DATABASES['default'].get('OPTIONS', {}).get('transaction_mode', 'DEFERRED')
+        print(f'{args.threads} threads, {args.sweets} hot sweet(s), {args.duration:.0f} s, '
+              f'transaction mode {profile}\n')
+        for kind, values in sorted(timings.items()):
+            codes = ', '.join(f'{code}: {count}' for (k, code), count in sorted(statuses.items()) if k == kind)
+            print(
+                f'{kind:<10} {len(values) / args.duration:8.0f} req/s   '
+                f'p50 {percentile(values, 50) * 1000:7.1f} ms   p95 {percentile(values, 95) * 1000:7.1f} ms   '
+                f'p99 {percentile(values, 99) * 1000:7.1f} ms   ({codes})'
+            )
+
+        sold = Order.objects.count()
+        remaining = sum(Sweet.objects.filter(pk__in=pks).values_list('quantity', flat=True))
+        held = Reservation.objects.filter(status='active').count()
+        print(f'\norders {sold}, stock left {remaining}, active holds {held}, '
+              f'consistent: {sold + remaining == args.sweets * args.stock}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Units-sold counter increments on one hot sweet, per shard count.
+
+--threads writers each add to the same sweet's counter in their own
+short transaction for --duration seconds, once per --shards value.
+Shards only help where the database locks rows: SQLite takes one lock
+for the whole file, so expect flat numbers there and a real spread on
+a row-locking backend such as PostgreSQL.
+
+    python -m benchmarks.bench_sales_counters --threads 8 --shards 1 4 16
+"""
+import argparse
+import threading
+import time
+
+from benchmarks.common import benchmark_database, percentile, setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=5)
+    parser.add_argument('--shards', type=int, nargs='+', default=[1, 4, 16])
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import OperationalError, connection, connections, transaction
+    from shop.models import Sweet, SweetSalesCounter
+
+    with benchmark_database():
+        print(f'{connection.vendor}, {args.threads} threads, {args.duration:.0f} s per run\n')
+        for shards in args.shards:
+            sweet = Sweet.objects.create(name=f'Bestseller x{shards}', price=10, quantity=0)
+            deadline = time.perf_counter() + args.duration
+            lock = threading.Lock()
+            timings = []
+            errors = [0]
+
+            def worker():
+                local = []
+                failed = 0
+                try:
+                    while time.perf_counter() < deadline:
+                        started = time.perf_counter()
+                        try:
+                            with transaction.atomic():
+                                SweetSalesCounter.objects.add(sweet.pk, 1, shards)
+                        except OperationalError:
+                            failed += 1
+                            continue
+                        local.append(time.perf_counter() - started)
+                finally:
+                    connections.close_all()
+                with lock:
+                    timings.extend(local)
+                    errors[0] += failed
+
+            threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            assert Sweet.objects.get(pk=sweet.pk).units_sold == len(timings)
+            print(
+                f'{shards:>3} shard(s) {len(timings) / args.duration:8.0f} increments/s   '
+                f'p50 {percentile(timings, 50) * 1000:6.2f} ms   p99 {percentile(timings, 99) * 1000:6.2f} ms   '
+                f'locked {errors[0]}'
+            )
+
+
+if __name__ == '__main__':
+    main()
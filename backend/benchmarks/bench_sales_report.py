@@ -0,0 +1,83 @@
+"""
+Compare a date-range sales report read from the daily rollups with the
+same report aggregated from the orders table.
+
+    python -m benchmarks.bench_sales_report --orders 1000000 --days 365
+"""
+import argparse
+import random
+import time
+from datetime import timedelta
+
+from benchmarks.common import benchmark_database, print_timings, setup_django, time_calls
+
+
+def seed(orders, days, sweets, rng):
+    from django.db import connection, transaction
+    from django.utils import timezone
+    from shop.models import Sweet, User
+
+    buyer = User.objects.create_user(username='buyer', email='buyer@example.com', first_name='Buyer')
+    sweet_rows = [
+        (sweet.pk, sweet.price) for sweet in Sweet.objects.bulk_create([
+            Sweet(name=f'Sweet {i}', price=rng.randint(10, 99), quantity=0,
+                  category=rng.choice(Sweet.CATEGORY_CHOICES)[0])
+            for i in range(sweets)
+        ])
+    ]
+    # Raw inserts, because created_at is auto_now_add
+    first_second = timezone.now() - timedelta(days=days)
+    sql = 'INSERT INTO orders (user_id, sweet_id, quantity, total_price, created_at) VALUES (%s, %s, %s, %s, %s)'
+    with transaction.atomic(), connection.cursor() as cursor:
+        for offset in range(0, orders, 10_000):
+            batch = []
+            for _ in range(min(10_000, orders - offset)):
+                pk, price = rng.choice(sweet_rows)
+                quantity = rng.randint(1, 5)
+                created_at = first_second + timedelta(seconds=rng.randrange(days * 86400))
+                batch.append((buyer.pk, pk, quantity, str(price * quantity), created_at.isoformat(sep=' ')))
+            cursor.executemany(sql, batch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--orders', type=int, default=1_000_000)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--sweets', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db.models import Count, Sum
+    from django.db.models.functions import TruncDate
+    from django.utils import timezone
+    from shop.analytics import rebuild_sales_rollups, sales_report
+    from shop.models import Order
+
+    with benchmark_database():
+        seed(args.orders, args.days, args.sweets, random.Random(42))
+        started = time.perf_counter()
+        sweet_rows, category_rows = rebuild_sales_rollups()
+        print(f'{args.orders} orders over {args.days} days, {args.sweets} sweets')
+        print(f'rebuild_sales_rollups: {sweet_rows} + {category_rows} rows in {time.perf_counter() - started:.1f}s\n')
+
+        end = timezone.localdate()
+        for days in (7, 30, args.days):
+            start = end - timedelta(days=days - 1)
+            orders = Order.objects.filter(created_at__date__range=(start, end))
+
+            def scan_orders():
+                totals = {'units': Sum('quantity'), 'revenue': Sum('total_price'), 'orders': Count('id')}
+                list(orders.values('sweet__category').annotate(**totals).order_by())
+                list(orders.annotate(day=TruncDate('created_at')).values('day').annotate(**totals).order_by('day'))
+
+            print(f'last {days} days')
+            print_timings('  rollups (by category)', time_calls(lambda: sales_report(start, end), args.repeat))
+            print_timings('  rollups (by sweet)', time_calls(
+                lambda: sales_report(start, end, group_by='sweet', limit=50), args.repeat
+            ))
+            print_timings('  orders scan (by category)', time_calls(scan_orders, args.repeat))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Compare the FTS5 search path with the old icontains scan.
+
+    python -m benchmarks.bench_search --sweets 100000
+"""
+import argparse
+import random
+
+from benchmarks.common import benchmark_database, print_timings, setup_django, time_calls
+
+WORDS = [
+    'gulab', 'jamun', 'rasgulla', 'jalebi', 'barfi', 'laddu', 'peda', 'halwa', 'kaju',
+    'katli', 'soan', 'papdi', 'mysore', 'pak', 'sandesh', 'chikki', 'kheer', 'rabri',
+    'malai', 'kesar', 'pista', 'badam', 'coconut', 'rose', 'saffron', 'cardamom',
+    'jaggery', 'ghee', 'milk', 'syrup', 'fried', 'crisp', 'soft', 'festive', 'premium',
+]
+SYLLABLES = ['ka', 'ri', 'mo', 'la', 'shu', 've', 'na', 'ti', 'po', 'dha', 'gu', 'ne', 'sa', 'ru']
+
+
+def make_vocabulary(rng, size=5000):
+    """Common sweet words plus a long tail of rarer synthetic words."""
+    tail = {''.join(rng.choices(SYLLABLES, k=4)) for _ in range(size)}
+    return WORDS + sorted(tail)
+
+
+def seed(count, vocabulary, rng):
+    from shop.models import Sweet
+    batch = []
+    for i in range(count):
+        batch.append(Sweet(
+            name=' '.join(rng.choices(WORDS, k=2)).title() + f' {i}',
+            description=' '.join(rng.choices(vocabulary, k=12)),
+            price=rng.randint(10, 999),
+            quantity=rng.randint(0, 100),
+        ))
+        if len(batch) == 5000:
+            Sweet.objects.bulk_create(batch)
+            batch = []
+    Sweet.objects.bulk_create(batch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sweets', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db.models import Q
+    from shop.models import Sweet
+    from shop.search import full_text_search
+
+    rng = random.Random(42)
+    vocabulary = make_vocabulary(rng)
+    # Common words, two-word queries and rare long-tail words
+    queries = ['gulab', 'kesar pista', 'rose syrup'] + rng.sample(vocabulary[len(WORDS):], 3)
+
+    with benchmark_database():
+        seed(args.sweets, vocabulary, rng)
+        print(f'{args.sweets} sweets, full result set per query (as the unpaginated endpoint returns)\n')
+        for query in queries:
+            fts = full_text_search(Sweet.objects.all(), q=query)
+            scan = Sweet.objects.filter(Q(name__icontains=query) | Q(description__icontains=query))
+            print(f'"{query}": {fts.count()} matches (fts5), {scan.count()} matches (icontains)')
+            print_timings('  fts5', time_calls(lambda: list(fts.all()), args.repeat))
+            print_timings('  icontains', time_calls(lambda: list(scan.all()), args.repeat))
+
+
+if __name__ == '__main__':
+    main()
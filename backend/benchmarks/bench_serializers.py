@@ -0,0 +1,68 @@
+"""
+Rows/sec of the regular serializers versus the fast read path.
+
+    python -m benchmarks.bench_serializers --rows 20000
+"""
+import argparse
+import random
+
+from benchmarks.common import benchmark_database, print_timings, setup_django, time_calls
+
+
+def seed(count):
+    from shop.models import Order, Sweet, User
+    rng = random.Random(42)
+    admin = User.objects.create(username='admin', email='admin@example.com', first_name='Admin', role='admin')
+    buyer = User.objects.create(username='buyer', email='buyer@example.com', first_name='Buyer')
+    sweets = Sweet.objects.bulk_create([
+        Sweet(name=f'Sweet {i}', description='Benchmark sweet', price=rng.randint(10, 999),
+              quantity=rng.randint(0, 100), created_by=admin)
+        for i in range(count)
+    ], batch_size=5000)
+    Order.objects.bulk_create([
+        Order(user=buyer, sweet=rng.choice(sweets), quantity=1, total_price=10)
+        for _ in range(count)
+    ], batch_size=5000)
+    return buyer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=20_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    from rest_framework.renderers import JSONRenderer
+    from shop.fast_serializers import ORDER_COLUMNS, SWEET_COLUMNS, order_rows, sweet_rows
+    from shop.models import Order, Sweet
+    from shop import renderers
+    from shop.renderers import FastJSONRenderer
+    from shop.serializers import OrderSerializer, SweetSerializer
+
+    with benchmark_database():
+        buyer = seed(args.rows)
+        sweets = Sweet.objects.select_related('created_by').with_available()
+        orders = Order.objects.filter(user=buyer).select_related('sweet', 'user')
+
+        cases = {
+            'sweets  serializer + json': lambda: JSONRenderer().render(
+                SweetSerializer(sweets.all(), many=True).data),
+            'sweets  fast rows + fastjson': lambda: FastJSONRenderer().render(
+                sweet_rows(sweets.values_list(*SWEET_COLUMNS))),
+            'orders  serializer + json': lambda: JSONRenderer().render(
+                OrderSerializer(orders.all(), many=True).data),
+            'orders  fast rows + fastjson': lambda: FastJSONRenderer().render(
+                order_rows(orders.values_list(*ORDER_COLUMNS))),
+        }
+        # Without orjson FastJSONRenderer falls back to the standard json encoder
+        encoder = 'orjson' if renderers.orjson is not None else 'json (orjson not installed)'
+        print(f'{args.rows} rows per response (query + serialize + render), fastjson encoder: {encoder}\n')
+        for label, func in cases.items():
+            timings = time_calls(func, args.repeat)
+            print_timings(label, timings)
+            print(f'{"":<32} {args.rows / min(timings):,.0f} rows/sec')
+
+
+if __name__ == '__main__':
+    main()
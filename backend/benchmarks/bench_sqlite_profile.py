@@ -0,0 +1,171 @@
+"""
+Mixed read/purchase throughput of the default and production DB profiles.
+
+Runs the same workload once per DB_PROFILE, each in a fresh process:
+--threads clients for --duration seconds, each request a purchase with
+probability --purchase-ratio and otherwise a sweet detail or list read.
+By default each request runs the queries of the matching view directly;
+--http sends real requests through the whole stack instead, where the
+Python overhead of Django and DRF can hide the database differences.
+
+    python -m benchmarks.bench_sqlite_profile --threads 8 --duration 10
+"""
+import argparse
+import collections
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+
+from benchmarks.common import BACKEND_DIR, benchmark_database, percentile, setup_django
+
+
+PROFILES = ('default', 'production')
+
+
+def seed(sweets):
+    from shop.models import Sweet, User
+    buyer = User.objects.create_user(username='buyer', email='buyer@example.com', first_name='Buyer')
+    pks = [sweet.pk for sweet in Sweet.objects.bulk_create([
+        Sweet(name=f'Sweet {i}', price=10, quantity=1_000_000) for i in range(sweets)
+    ])]
+    return buyer, pks
+
+
+def run_workload(args):
+    """
+    Run the workload in this process and return its measurements.
+    """
+    from django.db import connections, transaction
+    from django.test import Client
+    from shop.authentication import ShopRefreshToken
+    from shop.models import Order, Sweet
+
+    buyer, pks = seed(args.sweets)
+    token = str(ShopRefreshToken.for_user(buyer).access_token)
+    deadline = time.perf_counter() + args.duration
+    lock = threading.Lock()
+    timings = collections.defaultdict(list)
+    errors = collections.Counter()
+
+    def http_request(client, kind, pk):
+        if kind == 'purchase':
+            response = client.post(f'/api/sweets/{pk}/purchase/', {'quantity': 1},
+                                   content_type='application/json')
+        elif kind == 'detail':
+            response = client.get(f'/api/sweets/{pk}/')
+        else:
+            response = client.get('/api/sweets/', {'page_size': 20})
+        return response.status_code < 500
+
+    def orm_request(client, kind, pk):
+        # The queries the views run, without the HTTP and DRF overhead
+        try:
+            if kind == 'purchase':
+                sweet = Sweet.objects.get(pk=pk)
+                with transaction.atomic():
+                    Sweet.objects.decrement_stock(pk, 1)
+                    Order.objects.create(user=buyer, sweet=sweet, quantity=1, total_price=sweet.price)
+                    Sweet.objects.filter(pk=pk).values_list('quantity', flat=True).get()
+            elif kind == 'detail':
+                Sweet.objects.filter(pk=pk).values_list('updated_at', flat=True).first()
+                list(Sweet.objects.select_related('created_by').filter(pk=pk))
+            else:
+                list(Sweet.objects.select_related('created_by')[:21])
+        except Exception:
+            return False
+        finally:
+            # Mirror the end-of-request connection handling of the HTTP path
+            connections['default'].close_if_unusable_or_obsolete()
+        return True
+
+    request = http_request if args.http else orm_request
+
+    def worker(seed_value):
+        rng = random.Random(seed_value)
+        client = Client(raise_request_exception=False, HTTP_AUTHORIZATION=f'Bearer {token}')
+        local = collections.defaultdict(list)
+        failed = collections.Counter()
+        try:
+            while time.perf_counter() < deadline:
+                pk = rng.choice(pks)
+                if rng.random() < args.purchase_ratio:
+                    kind = 'purchase'
+                else:
+                    kind = rng.choice(('detail', 'list'))
+                started = time.perf_counter()
+                ok = request(client, kind, pk)
+                local[kind].append(time.perf_counter() - started)
+                if not ok:
+                    failed[kind] += 1
+        finally:
+            connections.close_all()
+        with lock:
+            for kind, values in local.items():
+                timings[kind].extend(values)
+            errors.update(failed)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return {
+        kind: {
+            'count': len(values),
+            'rps': len(values) / args.duration,
+            'p50': percentile(values, 50),
+            'p95': percentile(values, 95),
+            'errors': errors[kind],
+        }
+        for kind, values in sorted(timings.items())
+    }
+
+
+def child(args):
+    setup_django()
+    from django.test.utils import override_settings
+
+    # Measure the database, not the response cache
+    with benchmark_database(), override_settings(CATALOG_CACHE_ENABLED=False, ALLOWED_HOSTS=['*']):
+        print(json.dumps(run_workload(args)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--purchase-ratio', type=float, default=0.2)
+    parser.add_argument('--sweets', type=int, default=500)
+    parser.add_argument('--http', action='store_true',
+                        help='go through the full HTTP stack instead of running the view queries directly')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return child(args)
+
+    print(f'{args.threads} threads, {args.duration:.0f} s, {args.purchase_ratio:.0%} purchases\n')
+    for profile in PROFILES:
+        output = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.bench_sqlite_profile', '--child', *sys.argv[1:]],
+            cwd=BACKEND_DIR, env={**os.environ, 'DB_PROFILE': profile},
+            capture_output=True, text=True, check=True
+        ).stdout
+        results = json.loads(output.strip().splitlines()[-1])
+        total = sum(result['rps'] for result in results.values())
+        print(f'{profile:<12} {total:8.0f} req/s total')
+        for kind, result in results.items():
+            print(
+                f'  {kind:<10} {result["rps"]:8.0f} req/s   '
+                f'p50 {result["p50"] * 1000:7.1f} ms   p95 {result["p95"] * 1000:7.1f} ms   '
+                f'errors {result["errors"]}'
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Helpers shared by the benchmark scripts.
+
+Benchmarks run against a throwaway database created from the test
+settings, never against db.sqlite3. Run them from the backend directory:
+
+    python -m benchmarks.bench_search
+"""
+import contextlib
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup_django():
+    if str(BACKEND_DIR) not in sys.path:
+        sys.path.insert(0, str(BACKEND_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sweetshop.settings')
+    import django
+    django.setup()
+
+
+@contextlib.contextmanager
+def benchmark_database(name=None):
+    """
+    Create a migrated scratch database for the duration of the block.
+    `name` is a file in the backend directory; by default the test
+    database's, which a test run going on at the same time would clobber.
+    """
+    from django.db import connection
+    test_settings = connection.settings_dict['TEST']
+    test_name = test_settings['NAME']
+    if name is not None:
+        test_settings['NAME'] = BACKEND_DIR / name
+    try:
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            yield connection
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+    finally:
+        test_settings['NAME'] = test_name
+
+
+def time_calls(func, repeat):
+    """
+    Call `func` `repeat` times and return the duration of each call in seconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def percentile(timings, pct):
+    ordered = sorted(timings)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def print_timings(label, timings):
+    print(
+        f'{label:<32} mean {statistics.mean(timings) * 1000:8.2f} ms   '
+        f'p50 {percentile(timings, 50) * 1000:8.2f} ms   '
+        f'p95 {percentile(timings, 95) * 1000:8.2f} ms'
+    )
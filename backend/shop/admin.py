@@ -1,6 +1,61 @@
+from datetime import datetime, timedelta
+
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.db.models import F, Max, Min, Q, QuerySet
+from django.db.models.functions import Lower
+from django.utils import timezone
 from .models import User, Sweet, Order
+from .pagination import EstimatedCountPaginator
+from .search import full_text_search, name_match_ids
+
+
+class IndexedDatesQuerySet(QuerySet):
+    """
+    Changelist queryset for a date_hierarchy over a big table. Django
+    builds the hierarchy with aggregate(Min, Max) and datetimes(), which
+    on SQLite read every row: MIN and MAX in one query skip the index,
+    and datetimes() truncates each row in a Python function. Here each
+    bound, and each year, month or day with rows, is one index seek.
+    """
+    
+    def aggregate(self, *args, **kwargs):
+        if args or not kwargs or not all(
+            type(aggregate) in (Min, Max) and aggregate.filter is None and aggregate.default is None
+            and isinstance(aggregate.source_expressions[0], F)
+            for aggregate in kwargs.values()
+        ):
+            return super().aggregate(*args, **kwargs)
+        
+        result = {}
+        for alias, aggregate in kwargs.items():
+            field_name = aggregate.source_expressions[0].name
+            values = self.filter(**{f'{field_name}__isnull': False}).values_list(field_name, flat=True)
+            result[alias] = values.order_by(field_name if type(aggregate) is Min else f'-{field_name}').first()
+        return result
+    
+    def datetimes(self, field_name, kind, order='ASC', tzinfo=None, **kwargs):
+        if kind not in ('year', 'month', 'day') or order != 'ASC':
+            return super().datetimes(field_name, kind, order, tzinfo, **kwargs)
+        
+        tzinfo = tzinfo or timezone.get_current_timezone()
+        values = self.filter(**{f'{field_name}__isnull': False}).values_list(field_name, flat=True)
+        periods = []
+        value = values.order_by(field_name).first()
+        while value is not None:
+            local = timezone.localtime(value, tzinfo)
+            start = datetime(local.year, local.month if kind != 'year' else 1, local.day if kind == 'day' else 1)
+            if kind == 'year':
+                end = start.replace(year=start.year + 1)
+            elif kind == 'month':
+                end = (start + timedelta(days=32)).replace(day=1)
+            else:
+                end = start + timedelta(days=1)
+            periods.append(timezone.make_aware(start, tzinfo))
+            value = values.filter(**{
+                f'{field_name}__gte': timezone.make_aware(end, tzinfo)
+            }).order_by(field_name).first()
+        return periods
 
 
 @admin.register(User)
@@ -17,15 +72,59 @@ class UserAdmin(BaseUserAdmin):
 
 @admin.register(Sweet)
 class SweetAdmin(admin.ModelAdmin):
-    list_display = ('name', 'category', 'price', 'quantity', 'created_by', 'created_at')
-    list_filter = ('category', 'created_at')
+    list_display = ('name', 'category', 'price', 'quantity', 'flash_sale', 'created_by', 'created_at')
+    list_filter = ('category', 'flash_sale', 'created_at')
+    list_select_related = ('created_by',)
     search_fields = ('name', 'description')
+    search_help_text = 'Words from the name or description; "gul jam" finds Gulab Jamun.'
     readonly_fields = ('created_at', 'updated_at')
+    autocomplete_fields = ('created_by',)
+    paginator = EstimatedCountPaginator
+    # Skip the "N total" COUNT(*) over the whole table on every page
+    show_full_result_count = False
+    
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Search through the full-text index instead of LIKE scans.
+        """
+        if not search_term.strip():
+            return queryset, False
+        return full_text_search(queryset, q=search_term), False
 
 
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     list_display = ('user', 'sweet', 'quantity', 'total_price', 'created_at')
-    list_filter = ('created_at',)
-    search_fields = ('user__email', 'sweet__name')
-    readonly_fields = ('created_at',)
\ No newline at end of file
+    list_select_related = ('user', 'sweet')
+    date_hierarchy = 'created_at'
+    search_fields = ('^user__email', 'sweet__name')
+    search_help_text = "The start of the buyer's email, or words from the sweet's name."
+    readonly_fields = ('created_at',)
+    autocomplete_fields = ('user', 'sweet')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return IndexedDatesQuerySet(self.model, query=queryset.query, using=queryset._db)
+    
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Find the matching users and sweets in their own tables first, then
+        read their orders through the orders' user and sweet indexes,
+        instead of joining every order to filter on LIKE. Users are found
+        by email prefix as a range on the lowercased email index, which
+        any database can seek; LIKE and UPPER(...) LIKE cannot use it.
+        Sweets go through the full-text index.
+        """
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        prefix = search_term.lower()
+        # Every string starting with the prefix sorts before the prefix with its last character bumped
+        end = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        users = User.objects.alias(email_lower=Lower('email')).filter(
+            email_lower__gte=prefix, email_lower__lt=end
+        ).values('pk')
+        sweets = name_match_ids(Sweet.objects.all(), search_term)
+        return queryset.filter(Q(user__in=users) | Q(sweet__in=sweets)), False
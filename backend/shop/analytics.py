@@ -0,0 +1,158 @@
+"""
+Daily sales rollups.
+
+Reports read one DailySweetSales row per sweet and day and one
+DailyCategorySales row per category and day, a few hundred rows instead
+of a scan of `orders`. Purchases do not write them: a bestseller's row
+for the day would be a single hot row that every purchase of it queues
+on. rebuild_sales_rollups() recomputes them from `orders` instead, run
+for the last day or two every few minutes (`manage.py
+rebuild_sales_rollups --days 2 --interval 300`), and for older days to
+backfill or repair them.
+
+Purchases only bump the sharded all-time counter behind Sweet.units_sold.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyCategorySales, DailySweetSales, Order, SweetSalesCounter
+
+
+DEFAULT_REPORT_DAYS = 30
+REBUILD_BATCH_SIZE = 1000
+CENTS = Decimal('0.01')
+
+
+def record_sales(orders):
+    """
+    Add freshly created orders to the sharded units-sold counters.
+    Must run inside the caller's transaction.
+    """
+    units = defaultdict(int)
+    for order in orders:
+        units[order.sweet_id] += order.quantity
+
+    # Sorted, so concurrent checkouts touch counter rows in the same order
+    for sweet_id, total in sorted(units.items()):
+        SweetSalesCounter.objects.add(sweet_id, total, settings.SALES_COUNTER_SHARDS)
+
+
+def day_start(day):
+    """
+    The first instant of a local day. Filtering created_at on instants
+    rather than on its date lets the database use the created_at index.
+    """
+    start = datetime.combine(day, time.min)
+    return timezone.make_aware(start) if settings.USE_TZ else start
+
+
+def rebuild_sales_rollups(start=None, end=None, batch_size=REBUILD_BATCH_SIZE):
+    """
+    Recompute the rollups of the days from `start` to `end` (inclusive,
+    both optional) from the orders table. Orders are attributed to the
+    current category of their sweet. Returns the number of sweet and
+    category rows written.
+    """
+    orders = Order.objects.all()
+    sweet_rollups = DailySweetSales.objects.all()
+    category_rollups = DailyCategorySales.objects.all()
+    if start is not None:
+        orders = orders.filter(created_at__gte=day_start(start))
+        sweet_rollups = sweet_rollups.filter(date__gte=start)
+        category_rollups = category_rollups.filter(date__gte=start)
+    if end is not None:
+        orders = orders.filter(created_at__lt=day_start(end + timedelta(days=1)))
+        sweet_rollups = sweet_rollups.filter(date__lte=end)
+        category_rollups = category_rollups.filter(date__lte=end)
+
+    with transaction.atomic():
+        sweet_rollups.delete()
+        category_rollups.delete()
+
+        rows = orders.annotate(day=TruncDate('created_at')).values('day', 'sweet_id').annotate(
+            units_sum=Sum('quantity'), revenue_sum=Sum('total_price'), orders_count=Count('id')
+        ).order_by()
+        sweet_rows = DailySweetSales.objects.bulk_create([
+            DailySweetSales(date=row['day'], sweet_id=row['sweet_id'], units=row['units_sum'],
+                            revenue=row['revenue_sum'], order_count=row['orders_count'])
+            for row in rows.iterator()
+        ], batch_size=batch_size)
+
+        # Categories are rolled up from the sweet rollups just written
+        rows = sweet_rollups.values('date', 'sweet__category').annotate(
+            units_sum=Sum('units'), revenue_sum=Sum('revenue'), orders_count=Sum('order_count')
+        ).order_by()
+        category_rows = DailyCategorySales.objects.bulk_create([
+            DailyCategorySales(date=row['date'], category=row['sweet__category'], units=row['units_sum'],
+                               revenue=row['revenue_sum'], order_count=row['orders_count'])
+            for row in rows
+        ], batch_size=batch_size)
+
+    return len(sweet_rows), len(category_rows)
+
+
+def default_report_range():
+    end = timezone.localdate()
+    return end - timedelta(days=DEFAULT_REPORT_DAYS - 1), end
+
+
+def format_totals(row):
+    return {
+        'units': row['units_sum'] or 0,
+        # SQLite returns decimal sums unquantized
+        'revenue': str(Decimal(row['revenue_sum'] or 0).quantize(CENTS)),
+        'orders': row['orders_count'] or 0,
+    }
+
+
+def sales_report(start, end, group_by='category', limit=None):
+    """
+    Sales between `start` and `end` (inclusive) from the rollups:
+    overall totals, one entry per day, and a breakdown per category or
+    per sweet, best-selling first.
+    """
+    totals = {
+        'units_sum': Sum('units'), 'revenue_sum': Sum('revenue'), 'orders_count': Sum('order_count'),
+    }
+    if group_by == 'sweet':
+        rollups = DailySweetSales.objects.filter(date__range=(start, end))
+        group_fields = ('sweet_id', 'sweet__name')
+    else:
+        rollups = DailyCategorySales.objects.filter(date__range=(start, end))
+        group_fields = ('category',)
+
+    breakdown = rollups.values(*group_fields).annotate(**totals).order_by('-revenue_sum', *group_fields)
+    if limit:
+        breakdown = breakdown[:limit]
+
+    # Every category row of a day sums to the day's total
+    daily = list(DailyCategorySales.objects.filter(date__range=(start, end)).values('date').annotate(
+        **totals
+    ).order_by('date'))
+
+    return {
+        'start': start,
+        'end': end,
+        'group_by': group_by,
+        'totals': format_totals({
+            'units_sum': sum(row['units_sum'] for row in daily),
+            'revenue_sum': sum(row['revenue_sum'] for row in daily),
+            'orders_count': sum(row['orders_count'] for row in daily),
+        }),
+        'daily': [{'date': row['date'], **format_totals(row)} for row in daily],
+        'breakdown': [
+            {
+                **({'sweet': row['sweet_id'], 'name': row['sweet__name']} if group_by == 'sweet'
+                   else {'category': row['category']}),
+                **format_totals(row),
+            }
+            for row in breakdown
+        ],
+    }
@@ -0,0 +1,353 @@
+"""
+Async views.
+
+DRF's @api_view cannot wrap coroutines, so these are plain Django async
+views that parse JSON themselves and answer with a pre-rendered DRF
+Response, keeping the same payloads and error shapes as views.py.
+
+The read views, served under /api/async/ for ASGI deployments, build
+their rows with the fast_serializers path on the async ORM; under ASGI
+an idle or slow client costs a coroutine rather than a worker thread.
+They answer in the formats of the matching sync view. Writes stay on
+the regular sync views.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.hashers import check_password, make_password
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
+from rest_framework.request import Request
+from rest_framework.response import Response
+
+from .authentication import ShopRefreshToken, StatelessJWTAuthentication
+from .cache import acached_response, aget_catalog_version
+from .conditional import make_catalog_etag, make_catalog_last_modified, make_sweet_etag
+from .fast_serializers import ORDER_COLUMNS, SWEET_COLUMNS, order_rows, sweet_rows
+from .hashing import PasswordHashingBusy, get_hashing_pool
+from .models import Order, Sweet, User
+from .pagination import KeysetPagination
+from .search import search_queryset
+from .serializers import LoginSerializer, UserSerializer
+from . import views
+
+
+def render_as(response, renderer=None, media_type=None):
+    """
+    Give a DRF Response the renderer an APIView would have negotiated.
+    """
+    if isinstance(response, Response):
+        response.accepted_renderer = renderer or JSONRenderer()
+        response.accepted_media_type = media_type or response.accepted_renderer.media_type
+        response.renderer_context = {}
+    return response
+
+
+def api_response(data, status_code=status.HTTP_200_OK, headers=None):
+    """
+    Build a DRF Response that renders as JSON outside of an APIView.
+    """
+    return render_as(Response(data, status=status_code, headers=headers))
+
+
+def exception_response(exc):
+    # Same payload as DRF's default exception handler
+    data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+    return api_response(data, exc.status_code)
+
+
+def busy_response():
+    return api_response({
+        'error': 'Too many sign-ins in progress. Please retry shortly.'
+    }, status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '1'})
+
+
+def method_not_allowed(request, methods):
+    return api_response({
+        'error': f'Method "{request.method}" not allowed.'
+    }, status.HTTP_405_METHOD_NOT_ALLOWED, headers={'Allow': ', '.join(methods)})
+
+
+def allow_methods(*methods):
+    """
+    Reject other methods, turn DRF exceptions into responses and skip
+    CSRF, like @api_view does.
+    """
+    def decorator(view):
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return method_not_allowed(request, methods)
+            try:
+                return await view(request, *args, **kwargs)
+            except APIException as exc:
+                return exception_response(exc)
+
+        wrapper.__name__ = view.__name__
+        wrapper.__doc__ = view.__doc__
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+
+def async_reads(sync_view):
+    """
+    Serve GET and HEAD with the decorated coroutine, which gets a DRF
+    Request and answers in whichever of `sync_view`'s renderers the
+    client asked for, so both paths accept the same formats. Requests
+    for the browsable API are handed to `sync_view` itself.
+    """
+    renderer_classes = sync_view.cls.renderer_classes
+    sync_fallback = sync_to_async(sync_view)
+
+    def decorator(read):
+        async def view(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return method_not_allowed(request, ('GET', 'HEAD'))
+            # force_authenticate() in tests reaches DRF's Request this way too
+            request = Request(request, authenticators=[StatelessJWTAuthentication()])
+            try:
+                renderer, media_type = DefaultContentNegotiation().select_renderer(
+                    request, [renderer_class() for renderer_class in renderer_classes]
+                )
+            except APIException as exc:
+                return exception_response(exc)
+            if isinstance(renderer, BrowsableAPIRenderer):
+                return await sync_fallback(request._request, *args, **kwargs)
+            try:
+                response = await read(request, *args, **kwargs)
+            except APIException as exc:
+                return exception_response(exc)
+            return render_as(response, renderer, media_type)
+
+        view.__name__ = read.__name__
+        view.__doc__ = read.__doc__
+        view.csrf_exempt = True
+        return view
+    return decorator
+
+
+def parse_body(request):
+    if request.content_type == 'application/json':
+        return json.loads(request.body or b'{}')
+    return request.POST
+
+
+def user_payload(user, message):
+    refresh = ShopRefreshToken.for_user(user)
+    return {
+        'message': message,
+        'user': {
+            'id': user.id,
+            'email': user.email,
+            'name': user.first_name,
+            'role': user.role,
+            'token': str(refresh.access_token)
+        }
+    }
+
+
+# ============= AUTH VIEWS =============
+
+@allow_methods('POST')
+async def register(request):
+    """
+    Register a new user.
+    The password is hashed on the bounded hashing pool.
+    """
+    try:
+        data = parse_body(request)
+    except ValueError:
+        return api_response({'error': 'Invalid JSON'}, status.HTTP_400_BAD_REQUEST)
+
+    serializer = UserSerializer(data=data)
+    if not await sync_to_async(serializer.is_valid)():
+        return api_response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+
+    try:
+        password_hash = await get_hashing_pool().run(make_password, serializer.validated_data['password'])
+    except PasswordHashingBusy:
+        return busy_response()
+
+    user = await sync_to_async(serializer.save)(password_hash=password_hash)
+    return api_response(user_payload(user, 'User registered successfully'), status.HTTP_201_CREATED)
+
+
+@allow_methods('POST')
+async def login(request):
+    """
+    Login user and return JWT token.
+    The password is checked on the bounded hashing pool.
+    """
+    try:
+        data = parse_body(request)
+    except ValueError:
+        return api_response({'error': 'Invalid JSON'}, status.HTTP_400_BAD_REQUEST)
+
+    serializer = LoginSerializer(data=data)
+    if not serializer.is_valid():
+        return api_response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+
+    email = serializer.validated_data['email']
+    password = serializer.validated_data['password']
+
+    try:
+        user = await User.objects.aget(email=email)
+    except User.DoesNotExist:
+        return api_response({'error': 'Invalid credentials'}, status.HTTP_401_UNAUTHORIZED)
+
+    # check_password() calls the setter when the stored hash uses outdated
+    # parameters; remember that and upgrade the hash once the check passed
+    outdated = []
+    try:
+        valid = await get_hashing_pool().run(check_password, password, user.password, outdated.append)
+    except PasswordHashingBusy:
+        return busy_response()
+
+    if not valid:
+        return api_response({'error': 'Invalid credentials'}, status.HTTP_401_UNAUTHORIZED)
+
+    if outdated:
+        try:
+            password_hash = await get_hashing_pool().run(make_password, password)
+        except PasswordHashingBusy:
+            pass  # Upgrade on a later login
+        else:
+            # A queryset update, so the upgrade does not revoke the user's tokens
+            await User.objects.filter(pk=user.pk).aupdate(password=password_hash)
+
+    return api_response(user_payload(user, 'Login successful'), status.HTTP_200_OK)
+
+
+# ============= SWEET VIEWS =============
+
+async def conditional(request, etag, last_modified, build):
+    """
+    Answer If-None-Match / If-Modified-Since for an async view, like the
+    condition() decorator does for the sync ones (it cannot wrap
+    coroutines in this Django version).
+    """
+    etag = quote_etag(etag) if etag else None
+    last_modified = int(last_modified.timestamp()) if last_modified else None
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = await build()
+
+    if last_modified and not response.has_header('Last-Modified'):
+        response.headers['Last-Modified'] = http_date(last_modified)
+    if etag:
+        response.headers.setdefault('ETag', etag)
+    return response
+
+
+async def fast_list_response(request, queryset, columns, format_rows):
+    """
+    Build a list response from values_list() rows, paginated when the
+    client asks for pages.
+    """
+    paginator = KeysetPagination()
+    page = await paginator.apaginate_queryset(queryset.values_list(*columns, named=True), request)
+    if page is not None:
+        return paginator.get_paginated_response(format_rows(page))
+    rows = [row async for row in queryset.values_list(*columns)]
+    return Response(format_rows(rows), status=status.HTTP_200_OK)
+
+
+async def catalog_response(request, build):
+    """
+    Serve a catalog read with the catalog ETag and response cache.
+    """
+    version = await aget_catalog_version()
+    return await conditional(
+        request,
+        make_catalog_etag(request, version),
+        make_catalog_last_modified(version),
+        lambda: acached_response(request, build)
+    )
+
+
+@async_reads(views.SweetListCreateView.as_view())
+async def sweet_list(request):
+    """
+    List all sweets (cursor-paginated when `cursor` or `page_size` is given).
+    """
+    return await catalog_response(
+        request, lambda: fast_list_response(request, Sweet.objects.with_available(), SWEET_COLUMNS, sweet_rows)
+    )
+
+
+@async_reads(views.SweetDetailView.as_view())
+async def sweet_detail(request, pk):
+    """
+    Retrieve a sweet (supports If-None-Match / If-Modified-Since).
+    """
+    changed_at = await Sweet.objects.with_changed_at().filter(pk=pk).values_list('changed_at', flat=True).afirst()
+    if changed_at is None:
+        return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+    async def build():
+        row = await Sweet.objects.with_available().filter(pk=pk).values_list(*SWEET_COLUMNS).afirst()
+        if row is None:
+            return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(sweet_rows([row])[0], status=status.HTTP_200_OK)
+
+    return await conditional(
+        request, make_sweet_etag(pk, changed_at), changed_at, lambda: acached_response(request, build)
+    )
+
+
+@async_reads(views.search_sweets)
+async def search_sweets(request):
+    """
+    Search sweets by name, description, category, or price range.
+    Text searches use the full-text index: words match by prefix and the
+    best matches come first (unless the results are paginated).
+    Query params: q, name, category, min_price, max_price, cursor, page_size
+    """
+    async def build():
+        # The first search probes for the FTS index, which is a sync query
+        queryset = await sync_to_async(search_queryset)(Sweet.objects.with_available(), request.query_params)
+        return await fast_list_response(request, queryset, SWEET_COLUMNS, sweet_rows)
+
+    return await catalog_response(request, build)
+
+
+# ============= ORDER VIEWS =============
+
+async def authenticate(request):
+    """
+    Authenticate a DRF Request like the sync views do.
+    Returns (user, None), or (None, error response).
+    """
+    try:
+        # A token version cache miss reads the database
+        user = await sync_to_async(lambda: request.user)()
+    except APIException as exc:
+        user, error = None, exception_response(exc)
+    else:
+        error = None if user.is_authenticated else api_response({
+            'detail': 'Authentication credentials were not provided.'
+        }, status.HTTP_401_UNAUTHORIZED)
+
+    if error is not None:
+        error['WWW-Authenticate'] = StatelessJWTAuthentication().authenticate_header(request)
+        return None, error
+    return user, None
+
+
+@async_reads(views.my_orders)
+async def my_orders(request):
+    """
+    Get all orders for the authenticated user.
+    Query params: cursor, page_size
+    """
+    user, error = await authenticate(request)
+    if error is not None:
+        return error
+
+    orders = Order.objects.filter(user_id=user.id)
+    return await fast_list_response(request, orders, ORDER_COLUMNS, order_rows)
@@ -0,0 +1,117 @@
+"""
+Stateless JWT authentication.
+
+Access tokens carry the user's role, email, name and token version, so
+authenticating a request and checking IsAdminUser / IsAdminOrReadOnly
+needs no query against the users table: request.user is a TokenUser
+built from the claims.
+
+Revocation goes through User.token_version. Saving a role, active flag
+or password change bumps it, and tokens carrying an older version are
+rejected. The current version is cached for AUTH_CACHE_TIMEOUT seconds
+in the AUTH_CACHE_ALIAS cache, which every worker shares (see
+shop.checks), so the save's invalidation reaches all of them at once.
+
+Views that need a real User instance (to assign a foreign key whose
+fields are serialized back, for example) use get_request_user(), which
+keeps one in the same cache.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import metrics
+from .models import User
+
+
+TOKEN_VERSION_CLAIM = 'ver'
+
+
+def auth_cache():
+    return caches[settings.AUTH_CACHE_ALIAS]
+
+
+def token_version_key(user_id):
+    return f'auth:token_version:{user_id}'
+
+
+def user_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+class ShopRefreshToken(RefreshToken):
+    """
+    Refresh token whose access tokens carry the claims permissions need.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token['role'] = user.role
+        token['email'] = user.email
+        token['name'] = user.first_name
+        token[TOKEN_VERSION_CLAIM] = user.token_version
+        return token
+
+
+def get_token_version(user_id):
+    """
+    Return the user's current token version, or None if the user is gone
+    or inactive. Cached, so most requests never reach the database.
+    """
+    cache = auth_cache()
+    key = token_version_key(user_id)
+    version = cache.get(key)
+    metrics.inc('shop_cache_requests_total', cache='auth', result='miss' if version is None else 'hit')
+    if version is None:
+        row = User.objects.filter(pk=user_id).values_list('token_version', 'is_active').first()
+        # -1 caches "no valid tokens" so unknown ids do not query every time
+        version = row[0] if row and row[1] else -1
+        cache.set(key, version, settings.AUTH_CACHE_TIMEOUT)
+    return None if version < 0 else version
+
+
+def get_request_user(request):
+    """
+    Return a User instance for the authenticated request.
+    Requests authenticated with a model instance (sessions, tests) return
+    it unchanged; token-authenticated requests read it from the cache.
+    """
+    if isinstance(request.user, User):
+        return request.user
+
+    cache = auth_cache()
+    key = user_key(request.user.id)
+    user = cache.get(key)
+    if user is None:
+        user = User.objects.get(pk=request.user.id)
+        cache.set(key, user, settings.AUTH_CACHE_TIMEOUT)
+    return user
+
+
+def invalidate_user_cache(user_id):
+    """
+    Drop the cached token version and user, now and after commit.
+    """
+    def invalidate():
+        auth_cache().delete_many([token_version_key(user_id), user_key(user_id)])
+
+    invalidate()
+    transaction.on_commit(invalidate)
+
+
+class StatelessJWTAuthentication(JWTStatelessUserAuthentication):
+    """
+    Authenticates from the token claims alone, only checking that the
+    token version is still current.
+    """
+
+    def get_user(self, validated_token):
+        user = super().get_user(validated_token)
+        version = validated_token.get(TOKEN_VERSION_CLAIM)
+        if version is None or version != get_token_version(user.id):
+            raise InvalidToken('Token has been revoked')
+        return user
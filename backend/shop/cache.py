@@ -0,0 +1,236 @@
+"""
+Versioned cache for catalog read responses.
+
+Every cached list, detail and search response is keyed by the current
+catalog version. Any write to sweets bumps the version, so all older
+entries become unreachable at once and simply age out of the cache.
+
+Model saves and deletes invalidate through signals (see signals.py);
+code that writes with queryset.update() must call invalidate_catalog().
+sync_replicas bumps the version too, dropping responses built from a
+replica before it caught up. A hold running out raises `available`
+without any write, so the cache also keeps the time the next active hold
+lapses, and the first read after it bumps the version. Every worker must see the same version, so
+the catalog cache has to be shared by them (file or db; see checks.py).
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Min
+from rest_framework import status
+from rest_framework.response import Response
+
+from . import metrics
+from .routers import reading_from_replica
+
+
+VERSION_KEY = 'catalog:version'
+LAPSE_KEY = 'catalog:next-lapse'
+
+
+class CacheStats:
+    """
+    Hit/miss counters for this process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def as_dict(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / total, 4) if total else None,
+            }
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+
+stats = CacheStats()
+
+
+def get_catalog_cache():
+    return caches[settings.CATALOG_CACHE_ALIAS]
+
+
+def get_catalog_version():
+    """
+    Return the current catalog version, creating one if it is missing.
+    Versions are nanosecond timestamps rather than counters, so a version
+    key lost to eviction or a restart never brings back old entries.
+    """
+    cache = get_catalog_cache()
+    values = cache.get_many([VERSION_KEY, LAPSE_KEY])
+    if lapse_due(values.get(LAPSE_KEY)):
+        return roll_over_lapsed_holds()
+    version = values.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+async def aget_catalog_version():
+    """
+    Async counterpart of get_catalog_version().
+    """
+    cache = get_catalog_cache()
+    values = await cache.aget_many([VERSION_KEY, LAPSE_KEY])
+    if lapse_due(values.get(LAPSE_KEY)):
+        return await aroll_over_lapsed_holds()
+    version = values.get(VERSION_KEY)
+    if version is None:
+        await cache.aadd(VERSION_KEY, time.time_ns(), timeout=None)
+        version = await cache.aget(VERSION_KEY)
+    return version
+
+
+def lapse_due(lapse):
+    return lapse is not None and lapse <= time.time()
+
+
+def roll_over_lapsed_holds():
+    """
+    Bump the version for the holds that just ran out and remember when
+    the next one does. Returns the new version.
+    """
+    from .models import Reservation
+
+    version = time.time_ns()
+    cache = get_catalog_cache()
+    cache.set(VERSION_KEY, version, timeout=None)
+    # Read the primary: a replica may not have the newest holds yet
+    next_lapse = Reservation.objects.using(DEFAULT_DB_ALIAS).active().aggregate(
+        next_lapse=Min('expires_at')
+    )['next_lapse']
+    if next_lapse is None:
+        cache.delete(LAPSE_KEY)
+    else:
+        cache.set(LAPSE_KEY, next_lapse.timestamp(), timeout=None)
+    return version
+
+
+async def aroll_over_lapsed_holds():
+    """
+    Async counterpart of roll_over_lapsed_holds().
+    """
+    from .models import Reservation
+
+    version = time.time_ns()
+    cache = get_catalog_cache()
+    await cache.aset(VERSION_KEY, version, timeout=None)
+    next_lapse = (await Reservation.objects.using(DEFAULT_DB_ALIAS).active().aaggregate(
+        next_lapse=Min('expires_at')
+    ))['next_lapse']
+    if next_lapse is None:
+        await cache.adelete(LAPSE_KEY)
+    else:
+        await cache.aset(LAPSE_KEY, next_lapse.timestamp(), timeout=None)
+    return version
+
+
+def note_hold_expiry(expires_at):
+    """
+    Remember when a new hold runs out, if it is the first to. Notes it
+    again after the surrounding transaction commits, in case a reader
+    rolled over the lapse time in between without seeing the hold.
+    """
+    def note():
+        cache = get_catalog_cache()
+        lapse = cache.get(LAPSE_KEY)
+        if lapse is None or expires_at.timestamp() < lapse:
+            cache.set(LAPSE_KEY, expires_at.timestamp(), timeout=None)
+
+    note()
+    transaction.on_commit(note)
+
+
+def bump_catalog_version():
+    get_catalog_cache().set(VERSION_KEY, time.time_ns(), timeout=None)
+
+
+def invalidate_catalog():
+    """
+    Invalidate every cached catalog response.
+    Bumps now and again after the surrounding transaction commits, so a
+    reader that re-cached pre-commit data in between is discarded too.
+    """
+    bump_catalog_version()
+    transaction.on_commit(bump_catalog_version)
+
+
+def catalog_key(request, version):
+    # Replica reads may lag, so they never serve a client pinned to the primary
+    source = 'replica' if reading_from_replica() else 'primary'
+    return f'catalog:{version}:{source}:{request.get_host()}{request.get_full_path()}'
+
+
+def cached_response(request, build):
+    """
+    Serve a GET response from the catalog cache, building it on a miss.
+    `build` is called with no arguments and must return a Response; only
+    200 responses are stored.
+    """
+    if not settings.CATALOG_CACHE_ENABLED:
+        return build()
+
+    cache = get_catalog_cache()
+    key = catalog_key(request, get_catalog_version())
+    data = cache.get(key)
+    if data is not None:
+        stats.record(hit=True)
+        metrics.inc('shop_cache_requests_total', cache='catalog', result='hit')
+        response = Response(data, status=status.HTTP_200_OK)
+        response['X-Cache'] = 'HIT'
+        return response
+
+    stats.record(hit=False)
+    metrics.inc('shop_cache_requests_total', cache='catalog', result='miss')
+    response = build()
+    if response.status_code == status.HTTP_200_OK:
+        cache.set(key, response.data)
+    response['X-Cache'] = 'MISS'
+    return response
+
+
+async def acached_response(request, build):
+    """
+    Async counterpart of cached_response(); `build` is a coroutine function.
+    """
+    if not settings.CATALOG_CACHE_ENABLED:
+        return await build()
+
+    cache = get_catalog_cache()
+    key = catalog_key(request, await aget_catalog_version())
+    data = await cache.aget(key)
+    if data is not None:
+        stats.record(hit=True)
+        metrics.inc('shop_cache_requests_total', cache='catalog', result='hit')
+        response = Response(data, status=status.HTTP_200_OK)
+        response['X-Cache'] = 'HIT'
+        return response
+
+    stats.record(hit=False)
+    metrics.inc('shop_cache_requests_total', cache='catalog', result='miss')
+    response = await build()
+    if response.status_code == status.HTTP_200_OK:
+        await cache.aset(key, response.data)
+    response['X-Cache'] = 'MISS'
+    return response
@@ -0,0 +1,77 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Error, Tags, Warning, register
+
+
+@register(Tags.caches)
+def check_catalog_cache_shared(app_configs, **kwargs):
+    """
+    The catalog version must be shared by every worker process. In a
+    per-process cache a write only bumps the version of the worker that
+    made it, and the others keep serving the old stock and prices. The
+    collection ETags come from the same version, so this holds even with
+    the response cache off: a stale version answers 304 to old copies.
+    """
+    if settings.DEBUG:
+        return []
+    if not isinstance(caches[settings.CATALOG_CACHE_ALIAS], LocMemCache):
+        return []
+    return [Error(
+        'The catalog cache is per process, so after a write other workers would keep serving '
+        'stale catalog reads and answering 304 to conditional GETs for them.',
+        hint="Set CATALOG_CACHE_BACKEND to 'file' or 'db'.",
+        id='shop.E001',
+    )]
+
+
+@register(Tags.caches, Tags.database)
+def check_replica_pin_cache_shared(app_configs, **kwargs):
+    """
+    A token client pinned to the primary by one worker must be pinned on
+    all of them, or its next read may land on a lagging replica.
+    """
+    if settings.DEBUG or not settings.DATABASE_REPLICAS:
+        return []
+    if not isinstance(caches[settings.REPLICA_PIN_CACHE_ALIAS], LocMemCache):
+        return []
+    return [Error(
+        'The replica pin cache is per process, so token clients could miss their own writes.',
+        hint="Point REPLICA_PIN_CACHE_ALIAS at a 'file' or 'db' cache.",
+        id='shop.E002',
+    )]
+
+
+@register(Tags.caches, Tags.security)
+def check_auth_cache_shared(app_configs, **kwargs):
+    """
+    Revoking a user's tokens deletes their cached token version. In a
+    per-process cache only the worker that saved the change forgets it,
+    and the others keep honoring the old tokens, with their old role,
+    until AUTH_CACHE_TIMEOUT runs out.
+    """
+    if settings.DEBUG:
+        return []
+    if not isinstance(caches[settings.AUTH_CACHE_ALIAS], LocMemCache):
+        return []
+    return [Error(
+        'The auth cache is per process, so revoked tokens would keep working on other workers.',
+        hint="Point AUTH_CACHE_ALIAS at a 'file' or 'db' cache.",
+        id='shop.E003',
+    )]
+
+
+@register('metrics')
+def check_metrics_dir_shared(app_configs, **kwargs):
+    """
+    Each worker process counts metrics in its own registry, and a scrape
+    reaches just one of them unless they write to a shared METRICS_DIR.
+    """
+    if not settings.METRICS_ENABLED or settings.METRICS_DIR or settings.WEB_CONCURRENCY <= 1:
+        return []
+    return [Warning(
+        f'{settings.WEB_CONCURRENCY} worker processes but no METRICS_DIR, so each scrape '
+        'of /api/metrics/ reports the counts of a single worker.',
+        hint='Set METRICS_DIR to a directory every worker shares, emptied on each deploy.',
+        id='shop.W001',
+    )]
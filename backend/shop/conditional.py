@@ -0,0 +1,55 @@
+"""
+ETag and Last-Modified values for Django's condition() decorator.
+
+Collection views (list, search) derive both from the catalog version, so
+answering a conditional GET needs no database query at all. The version
+lives in the shared catalog cache, so every worker sees a write at once.
+The detail view uses the sweet's own updated_at, which every write path
+refreshes, moved on to when a hold ran out if that is later (see
+Sweet.objects.with_changed_at()).
+"""
+import hashlib
+from datetime import datetime, timezone
+
+from .cache import get_catalog_version
+from .models import Sweet
+
+
+def make_catalog_etag(request, version):
+    path = hashlib.sha1(request.get_full_path().encode()).hexdigest()[:16]
+    return f'catalog-{version}-{path}'
+
+
+def make_catalog_last_modified(version):
+    return datetime.fromtimestamp(version / 1e9, tz=timezone.utc)
+
+
+def catalog_etag(request, *args, **kwargs):
+    return make_catalog_etag(request, get_catalog_version())
+
+
+def catalog_last_modified(request, *args, **kwargs):
+    return make_catalog_last_modified(get_catalog_version())
+
+
+def get_sweet_changed_at(request, pk):
+    # Memoized on the request so etag and last-modified share one query
+    cache = request.__dict__.setdefault('_sweet_changed_at', {})
+    if pk not in cache:
+        cache[pk] = Sweet.objects.with_changed_at().filter(pk=pk).values_list('changed_at', flat=True).first()
+    return cache[pk]
+
+
+def make_sweet_etag(pk, changed_at):
+    return f'sweet-{pk}-{int(changed_at.timestamp() * 1_000_000)}'
+
+
+def sweet_etag(request, pk, *args, **kwargs):
+    changed_at = get_sweet_changed_at(request, pk)
+    if changed_at is None:
+        return None
+    return make_sweet_etag(pk, changed_at)
+
+
+def sweet_last_modified(request, pk, *args, **kwargs):
+    return get_sweet_changed_at(request, pk)
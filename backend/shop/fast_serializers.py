@@ -0,0 +1,97 @@
+"""
+Read-only fast path for the hot list endpoints.
+
+Builds exactly the JSON shape of SweetSerializer/OrderSerializer from
+values_list() rows, skipping model instantiation and per-field
+to_representation calls. Used for GET responses rendered by
+FastJSONRenderer (?format=fastjson) and for every read on the async
+/api/async/ routes; SweetSerializer and OrderSerializer still handle
+every write and every other read.
+"""
+from django.conf import settings
+from django.utils import timezone
+
+from .timing import timed_serialization
+
+
+SWEET_COLUMNS = (
+    'id', 'name', 'description', 'price', 'quantity', 'available', 'category', 'image', 'flash_sale',
+    'created_at', 'updated_at', 'created_by_id', 'created_by__first_name',
+)
+
+ORDER_COLUMNS = (
+    'id', 'user_id', 'user__email', 'sweet_id', 'sweet__name', 'quantity', 'total_price', 'created_at',
+)
+
+
+def datetime_formatter():
+    """
+    Return a function formatting datetimes like DRF's DateTimeField.
+    The timezone decision is made once per batch, not once per value.
+    """
+    if not settings.USE_TZ:
+        return lambda value: value.isoformat()
+
+    def format_utc(value):
+        text = value.isoformat()
+        return text[:-6] + 'Z' if text.endswith('+00:00') else text
+
+    # Database values are already UTC, so only convert for other zones
+    if timezone.get_current_timezone_name() == 'UTC':
+        return format_utc
+
+    current = timezone.get_current_timezone()
+    return lambda value: format_utc(timezone.localtime(value, current))
+
+
+@timed_serialization()
+def sweet_rows(rows):
+    """
+    Format values_list(*SWEET_COLUMNS) rows like SweetSerializer.
+    The queryset must be built with with_available().
+    """
+    format_datetime = datetime_formatter()
+    data = []
+    append = data.append
+    for (pk, name, description, price, quantity, available, category, image, flash_sale,
+         created_at, updated_at, created_by, created_by_name) in rows:
+        item = {
+            'id': pk,
+            'name': name,
+            'description': description,
+            'price': None if price is None else f'{price:.2f}',
+            'quantity': quantity,
+            'available': available,
+            'category': category,
+            'image': image,
+            'flash_sale': flash_sale,
+            'created_at': format_datetime(created_at),
+            'updated_at': format_datetime(updated_at),
+            'created_by': created_by,
+        }
+        # SweetSerializer skips created_by_name when there is no creator
+        if created_by is not None:
+            item['created_by_name'] = created_by_name
+        append(item)
+    return data
+
+
+@timed_serialization()
+def order_rows(rows):
+    """
+    Format values_list(*ORDER_COLUMNS) rows like OrderSerializer.
+    """
+    format_datetime = datetime_formatter()
+    return [
+        {
+            'id': pk,
+            'user': user,
+            'user_email': user_email,
+            'sweet': sweet,
+            'sweet_name': sweet_name,
+            'quantity': quantity,
+            'total_price': f'{total_price:.2f}',
+            'created_at': format_datetime(created_at),
+        }
+        for pk, user, user_email, sweet, sweet_name, quantity, total_price, created_at in rows
+    ]
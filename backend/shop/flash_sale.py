@@ -0,0 +1,266 @@
+"""
+Flash-sale admission and batched purchase commits.
+
+When thousands of buyers hit one sweet at once, running every purchase
+as its own transaction makes them all queue for the SQLite write lock.
+For sweets with `flash_sale` set, purchase_sweet hands the request to
+this module instead:
+
+- Admission runs in memory. Each process keeps an admission budget per
+  sweet: the available stock minus the units it already admitted but
+  has not committed. A request that does not fit is rejected right away,
+  without a query. The budget is reloaded from the database every
+  FLASH_SALE_REFRESH_SECONDS, and whenever the sweet is saved.
+- Admitted purchases wait on a queue. A single committer thread drains
+  it up to FLASH_SALE_BATCH_SIZE at a time. It writes one transaction per
+  sweet in the batch: one conditional stock UPDATE for all the units, and
+  a bulk_create of the orders. Requests arriving while a batch commits
+  form the next batch.
+
+The database stays the source of truth: other processes, holds and
+ordinary purchases take stock too. If the batch UPDATE finds less stock
+than admitted, the batch is served first come, first served, and the
+rest is rejected.
+"""
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db import close_old_connections, transaction
+from django.dispatch import receiver
+
+from .analytics import record_sales
+from .cache import invalidate_catalog
+from .models import Order, Sweet
+
+
+logger = logging.getLogger(__name__)
+
+
+class SoldOut(Exception):
+    """
+    Raised when a purchase does not fit the stock left.
+    """
+
+    def __init__(self, available):
+        super().__init__(f'Insufficient quantity. Only {available} available.')
+        self.available = available
+
+
+class Admission:
+    """
+    Admission state of one sweet on flash sale, in this process.
+    """
+
+    def __init__(self, sweet):
+        self.sweet = sweet
+        self.available = 0
+        self.pending = 0
+        self.loaded_at = None
+
+
+class Purchase:
+    __slots__ = ('admission', 'user', 'quantity', 'future')
+
+    def __init__(self, admission, user, quantity):
+        self.admission = admission
+        self.user = user
+        self.quantity = quantity
+        self.future = Future()
+
+
+def fit(purchases, available):
+    """
+    Split purchases, in arrival order, into those the stock covers and the rest.
+    """
+    accepted, rejected = [], []
+    for purchase in purchases:
+        if purchase.quantity <= available:
+            available -= purchase.quantity
+            accepted.append(purchase)
+        else:
+            rejected.append(purchase)
+    return accepted, rejected
+
+
+class FlashSales:
+    """
+    In-process admission queue and committer for flash-sale purchases.
+    """
+
+    def __init__(self, batch_size, refresh_seconds):
+        self.batch_size = batch_size
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._admissions = {}
+        self._queue = queue.SimpleQueue()
+        self._committer = None
+
+    def is_running(self, pk):
+        """
+        True if this process has the sweet on flash sale; never queries.
+        """
+        return pk in self._admissions
+
+    def forget(self, pk):
+        with self._lock:
+            self._admissions.pop(pk, None)
+
+    def admit(self, pk, user, quantity):
+        """
+        Queue a purchase and return a Future of (order, remaining quantity).
+        Raises SoldOut if it cannot fit; returns None if the sweet is not
+        on flash sale.
+        """
+        admission = self._admissions.get(pk)
+        if admission is None or time.monotonic() - admission.loaded_at > self.refresh_seconds:
+            admission = self._load(pk)
+            if admission is None:
+                return None
+
+        with self._lock:
+            if quantity > admission.available:
+                raise SoldOut(admission.available)
+            admission.available -= quantity
+            admission.pending += quantity
+        purchase = Purchase(admission, user, quantity)
+        self._queue.put(purchase)
+        self._start_committer()
+        return purchase.future
+
+    def _load(self, pk):
+        sweet = Sweet.objects.with_available().filter(pk=pk, flash_sale=True).first()
+        if sweet is None:
+            self.forget(pk)
+            return None
+        with self._lock:
+            admission = self._admissions.setdefault(pk, Admission(sweet))
+            admission.sweet = sweet
+            # Units admitted here but not committed yet are still in the stock
+            admission.available = max(sweet.available - admission.pending, 0)
+            admission.loaded_at = time.monotonic()
+        return admission
+
+    def _start_committer(self):
+        if self._committer is None or not self._committer.is_alive():
+            with self._lock:
+                if self._committer is None or not self._committer.is_alive():
+                    if self._committer is not None:
+                        logger.error('Flash sale committer thread died; starting a new one')
+                    self._committer = threading.Thread(target=self._run, name='flash-sale-committer', daemon=True)
+                    self._committer.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                self._commit_batch(batch)
+            except Exception as e:
+                # Keep the committer alive; fail whatever the batch left unanswered
+                logger.exception('Flash sale batch failed')
+                for purchase in batch:
+                    if not purchase.future.done():
+                        purchase.future.set_exception(e)
+            finally:
+                close_old_connections()
+
+    def _commit_batch(self, batch):
+        by_sweet = defaultdict(list)
+        for purchase in batch:
+            # Requests that timed out and were cancelled give their units back
+            if purchase.future.set_running_or_notify_cancel():
+                by_sweet[purchase.admission.sweet.pk].append(purchase)
+            else:
+                self._settle(purchase.admission, purchase.quantity, refund=True)
+        for pk in sorted(by_sweet):
+            try:
+                self._commit(by_sweet[pk])
+            except Exception as e:
+                logger.exception('Flash sale batch for sweet %s failed', pk)
+                for purchase in by_sweet[pk]:
+                    purchase.future.set_exception(e)
+
+    def _settle(self, admission, units, refund=False, reload=False):
+        with self._lock:
+            admission.pending -= units
+            if refund:
+                admission.available += units
+            if reload:
+                admission.loaded_at = float('-inf')
+
+    def _commit(self, purchases):
+        admission = purchases[0].admission
+        sweet = admission.sweet
+        units = sum(purchase.quantity for purchase in purchases)
+        accepted, rejected = purchases, []
+        try:
+            with transaction.atomic():
+                Sweet.objects.lock_stock([sweet.pk])
+                if not Sweet.objects.decrement_stock(sweet.pk, units):
+                    available = Sweet.objects.with_available().values_list('available', flat=True).get(pk=sweet.pk)
+                    accepted, rejected = fit(purchases, available)
+                    if accepted and not Sweet.objects.decrement_stock(
+                        sweet.pk, sum(purchase.quantity for purchase in accepted)
+                    ):
+                        # The stock moved again since it was read; sell nothing rather than oversell
+                        accepted, rejected = [], purchases
+                orders = Order.objects.bulk_create([
+                    Order(user=purchase.user, sweet=sweet, quantity=purchase.quantity,
+                          total_price=sweet.price * purchase.quantity)
+                    for purchase in accepted
+                ])
+                if orders:
+                    record_sales(orders)
+                    invalidate_catalog()
+                remaining = Sweet.objects.filter(pk=sweet.pk).values_list('quantity', flat=True).get()
+        except Exception:
+            self._settle(admission, units, reload=True)
+            raise
+
+        # The budget was too optimistic; read the real stock on the next admission
+        self._settle(admission, units, reload=bool(rejected))
+        for purchase, order in zip(accepted, orders):
+            purchase.future.set_result((order, remaining))
+        if rejected:
+            left = max(available - sum(purchase.quantity for purchase in accepted), 0)
+            for purchase in rejected:
+                purchase.future.set_exception(SoldOut(left))
+
+
+_flash_sales = None
+_flash_sales_lock = threading.Lock()
+
+
+def get_flash_sales():
+    global _flash_sales
+    if _flash_sales is None:
+        with _flash_sales_lock:
+            if _flash_sales is None:
+                _flash_sales = FlashSales(settings.FLASH_SALE_BATCH_SIZE, settings.FLASH_SALE_REFRESH_SECONDS)
+    return _flash_sales
+
+
+def forget_sweet(pk):
+    """
+    Drop the admission state of a sweet, e.g. after it was saved.
+    """
+    if _flash_sales is not None:
+        _flash_sales.forget(pk)
+
+
+@receiver(setting_changed)
+def reset_flash_sales(setting, **kwargs):
+    global _flash_sales
+    if setting in ('FLASH_SALE_BATCH_SIZE', 'FLASH_SALE_REFRESH_SECONDS'):
+        _flash_sales = None
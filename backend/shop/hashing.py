@@ -0,0 +1,72 @@
+"""
+Bounded worker pool for password hashing.
+
+PBKDF2 is deliberately slow, and a burst of logins hashing inline would
+take every CPU away from the rest of the API. Async auth views hand the
+work to this pool instead: at most PASSWORD_HASHING_WORKERS hashes run
+at once, up to PASSWORD_HASHING_QUEUE more wait for a worker, and any
+request beyond that is rejected straight away with PasswordHashingBusy.
+
+A thread pool is enough: hashlib releases the GIL while it runs PBKDF2,
+so the workers hash in parallel without blocking the event loop.
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+
+class PasswordHashingBusy(Exception):
+    """
+    Raised when the pool and its queue are full.
+    """
+
+
+class HashingPool:
+    """
+    Thread pool that admits a bounded number of jobs.
+    """
+
+    def __init__(self, workers, queue_size):
+        self.workers = workers
+        self.queue_size = queue_size
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hashing')
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+
+    async def run(self, func, *args):
+        """
+        Run `func(*args)` on a worker and return its result.
+        """
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHashingBusy
+        try:
+            return await asyncio.wrap_future(self._executor.submit(func, *args))
+        finally:
+            self._slots.release()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_hashing_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = HashingPool(settings.PASSWORD_HASHING_WORKERS, settings.PASSWORD_HASHING_QUEUE)
+    return _pool
+
+
+@receiver(setting_changed)
+def reset_hashing_pool(setting, **kwargs):
+    global _pool
+    if setting in ('PASSWORD_HASHING_WORKERS', 'PASSWORD_HASHING_QUEUE') and _pool is not None:
+        _pool.shutdown()
+        _pool = None
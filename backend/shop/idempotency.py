@@ -0,0 +1,137 @@
+"""
+Idempotency-Key support for POST endpoints that create orders or holds.
+
+A client that retries a POST after a timeout sends the same
+Idempotency-Key header again. The first request with a key claims it by
+inserting an IdempotencyKey row and stores its response there when done;
+retries within IDEMPOTENCY_KEY_TTL_SECONDS get that response back, marked
+with an Idempotent-Replayed header, without the view running again.
+
+The unique (user, key) constraint collapses concurrent duplicates: only
+the request whose insert wins runs, the others get 409 until it is done.
+The winner holds the key for IDEMPOTENCY_LOCK_SECONDS only, so a worker
+that dies mid-request blocks retries for that long, not for the whole
+TTL. Reusing a key for a different request is a 422. Server errors are
+not stored, so a retry after a 5xx runs the view again.
+
+Expired keys are deleted by the purge_idempotency_keys command.
+"""
+import functools
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from . import metrics
+from .models import IdempotencyKey
+
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+
+def request_fingerprint(request):
+    payload = json.dumps(request.data, sort_keys=True, cls=DjangoJSONEncoder)
+    return hashlib.sha256(f'{request.method} {request.path}\n{payload}'.encode()).hexdigest()
+
+
+def stale_keys(now):
+    # A stored response past its TTL, or a request that outlived its lease
+    return Q(expires_at__lte=now) | Q(locked_until__lte=now)
+
+
+def claim_key(user_id, key, fingerprint):
+    """
+    Insert the key for this request. Returns (record, claimed): the new
+    row and True, or the row another request already holds and False.
+    """
+    now = timezone.now()
+    # Purge unfinished rows along with expired ones once the lease is over
+    locked_until = now + timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS)
+    record = IdempotencyKey(
+        user_id=user_id, key=key, fingerprint=fingerprint, locked_until=locked_until, expires_at=locked_until
+    )
+    for _ in range(2):
+        try:
+            # A savepoint, so a lost race does not break an outer transaction
+            with transaction.atomic():
+                record.save(force_insert=True)
+            return record, True
+        except IntegrityError:
+            keys = IdempotencyKey.objects.filter(user_id=user_id, key=key)
+            existing = keys.exclude(stale_keys(now)).first()
+            if existing is not None:
+                return existing, False
+            # The old response expired, or its request's lease ran out (or it
+            # was just released); take the key over
+            keys.filter(stale_keys(now)).delete()
+    return IdempotencyKey.objects.get(user_id=user_id, key=key), False
+
+
+def store_response(record, response):
+    """
+    Keep the response for replays and release the lease. A request that
+    outlived its lease lost the key to a retry, and updates nothing.
+    """
+    IdempotencyKey.objects.filter(pk=record.pk).update(
+        response_status=response.status_code, response_body=response.data, locked_until=None,
+        expires_at=timezone.now() + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL_SECONDS)
+    )
+
+
+def replay(record, fingerprint):
+    if record.fingerprint != fingerprint:
+        return Response({
+            'error': f'{HEADER} was already used for a different request'
+        }, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+    if record.response_status is None:
+        return Response({
+            'error': f'A request with this {HEADER} is still in progress'
+        }, status=status.HTTP_409_CONFLICT, headers={'Retry-After': '1'})
+    return Response(record.response_body, status=record.response_status, headers={REPLAYED_HEADER: 'true'})
+
+
+def idempotent(view):
+    """
+    Honor the Idempotency-Key header on a function view. Goes below
+    @api_view and @permission_classes, so only authenticated requests
+    reach it; keys are scoped per user.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return view(request, *args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return Response({
+                'error': f'{HEADER} must be 1 to {MAX_KEY_LENGTH} characters'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        fingerprint = request_fingerprint(request)
+        record, claimed = claim_key(request.user.id, key, fingerprint)
+        if not claimed:
+            response = replay(record, fingerprint)
+            if response.status_code == status.HTTP_409_CONFLICT:
+                metrics.inc('shop_idempotency_conflicts_total', view=view.__name__)
+            return response
+
+        try:
+            response = view(request, *args, **kwargs)
+        except BaseException:
+            record.delete()
+            raise
+        if response.status_code >= 500:
+            # Let the client retry the request for real
+            record.delete()
+        else:
+            store_response(record, response)
+        return response
+    return wrapper
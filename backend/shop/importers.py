@@ -0,0 +1,238 @@
+import codecs
+import csv
+import json
+from itertools import islice
+
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+
+from .cache import invalidate_catalog
+from .models import Sweet
+from .serializers import SweetSerializer
+
+
+DEFAULT_BATCH_SIZE = 500
+MAX_REPORTED_ERRORS = 100
+FORMATS = ('csv', 'ndjson')
+
+
+def guess_format(filename):
+    """
+    Guess the import format from a file name, defaulting to CSV.
+    """
+    if filename and filename.lower().endswith(('.ndjson', '.jsonl', '.json')):
+        return 'ndjson'
+    return 'csv'
+
+
+class UnreadableFile(Exception):
+    """
+    The rest of an import file cannot be read: bad encoding or broken CSV.
+    `result` holds the summary of the rows applied before `line_number`.
+    """
+
+    def __init__(self, line_number, message):
+        super().__init__(message)
+        self.line_number = line_number
+        self.result = None
+
+
+def decode_lines(stream):
+    """
+    Lazily decode a binary UTF-8 stream line by line, splitting on \n,
+    \r\n or \r like a text file opened with newline=''. Decoding per line,
+    rather than in the buffered chunks of a TextIOWrapper, pins a bad byte
+    sequence to its own line.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    line_number = 0
+    for chunk in stream:
+        for line in chunk.splitlines(keepends=True):
+            line_number += 1
+            try:
+                yield decoder.decode(line)
+            except UnicodeDecodeError as e:
+                raise UnreadableFile(line_number, f'Invalid UTF-8: {e.reason}')
+    try:
+        decoder.decode(b'', final=True)
+    except UnicodeDecodeError as e:
+        raise UnreadableFile(line_number, f'Invalid UTF-8: {e.reason}')
+
+
+def read_rows(stream, fmt):
+    """
+    Lazily read rows from a text stream.
+    Yields (line_number, row, error) tuples; only one of row/error is set.
+    Raises UnreadableFile when the stream cannot be read any further.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        while True:
+            try:
+                row = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as e:
+                # DictReader.line_num only moves on a good row; its reader's is current
+                raise UnreadableFile(reader.reader.line_num, f'Invalid CSV: {e}')
+            # Empty CSV cells mean "not supplied", not an empty value
+            yield reader.line_num, {key: value for key, value in row.items() if value not in ('', None)}, None
+    elif fmt == 'ndjson':
+        for line_number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_number, None, {'non_field_errors': [f'Invalid JSON: {e}']}
+                continue
+            if not isinstance(row, dict):
+                yield line_number, None, {'non_field_errors': ['Each line must be a JSON object.']}
+                continue
+            yield line_number, row, None
+    else:
+        raise ValueError(f'Unsupported format: {fmt}')
+
+
+class SweetImporter:
+    """
+    Apply a stream of sweet rows in batches.
+    Rows without an `id` create new sweets. Rows with an `id` restock an
+    existing sweet: `quantity` is added to its stock with an atomic F()
+    increment and any other supplied fields are updated in bulk.
+    """
+
+    def __init__(self, created_by=None, batch_size=DEFAULT_BATCH_SIZE):
+        self.created_by = created_by
+        self.batch_size = batch_size
+        self.result = {
+            'created': 0,
+            'restocked': 0,
+            'updated': 0,
+            'failed': 0,
+            'errors': [],
+        }
+
+    def run(self, stream, fmt):
+        rows = read_rows(stream, fmt)
+        batch = []
+        try:
+            while True:
+                batch = []
+                # extend() keeps the rows read before an exception
+                batch.extend(islice(rows, self.batch_size))
+                if not batch:
+                    break
+                self.apply_batch(batch)
+        except UnreadableFile as e:
+            # Apply the rows read before the bad line, as if the file ended there
+            if batch:
+                self.apply_batch(batch)
+            e.result = self.result
+            raise
+        return self.result
+
+    def add_error(self, line_number, errors):
+        self.result['failed'] += 1
+        if len(self.result['errors']) < MAX_REPORTED_ERRORS:
+            self.result['errors'].append({'line': line_number, 'errors': errors})
+
+    def validate(self, line_number, row):
+        """
+        Validate one row with the SweetSerializer rules.
+        Returns (sweet_id, validated_data), or None if the row is invalid.
+        """
+        row = dict(row)
+        sweet_id = row.pop('id', None)
+        if sweet_id is None:
+            serializer = SweetSerializer(data=row)
+        else:
+            try:
+                sweet_id = int(sweet_id)
+            except (TypeError, ValueError):
+                self.add_error(line_number, {'id': ['A valid integer is required.']})
+                return None
+            serializer = SweetSerializer(data=row, partial=True)
+
+        if not serializer.is_valid():
+            self.add_error(line_number, serializer.errors)
+            return None
+        return sweet_id, serializer.validated_data
+
+    def apply_batch(self, batch):
+        new_sweets = []
+        restocks = []
+        for line_number, row, errors in batch:
+            if errors:
+                self.add_error(line_number, errors)
+                continue
+            validated = self.validate(line_number, row)
+            if validated is None:
+                continue
+            sweet_id, data = validated
+            if sweet_id is None:
+                new_sweets.append(Sweet(created_by=self.created_by, **data))
+            else:
+                restocks.append((line_number, sweet_id, data))
+
+        with transaction.atomic():
+            if new_sweets:
+                Sweet.objects.bulk_create(new_sweets, batch_size=self.batch_size)
+                self.result['created'] += len(new_sweets)
+            if restocks:
+                self.apply_restocks(restocks)
+            if new_sweets or restocks:
+                # bulk_create/bulk_update/update() send no model signals
+                invalidate_catalog()
+
+    def apply_restocks(self, restocks):
+        existing = Sweet.objects.in_bulk({sweet_id for _, sweet_id, _ in restocks})
+        now = timezone.now()
+        increments = {}
+        updates = {}
+        for line_number, sweet_id, data in restocks:
+            sweet = existing.get(sweet_id)
+            if sweet is None:
+                self.add_error(line_number, {'id': [f'Sweet {sweet_id} not found.']})
+                continue
+
+            data = dict(data)
+            quantity = data.pop('quantity', 0)
+            if quantity:
+                increments[sweet_id] = increments.get(sweet_id, 0) + quantity
+                self.result['restocked'] += 1
+            if data:
+                for field, value in data.items():
+                    setattr(sweet, field, value)
+                sweet.updated_at = now
+                # Group by changed fields so bulk_update never rewrites
+                # columns a row did not supply
+                updates.setdefault(frozenset(data), {})[sweet_id] = sweet
+                self.result['updated'] += 1
+
+        for fields, sweets in updates.items():
+            Sweet.objects.bulk_update(
+                list(sweets.values()), [*sorted(fields), 'updated_at'], batch_size=self.batch_size
+            )
+
+        if increments:
+            # One UPDATE adds every row's delta to the current stock
+            Sweet.objects.filter(pk__in=increments).update(
+                quantity=F('quantity') + Case(
+                    *[When(pk=pk, then=Value(quantity)) for pk, quantity in increments.items()],
+                    default=Value(0)
+                ),
+                updated_at=now
+            )
+
+
+def import_sweets(stream, fmt, created_by=None, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Import sweets from a CSV or NDJSON text stream.
+    Returns a summary with per-row errors (capped at MAX_REPORTED_ERRORS).
+    Raises UnreadableFile, carrying the summary so far, if the stream
+    breaks off.
+    """
+    return SweetImporter(created_by=created_by, batch_size=batch_size).run(stream, fmt)
@@ -0,0 +1,34 @@
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+def load_benchmark():
+    # The benchmarks package sits next to manage.py in a source checkout and is not installed with the app
+    try:
+        from benchmarks import bench_load
+    except ImportError as e:
+        raise CommandError(
+            f'bench_load needs the benchmarks package of a source checkout ({e}). '
+            'Run it from the backend directory of one.'
+        )
+    return bench_load
+
+
+class Command(BaseCommand):
+    help = ('End-to-end load test of the API with a mixed workload, '
+            'on its own scratch database, never db.sqlite3. Needs a source checkout.')
+
+    def add_arguments(self, parser):
+        try:
+            bench_load = load_benchmark()
+        except CommandError:
+            # handle() reports the missing package
+            return
+        bench_load.add_arguments(parser)
+
+    def handle(self, *args, **options):
+        bench_load = load_benchmark()
+        regressions = bench_load.benchmark(SimpleNamespace(**options))
+        if regressions:
+            raise CommandError(f'{regressions} regression(s) against {options["baseline"]}')
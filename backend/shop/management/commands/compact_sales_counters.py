@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop.models import SweetSalesCounter
+
+
+class Command(BaseCommand):
+    help = 'Fold the sharded units-sold counters of each sweet into one row.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Recompute every counter from the orders table instead (backfill)')
+        parser.add_argument('--interval', type=float,
+                            help='Keep compacting every INTERVAL seconds instead of once')
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            started = time.perf_counter()
+            counters = SweetSalesCounter.objects.rebuild(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f'Rebuilt {counters} counter(s) from orders in {time.perf_counter() - started:.3f}s'
+            ))
+            return
+
+        while True:
+            started = time.perf_counter()
+            compacted = SweetSalesCounter.objects.compact(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f'Compacted the counters of {compacted} sweet(s) in {time.perf_counter() - started:.3f}s'
+            ))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
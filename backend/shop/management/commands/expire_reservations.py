@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop.models import Reservation
+
+
+class Command(BaseCommand):
+    help = 'Mark lapsed stock reservations as expired, in batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--interval', type=float,
+                            help='Keep sweeping every INTERVAL seconds instead of once')
+
+    def handle(self, *args, **options):
+        while True:
+            started = time.perf_counter()
+            expired = Reservation.objects.expire(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f'Expired {expired} reservation(s) in {time.perf_counter() - started:.3f}s'
+            ))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.importers import DEFAULT_BATCH_SIZE, FORMATS, UnreadableFile, decode_lines, guess_format, import_sweets
+from shop.models import User
+
+
+class Command(BaseCommand):
+    help = 'Bulk create and restock sweets from a CSV or NDJSON file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import')
+        parser.add_argument('--format', choices=FORMATS, help='File format (guessed from the extension by default)')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--created-by', help='Email of the admin recorded as creator of new sweets')
+
+    def handle(self, *args, **options):
+        created_by = None
+        if options['created_by']:
+            try:
+                created_by = User.objects.get(email=options['created_by'])
+            except User.DoesNotExist:
+                raise CommandError(f"User {options['created_by']} does not exist")
+
+        fmt = options['format'] or guess_format(options['path'])
+        try:
+            with open(options['path'], 'rb') as stream:
+                result = import_sweets(
+                    decode_lines(stream), fmt, created_by=created_by, batch_size=options['batch_size']
+                )
+        except OSError as e:
+            raise CommandError(str(e))
+        except UnreadableFile as e:
+            self.report(e.result)
+            raise CommandError(f'line {e.line_number}: {e}; the rows before it were applied')
+
+        self.report(result)
+
+    def report(self, result):
+        for error in result['errors']:
+            self.stderr.write(f"line {error['line']}: {error['errors']}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {result['created']}, restocked {result['restocked']}, "
+            f"updated {result['updated']}, failed {result['failed']}"
+        ))
@@ -0,0 +1,44 @@
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from shop.analytics import REBUILD_BATCH_SIZE, rebuild_sales_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily sales rollups from the orders table (refresh, backfill or repair).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=date.fromisoformat, help='First day to rebuild (YYYY-MM-DD)')
+        parser.add_argument('--end', type=date.fromisoformat, help='Last day to rebuild (YYYY-MM-DD)')
+        parser.add_argument('--days', type=int,
+                            help='Rebuild only the last DAYS days, today included, instead of --start/--end')
+        parser.add_argument('--batch-size', type=int, default=REBUILD_BATCH_SIZE)
+        parser.add_argument('--interval', type=float,
+                            help='Keep rebuilding every INTERVAL seconds instead of once')
+
+    def handle(self, *args, **options):
+        start, end = options['start'], options['end']
+        if options['days'] is not None:
+            if start or end:
+                raise CommandError('--days cannot be combined with --start or --end')
+            if options['days'] < 1:
+                raise CommandError('--days must be at least 1')
+        if start and end and start > end:
+            raise CommandError('--start must not be after --end')
+
+        while True:
+            if options['days'] is not None:
+                # Recomputed on every run, so a long-running refresh follows the date
+                start = timezone.localdate() - timedelta(days=options['days'] - 1)
+            started = time.perf_counter()
+            sweet_rows, category_rows = rebuild_sales_rollups(start, end, batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f'Wrote {sweet_rows} sweet and {category_rows} category rollup rows '
+                f'in {time.perf_counter() - started:.2f}s'
+            ))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,40 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.seeding import DEFAULT_BATCH_SIZE, SEED_PASSWORD, seed_shop
+
+
+class Command(BaseCommand):
+    help = 'Fill the database with synthetic users, sweets and orders at production volumes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10_000)
+        parser.add_argument('--sweets', type=int, default=100_000)
+        parser.add_argument('--orders', type=int, default=1_000_000)
+        parser.add_argument('--days', type=int, default=365, help='Spread the orders over this many past days')
+        parser.add_argument('--seed', type=int, default=42, help='Random seed; the same seed gives the same data')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+        parser.add_argument('--no-rollups', action='store_true',
+                            help='Skip rebuilding the sales rollups and counters from the new orders')
+
+    def handle(self, *args, **options):
+        if min(options['users'], options['sweets'], options['orders']) < 0 or options['days'] < 1:
+            raise CommandError('Counts must not be negative and --days must be at least 1')
+
+        def progress(step, seconds):
+            self.stdout.write(f'  {step} in {seconds:.1f}s')
+
+        started = time.perf_counter()
+        try:
+            admin = seed_shop(
+                options['users'], options['sweets'], options['orders'], days=options['days'],
+                seed=options['seed'], batch_size=options['batch_size'], rollups=not options['no_rollups'],
+                progress=progress
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded the shop in {time.perf_counter() - started:.1f}s. '
+            f'Every seeded account, including {admin.email}, uses the password {SEED_PASSWORD}'
+        ))
@@ -0,0 +1,50 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from shop.cache import bump_catalog_version
+
+
+def copy_database(source_path, target_path):
+    """
+    Copy one SQLite database file onto another with the online backup
+    API, which is safe while both are in use.
+    """
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(target_path)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+
+class Command(BaseCommand):
+    help = 'Copy the primary SQLite database onto every read replica (stand-in for real replication).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float,
+                            help='Keep syncing every INTERVAL seconds instead of once')
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('No replicas configured. Set DB_REPLICAS to the number of replicas.')
+        primary = connections[DEFAULT_DB_ALIAS]
+        if primary.vendor != 'sqlite':
+            raise CommandError("sync_replicas only copies SQLite files; use the database's own replication.")
+
+        while True:
+            started = time.perf_counter()
+            for alias in settings.DATABASE_REPLICAS:
+                copy_database(primary.settings_dict['NAME'], connections[alias].settings_dict['NAME'])
+            # Responses cached from the replicas before this sync are stale now
+            bump_catalog_version()
+            self.stdout.write(self.style.SUCCESS(
+                f'Synced {len(settings.DATABASE_REPLICAS)} replica(s) in {time.perf_counter() - started:.3f}s'
+            ))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
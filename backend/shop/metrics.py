@@ -0,0 +1,316 @@
+"""
+Prometheus metrics without an external client library.
+
+Each process counts into its own in-memory registry: per-view request
+latency histograms and status counts (see MetricsMiddleware), and
+business counters bumped by the views. The /api/metrics/ endpoint
+renders them in the Prometheus text format.
+
+Gunicorn and uvicorn run several worker processes, and a scrape reaches
+just one of them. Set METRICS_DIR to a directory they all share: every
+process then writes its registry to its own file there, at most every
+METRICS_FLUSH_SECONDS, and a scrape sums the files of all processes.
+Files of exited workers stay, so counters never go backwards; empty the
+directory when deploying, as with prometheus_client's multiprocess mode.
+"""
+import atexit
+import bisect
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+COUNTER = 'counter'
+HISTOGRAM = 'histogram'
+GAUGE = 'gauge'
+
+METRICS = {
+    'shop_http_requests_total': (COUNTER, 'HTTP requests by view, method and status.'),
+    'shop_http_request_duration_seconds': (HISTOGRAM, 'HTTP request latency by view and method.'),
+    'shop_purchases_total': (COUNTER, 'Purchase and checkout attempts by outcome.'),
+    'shop_purchased_units_total': (COUNTER, 'Units sold by purchases and checkouts.'),
+    'shop_idempotency_conflicts_total': (
+        COUNTER, 'Retries rejected with 409 because the first request was still running.'
+    ),
+    'shop_restocks_total': (COUNTER, 'Restocks through the API.'),
+    'shop_restocked_units_total': (COUNTER, 'Units added by restocks through the API.'),
+    'shop_cache_requests_total': (COUNTER, 'Cache lookups by cache and result.'),
+    'shop_db_connections_opened_total': (COUNTER, 'New database connections by alias.'),
+}
+
+# Computed at scrape time from the summed counters
+DERIVED = {
+    'shop_cache_hit_ratio': (GAUGE, 'Share of cache lookups that hit, by cache.'),
+    'shop_db_connection_reuse_ratio': (GAUGE, 'Share of requests served without opening a database connection.'),
+}
+
+
+def label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+class Registry:
+    """
+    Counters and histograms of this process, optionally mirrored to a
+    file in `directory` for the other processes to read.
+    """
+
+    def __init__(self, directory=None, flush_interval=1.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._reset()
+
+    def _reset(self):
+        # Also run in a forked child, where another thread may have held
+        # the locks and the flusher thread is gone
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.counters = defaultdict(float)
+        self.histograms = {}
+        self._dirty = False
+        self._path = None
+        self._flusher = None
+
+    def inc(self, name, amount=1, **labels):
+        with self._lock:
+            self.counters[name, label_key(labels)] += amount
+            self._dirty = True
+        self._start_flusher()
+
+    def observe(self, name, value, **labels):
+        key = (name, label_key(labels))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                # One count per bucket, then +Inf, then the sum
+                histogram = self.histograms[key] = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0]
+            histogram[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+            histogram[-1] += value
+            self._dirty = True
+        self._start_flusher()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': [[name, labels, value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, labels, values] for (name, labels), values in self.histograms.items()],
+            }
+
+    def collect(self):
+        """
+        Return the snapshots of every process sharing the directory, or
+        of this process alone.
+        """
+        if not self.directory:
+            return [self.snapshot()]
+        self.flush(force=True)
+        snapshots = []
+        for entry in os.scandir(self.directory):
+            if not (entry.name.startswith('metrics-') and entry.name.endswith('.json')):
+                continue
+            try:
+                with open(entry.path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                # Removed or replaced while we listed the directory
+                continue
+        return snapshots
+
+    def flush(self, force=False):
+        """
+        Write this process's file, atomically, if anything changed.
+        """
+        if not self.directory or not (self._dirty or force):
+            return
+        # One writer at a time, so an older snapshot never replaces a newer one
+        with self._flush_lock:
+            with self._lock:
+                self._dirty = False
+            data = json.dumps(self.snapshot())
+            if self._path is None:
+                # Unique per process lifetime, so a reused pid never overwrites an old file
+                self._path = os.path.join(self.directory, f'metrics-{os.getpid()}-{uuid.uuid4().hex[:8]}.json')
+            fd, tmp = tempfile.mkstemp(dir=self.directory, prefix='.tmp-')
+            with os.fdopen(fd, 'w') as f:
+                f.write(data)
+            os.replace(tmp, self._path)
+
+    def _start_flusher(self):
+        if self.directory and self._flusher is None:
+            with self._lock:
+                if self._flusher is None:
+                    self._flusher = threading.Thread(target=self._flush_forever, name='metrics-flusher', daemon=True)
+                    self._flusher.start()
+
+    def _flush_forever(self):
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+
+def merge(snapshots):
+    counters = defaultdict(float)
+    histograms = {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            counters[name, tuple(map(tuple, labels))] += value
+        for name, labels, values in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            if key in histograms:
+                histograms[key] = [a + b for a, b in zip(histograms[key], values)]
+            else:
+                histograms[key] = list(values)
+    return counters, histograms
+
+
+def derive(counters):
+    """
+    Ratios worth reading straight off the endpoint, from summed counters.
+    """
+    gauges = {}
+    lookups = defaultdict(lambda: [0, 0])
+    requests = opened = 0
+    for (name, labels), value in counters.items():
+        labels = dict(labels)
+        if name == 'shop_cache_requests_total':
+            lookups[labels['cache']][labels['result'] == 'hit'] += value
+        elif name == 'shop_http_requests_total':
+            requests += value
+        elif name == 'shop_db_connections_opened_total':
+            opened += value
+    for cache, (misses, hits) in lookups.items():
+        gauges['shop_cache_hit_ratio', (('cache', cache),)] = hits / (hits + misses)
+    if requests:
+        gauges['shop_db_connection_reuse_ratio', ()] = max(1 - opened / requests, 0.0)
+    return gauges
+
+
+def escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label_value(value)}"' for name, value in labels) + '}'
+
+
+def format_value(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def render(snapshots):
+    """
+    Render merged snapshots in the Prometheus text exposition format.
+    """
+    counters, histograms = merge(snapshots)
+    series = defaultdict(list)
+    for (name, labels), value in counters.items():
+        series[name].append((labels, value))
+    for (name, labels), value in derive(counters).items():
+        series[name].append((labels, value))
+
+    lines = []
+    for name, (kind, help_text) in {**METRICS, **DERIVED}.items():
+        if kind == HISTOGRAM:
+            rows = sorted((labels, values) for (metric, labels), values in histograms.items() if metric == name)
+        else:
+            rows = sorted(series.get(name, []))
+        if not rows:
+            continue
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in rows:
+            if kind != HISTOGRAM:
+                lines.append(f'{name}{format_labels(labels)} {format_value(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), value[:-1]):
+                cumulative += count
+                lines.append(f'{name}_bucket{format_labels(labels + (("le", str(bound)),))} {format_value(cumulative)}')
+            lines.append(f'{name}_sum{format_labels(labels)} {format_value(value[-1])}')
+            lines.append(f'{name}_count{format_labels(labels)} {format_value(cumulative)}')
+    return '\n'.join(lines) + '\n'
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """
+    Return this process's registry, or None when metrics are disabled.
+    """
+    global _registry
+    if not settings.METRICS_ENABLED:
+        return None
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                if settings.METRICS_DIR:
+                    os.makedirs(settings.METRICS_DIR, exist_ok=True)
+                _registry = Registry(settings.METRICS_DIR, settings.METRICS_FLUSH_SECONDS)
+    return _registry
+
+
+def inc(name, amount=1, **labels):
+    registry = get_registry()
+    if registry is not None:
+        registry.inc(name, amount, **labels)
+
+
+def observe(name, value, **labels):
+    registry = get_registry()
+    if registry is not None:
+        registry.observe(name, value, **labels)
+
+
+def count_purchase(outcome, units=0):
+    """
+    Count a purchase or checkout attempt; `units` sold if it succeeded.
+    """
+    inc('shop_purchases_total', outcome=outcome)
+    if units:
+        inc('shop_purchased_units_total', units)
+
+
+def _reset_in_child():
+    # A forked worker must not report its parent's counts as its own
+    if _registry is not None:
+        _registry._reset()
+
+
+os.register_at_fork(after_in_child=_reset_in_child)
+
+
+@atexit.register
+def _flush_at_exit():
+    if _registry is not None:
+        _registry.flush()
+
+
+@receiver(connection_created)
+def count_new_connection(sender, connection, **kwargs):
+    inc('shop_db_connections_opened_total', alias=connection.alias)
+
+
+@receiver(setting_changed)
+def reset_registry(setting, **kwargs):
+    global _registry
+    if setting in ('METRICS_ENABLED', 'METRICS_DIR', 'METRICS_FLUSH_SECONDS'):
+        _registry = None
@@ -0,0 +1,328 @@
+import contextlib
+import cProfile
+import logging
+import time
+from types import SimpleNamespace
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.urls import Resolver404, resolve
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import TokenError, InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from . import metrics, profiling
+from .authentication import StatelessJWTAuthentication
+from .permissions import IsAdminUser
+from .routers import reset_replica, use_replica
+from .timing import RequestTiming, start_timing, stop_timing
+
+
+# Read-only views whose queries may run on a replica
+REPLICA_VIEWS = {
+    'sweet-list-create', 'sweet-detail', 'sweet-search', 'sweet-popular', 'my-orders',
+    'async-sweet-list', 'async-sweet-detail', 'async-sweet-search', 'async-my-orders',
+    'sales-analytics',
+}
+
+PIN_COOKIE = 'db_pin'
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_ID_HEADER = 'X-Profile-Id'
+
+# Longest SQL text kept for the slowest query of a slow request
+SLOW_SQL_LENGTH = 500
+
+request_logger = logging.getLogger('shop.requests')
+
+
+def pin_key(user_id):
+    return f'db:pin:{user_id}'
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Send the reads of replica-safe requests to the read replicas.
+    A client that writes is pinned to the primary for REPLICA_PIN_SECONDS,
+    so it always reads its own writes: browsers through a cookie, token
+    clients through their user id in a cache every worker shares.
+    Disabled when no replicas are set up.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = use_replica(self.can_use_replica(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            reset_replica(token)
+
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            self.pin_to_primary(request, response)
+        return response
+
+    async def __acall__(self, request):
+        # The context variable is set in this task, so the view's sync_to_async() calls see it
+        token = use_replica(await sync_to_async(self.can_use_replica)(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            reset_replica(token)
+
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            await sync_to_async(self.pin_to_primary)(request, response)
+        return response
+
+    def can_use_replica(self, request):
+        if request.method not in SAFE_METHODS or PIN_COOKIE in request.COOKIES:
+            return False
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return False
+        if match.url_name not in REPLICA_VIEWS:
+            return False
+
+        user_id = self.get_token_user_id(request)
+        return user_id is None or not caches[settings.REPLICA_PIN_CACHE_ALIAS].get(pin_key(user_id))
+
+    def get_token_user_id(self, request):
+        # Only used for routing; the view authenticates the token properly
+        authentication = JWTAuthentication()
+        header = authentication.get_header(request)
+        raw_token = authentication.get_raw_token(header) if header else None
+        if raw_token is None:
+            return None
+        try:
+            return authentication.get_validated_token(raw_token).get(jwt_settings.USER_ID_CLAIM)
+        except (InvalidToken, TokenError):
+            return None
+
+    def pin_to_primary(self, request, response):
+        pin_seconds = settings.REPLICA_PIN_SECONDS
+        response.set_cookie(PIN_COOKIE, '1', max_age=pin_seconds, httponly=True, samesite='Lax')
+        # DRF copies the authenticated user onto the Django request
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            caches[settings.REPLICA_PIN_CACHE_ALIAS].set(pin_key(user.id), True, pin_seconds)
+
+
+class RequestTimingMiddleware:
+    """
+    Time every request: SQL count and time, slowest query, serialization
+    (see shop.timing) and total time. The figures go out in a Server-Timing
+    header, and requests slower than SLOW_REQUEST_MS are logged on the
+    shop.requests logger, tagged with their URL name. Queries on other
+    threads are not counted; under async, the request's sync_to_async()
+    thread is the one timed, which is where the ORM runs. Disabled, and out
+    of the middleware chain, unless REQUEST_TIMING_ENABLED is set.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_TIMING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        timing = RequestTiming()
+        token = start_timing(timing)
+        try:
+            with contextlib.ExitStack() as stack:
+                self.time_queries(stack, timing.queries)
+                response = self.get_response(request)
+        finally:
+            stop_timing(token)
+        self.add_timing(request, response, timing, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        timing = RequestTiming()
+        token = start_timing(timing)
+        # Connections are per thread: wrap the ones of the thread the ORM calls run on
+        stack = contextlib.ExitStack()
+        await sync_to_async(self.time_queries)(stack, timing.queries)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+            stop_timing(token)
+        await sync_to_async(self.add_timing)(request, response, timing, time.perf_counter() - started)
+        return response
+
+    def time_queries(self, stack, timer):
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(timer))
+
+    def add_timing(self, request, response, timing, total):
+        timer = timing.queries
+        serialization = timing.serialization
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={timer.duration * 1000:.1f};desc="{timer.count} queries"',
+            f'db-slowest;dur={timer.slowest * 1000:.1f}',
+            f'serialize;dur={serialization * 1000:.1f}',
+            f'app;dur={max(total - timer.duration - serialization, 0) * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+        if total * 1000 >= settings.SLOW_REQUEST_MS:
+            self.log_slow_request(request, response, timer, serialization, total)
+
+    def log_slow_request(self, request, response, timer, serialization, total):
+        match = request.resolver_match
+        timing = {
+            'view': match.url_name if match else None,
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 1),
+            'db_ms': round(timer.duration * 1000, 1),
+            'queries': timer.count,
+            'slowest_query_ms': round(timer.slowest * 1000, 1),
+            'slowest_query': timer.slowest_sql[:SLOW_SQL_LENGTH] if timer.slowest_sql else None,
+            'serialize_ms': round(serialization * 1000, 1),
+        }
+        request_logger.warning(
+            'Slow request %(method)s %(path)s (%(view)s): %(status)s in %(total_ms)s ms, '
+            '%(queries)s queries in %(db_ms)s ms, slowest %(slowest_query_ms)s ms, serialize %(serialize_ms)s ms',
+            timing, extra={'timing': timing}
+        )
+
+
+class MetricsMiddleware:
+    """
+    Count every request and observe its latency for /api/metrics/, by
+    URL name (or "unmatched"), method and status. Disabled, and out of
+    the middleware chain, unless METRICS_ENABLED is set.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self.record(request, response, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self.record(request, response, time.perf_counter() - started)
+        return response
+
+    def record(self, request, response, duration):
+        match = request.resolver_match
+        view = match.url_name if match and match.url_name else 'unmatched'
+        metrics.observe('shop_http_request_duration_seconds', duration, view=view, method=request.method)
+        metrics.inc('shop_http_requests_total', view=view, method=request.method, status=str(response.status_code))
+
+
+class ProfilingMiddleware:
+    """
+    Run a request under cProfile when an admin asks for it with an
+    X-Profile: 1 header, or when shop.profiling samples it, and return the
+    stored profile's ID in an X-Profile-Id header. cProfile only sees one
+    thread: the request's thread, or under async the thread its
+    sync_to_async() calls run on, so the ORM and sync code are covered but
+    the body of an async view is not. Disabled, and out of the middleware
+    chain, unless PROFILING_ENABLED is set.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        view_name = self.get_view_name(request)
+        if not self.should_profile(request, view_name):
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler (a debugger, coverage) is already active
+            return self.get_response(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+        response[PROFILE_ID_HEADER] = profiling.save_profile(profiler, view_name)
+        return response
+
+    async def __acall__(self, request):
+        view_name = self.get_view_name(request)
+        # The admin check may read the user from the database
+        if not await sync_to_async(self.should_profile)(request, view_name):
+            return await self.get_response(request)
+
+        profiler = cProfile.Profile()
+        try:
+            await sync_to_async(profiler.enable)()
+        except ValueError:
+            return await self.get_response(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(profiler.disable)()
+        response[PROFILE_ID_HEADER] = await sync_to_async(profiling.save_profile)(profiler, view_name)
+        return response
+
+    def get_view_name(self, request):
+        try:
+            return resolve(request.path_info).url_name or 'unmatched'
+        except Resolver404:
+            return 'unmatched'
+
+    def should_profile(self, request, view_name):
+        requested = request.headers.get(PROFILE_HEADER) == '1'
+        return (requested and self.is_admin(request)) or profiling.should_sample(view_name)
+
+    def is_admin(self, request):
+        # Same check as the views: a JWT admin, or an admin signed in to the admin site
+        try:
+            authenticated = StatelessJWTAuthentication().authenticate(request)
+        except (InvalidToken, TokenError):
+            return False
+        user = authenticated[0] if authenticated else getattr(request, 'user', None)
+        return bool(IsAdminUser().has_permission(SimpleNamespace(user=user), None))
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-18 00:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='order',
+            options={'ordering': ['-created_at', '-id']},
+        ),
+        migrations.AlterModelOptions(
+            name='sweet',
+            options={'ordering': ['-created_at', '-id']},
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='orders_user_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='sweet',
+            index=models.Index(fields=['-created_at', '-id'], name='sweets_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,64 @@
+from django.db import migrations
+
+
+# External-content FTS5 index over sweets.name and sweets.description.
+# Triggers keep it in sync with every insert, update and delete,
+# including bulk_create/update() calls that bypass model signals.
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE sweets_fts USING fts5(
+        name, description,
+        content='sweets', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER sweets_fts_insert AFTER INSERT ON sweets BEGIN
+        INSERT INTO sweets_fts(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER sweets_fts_delete AFTER DELETE ON sweets BEGIN
+        INSERT INTO sweets_fts(sweets_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER sweets_fts_update AFTER UPDATE OF name, description ON sweets BEGIN
+        INSERT INTO sweets_fts(sweets_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO sweets_fts(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+    "INSERT INTO sweets_fts(sweets_fts) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS sweets_fts_update',
+    'DROP TRIGGER IF EXISTS sweets_fts_delete',
+    'DROP TRIGGER IF EXISTS sweets_fts_insert',
+    'DROP TABLE IF EXISTS sweets_fts',
+]
+
+
+def run_sqlite_only(statements):
+    def run(apps, schema_editor):
+        # Other backends fall back to icontains search
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0002_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(run_sqlite_only(CREATE_SQL), run_sqlite_only(DROP_SQL)),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 4.2.7 on 2026-10-18 01:19
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0004_user_token_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCategorySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('category', models.CharField(choices=[('traditional', 'Traditional'), ('modern', 'Modern'), ('festival', 'Festival Special'), ('premium', 'Premium')], max_length=50)),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('order_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'daily_category_sales',
+                'ordering': ['date', 'category'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailySweetSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('sweet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='shop.sweet')),
+            ],
+            options={
+                'db_table': 'daily_sweet_sales',
+                'ordering': ['date', 'sweet'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='dailycategorysales',
+            constraint=models.UniqueConstraint(fields=('date', 'category'), name='daily_category_sales_date_category_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailysweetsales',
+            constraint=models.UniqueConstraint(fields=('date', 'sweet'), name='daily_sweet_sales_date_sweet_uniq'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-18 01:29
+
+from django.conf import settings
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0005_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Reservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(validators=[django.core.validators.MinValueValidator(1)])),
+                ('status', models.CharField(choices=[('active', 'Active'), ('confirmed', 'Confirmed'), ('cancelled', 'Cancelled'), ('expired', 'Expired')], default='active', max_length=10)),
+                ('expires_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('order', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reservation', to='shop.order')),
+                ('sweet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to='shop.sweet')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservations', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'reservations',
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['sweet', 'status', 'expires_at'], name='reservations_sweet_active_idx'), models.Index(fields=['status', 'expires_at'], name='reservations_status_expiry_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-18 01:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0007_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SweetSalesCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField()),
+                ('units', models.PositiveBigIntegerField(default=0)),
+                ('sweet', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sales_counters', to='shop.sweet')),
+            ],
+            options={
+                'db_table': 'sweet_sales_counters',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='sweetsalescounter',
+            constraint=models.UniqueConstraint(fields=('sweet', 'shard'), name='sweet_sales_counters_sweet_shard_uniq'),
+        ),
+    ]
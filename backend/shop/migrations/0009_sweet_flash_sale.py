@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-18 01:43
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+
+fts = import_module('shop.migrations.0003_sweet_fts')
+
+# Adding or removing a column rebuilds the sweets table on SQLite, which
+# drops the triggers keeping sweets_fts in sync; put them back afterwards.
+TRIGGER_SQL = fts.DROP_SQL[:3] + fts.CREATE_SQL[1:]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0008_sales_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, fts.run_sqlite_only(TRIGGER_SQL)),
+        migrations.AddField(
+            model_name='sweet',
+            name='flash_sale',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(fts.run_sqlite_only(TRIGGER_SQL), migrations.RunPython.noop),
+    ]
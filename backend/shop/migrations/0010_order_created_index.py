@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 02:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0009_sweet_flash_sale'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['-created_at', '-id'], name='orders_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0010_order_created_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='locked_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
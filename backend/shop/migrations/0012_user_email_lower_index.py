@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:18
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0011_idempotency_key_lease'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(django.db.models.functions.text.Lower('email'), name='users_email_lower_idx'),
+        ),
+    ]
@@ -1,6 +1,12 @@
+import random
+
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models import Case, F, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest, Lower
 from django.core.validators import MinValueValidator
+from django.utils import timezone
 
 class User(AbstractUser):
     ROLE_CHOICES = [
@@ -8,8 +14,13 @@ class User(AbstractUser):
         ('admin', 'Admin'),
     ]
     
+    # Changing any of these must invalidate tokens issued before the change
+    TOKEN_REVOKING_FIELDS = ('role', 'is_active', 'password')
+    
     email = models.EmailField(unique=True)
     role = models.CharField(max_length=10, choices=ROLE_CHOICES, default='user')
+    # Embedded in every JWT; tokens carrying an older version are rejected
+    token_version = models.PositiveIntegerField(default=0)
     
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name']
@@ -17,8 +28,153 @@ class User(AbstractUser):
     def __str__(self):
         return self.email
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_token_state = instance.get_token_state()
+        return instance
+    
+    def get_token_state(self):
+        return tuple(self.__dict__.get(field) for field in self.TOKEN_REVOKING_FIELDS)
+    
+    def save(self, *args, **kwargs):
+        """
+        Bump token_version when a role, active flag or password change is
+        saved, so access tokens issued before the change stop working.
+        Queryset .update() calls bypass this and must call revoke_tokens().
+        """
+        loaded = getattr(self, '_loaded_token_state', None)
+        if loaded is not None and loaded != self.get_token_state():
+            self.token_version += 1
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'token_version'}
+        super().save(*args, **kwargs)
+        self._loaded_token_state = self.get_token_state()
+    
+    def revoke_tokens(self):
+        """
+        Invalidate every token issued to this user so far.
+        """
+        from .authentication import invalidate_user_cache
+        
+        User.objects.filter(pk=self.pk).update(token_version=F('token_version') + 1)
+        self.refresh_from_db(fields=['token_version'])
+        invalidate_user_cache(self.pk)
+    
     class Meta:
         db_table = 'users'
+        indexes = [
+            # Backs case-insensitive email prefix searches (see OrderAdmin)
+            models.Index(Lower('email'), name='users_email_lower_idx'),
+        ]
+
+
+def held_quantity():
+    """
+    Units of the outer sweet held by active reservations.
+    """
+    holds = Reservation.objects.active().filter(sweet=OuterRef('pk')).order_by().values('sweet')
+    return Coalesce(Subquery(holds.annotate(total=Sum('quantity')).values('total')), 0)
+
+
+class SweetQuerySet(models.QuerySet):
+    def with_available(self):
+        """
+        Annotate `available`: stock on hand minus units held by active reservations.
+        """
+        return self.annotate(available=F('quantity') - held_quantity())
+    
+    def with_changed_at(self, now=None):
+        """
+        Annotate `changed_at`: updated_at, or when the latest hold still
+        marked active ran out if that is later. A lapsed hold raises
+        `available` before the sweeper touches the sweet.
+        """
+        lapsed = Reservation.objects.filter(
+            sweet=OuterRef('pk'), status='active', expires_at__lte=now or timezone.now()
+        ).order_by('-expires_at').values('expires_at')[:1]
+        return self.annotate(changed_at=Greatest('updated_at', Coalesce(Subquery(lapsed), 'updated_at')))
+    
+    def with_units_sold(self):
+        """
+        Annotate the sales counter total read by Sweet.units_sold.
+        """
+        counters = SweetSalesCounter.objects.filter(sweet=OuterRef('pk')).order_by().values('sweet')
+        return self.annotate(_units_sold=Coalesce(Subquery(counters.annotate(total=Sum('units')).values('total')), 0))
+    
+    def lock_stock(self, pks):
+        """
+        Lock sweet rows in pk order before checking their availability.
+        A no-op on SQLite, which serializes writers on its own.
+        """
+        if connection.features.has_select_for_update:
+            list(self.select_for_update().filter(pk__in=pks).order_by('pk').values_list('pk'))
+    
+    def hold_stock(self, pk, quantity):
+        """
+        Check that `quantity` units of a sweet are available to reserve.
+        A conditional UPDATE, so the check runs under the write lock of the
+        caller's transaction; it only touches updated_at, since the hold
+        changes the sweet's `available`. Returns True if enough was available.
+        """
+        updated = self.filter(pk=pk).alias(held=held_quantity()).filter(
+            quantity__gte=F('held') + quantity
+        ).update(updated_at=timezone.now())
+        return updated == 1
+    
+    def release_stock(self, pks):
+        """
+        Mark sweets whose holds ended as changed: their `available` went up.
+        """
+        from .cache import invalidate_catalog
+        
+        self.filter(pk__in=pks).update(updated_at=timezone.now())
+        invalidate_catalog()
+    
+    def decrement_stock(self, pk, quantity):
+        """
+        Atomically take `quantity` units of a sweet out of stock.
+        Runs a single conditional UPDATE, so concurrent buyers can never
+        oversell, nor take units other users hold. Returns True only if
+        the row had enough stock.
+        """
+        updated = self.filter(pk=pk).alias(held=held_quantity()).filter(
+            quantity__gte=F('held') + quantity
+        ).update(
+            quantity=F('quantity') - quantity,
+            updated_at=timezone.now()
+        )
+        return updated == 1
+    
+    def decrement_stock_many(self, quantities):
+        """
+        Atomically take stock for several sweets at once.
+        `quantities` maps sweet pk -> units. A single conditional UPDATE
+        only touches rows that have enough stock, so the caller must roll
+        back unless every row was updated. Returns True if all were.
+        """
+        wanted = Case(
+            *[When(pk=pk, then=Value(quantity)) for pk, quantity in quantities.items()],
+            output_field=models.IntegerField()
+        )
+        updated = self.filter(pk__in=quantities).alias(wanted=wanted, held=held_quantity()).filter(
+            quantity__gte=F('held') + F('wanted')
+        ).update(
+            quantity=F('quantity') - wanted,
+            updated_at=timezone.now()
+        )
+        return updated == len(quantities)
+    
+    def increment_stock(self, pk, quantity):
+        """
+        Atomically add `quantity` units to a sweet's stock.
+        """
+        updated = self.filter(pk=pk).update(
+            quantity=F('quantity') + quantity,
+            updated_at=timezone.now()
+        )
+        return updated == 1
 
 
 class Sweet(models.Model):
@@ -38,13 +194,48 @@ class Sweet(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='sweets')
+    # Purchases are admitted in memory and committed in batches (see shop.flash_sale)
+    flash_sale = models.BooleanField(default=False)
+    
+    objects = SweetQuerySet.as_manager()
     
     def __str__(self):
         return self.name
     
+    @property
+    def units_sold(self):
+        """
+        Units sold so far, summed from the sales counter shards. Querysets
+        built with with_units_sold() fill it in without a query per sweet.
+        """
+        if '_units_sold' not in self.__dict__:
+            self._units_sold = self.sales_counters.aggregate(total=Sum('units'))['total'] or 0
+        return self._units_sold
+    
+    @property
+    def available(self):
+        """
+        Units free to buy or reserve: stock minus active holds. Querysets
+        built with with_available() fill it in without a query per sweet.
+        """
+        if '_available' not in self.__dict__:
+            self._available = Sweet.objects.with_available().filter(pk=self.pk).values_list(
+                'available', flat=True
+            ).first()
+        return self._available
+    
+    @available.setter
+    def available(self, value):
+        # The with_available() annotation is assigned through here
+        self._available = value
+    
     class Meta:
         db_table = 'sweets'
-        ordering = ['-created_at']
+        ordering = ['-created_at', '-id']
+        indexes = [
+            # Backs keyset pagination on (created_at, id)
+            models.Index(fields=['-created_at', '-id'], name='sweets_created_id_idx'),
+        ]
 
 class Order(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='orders')
@@ -58,4 +249,224 @@ class Order(models.Model):
     
     class Meta:
         db_table = 'orders'
-        ordering = ['-created_at']
\ No newline at end of file
+        ordering = ['-created_at', '-id']
+        indexes = [
+            # Backs a user's order history, newest first
+            models.Index(fields=['user', '-created_at', '-id'], name='orders_user_created_id_idx'),
+            # Backs the admin changelist's ordering and date_hierarchy ranges
+            models.Index(fields=['-created_at', '-id'], name='orders_created_id_idx'),
+        ]
+
+class SweetSalesCounterQuerySet(models.QuerySet):
+    def add(self, sweet_pk, units, shards):
+        """
+        Add sold units to a random one of `shards` counter rows of a sweet,
+        so concurrent buyers of a bestseller rarely update the same row.
+        Must run inside the caller's transaction.
+        """
+        shard = random.randrange(shards)
+        if self.filter(sweet_id=sweet_pk, shard=shard).update(units=F('units') + units):
+            return
+        try:
+            # A savepoint, so losing the insert race does not break the transaction
+            with transaction.atomic():
+                self.create(sweet_id=sweet_pk, shard=shard, units=units)
+        except IntegrityError:
+            self.filter(sweet_id=sweet_pk, shard=shard).update(units=F('units') + units)
+    
+    def rebuild(self, batch_size=500):
+        """
+        Recompute every counter from the orders table, one row per sweet.
+        Returns the number of counters written.
+        """
+        with transaction.atomic():
+            self.all().delete()
+            totals = Order.objects.values('sweet_id').annotate(total=Sum('quantity')).order_by()
+            return len(self.bulk_create(
+                [self.model(sweet_id=row['sweet_id'], shard=0, units=row['total']) for row in totals],
+                batch_size=batch_size
+            ))
+    
+    def compact(self, batch_size=500):
+        """
+        Fold the shards of every sweet into its lowest shard, so reads sum
+        fewer rows. Returns the number of sweets compacted.
+        """
+        compacted = 0
+        while True:
+            pks = list(self.values('sweet_id').annotate(rows=models.Count('id')).filter(
+                rows__gt=1
+            ).order_by('sweet_id').values_list('sweet_id', flat=True)[:batch_size])
+            if not pks:
+                return compacted
+            with transaction.atomic():
+                counters = self.filter(sweet_id__in=pks).order_by('sweet_id', 'shard')
+                if connection.features.has_select_for_update:
+                    counters = counters.select_for_update()
+                else:
+                    # A no-op UPDATE takes SQLite's write lock, so no sale lands between the read and the delete
+                    counters.update(units=F('units'))
+                kept, totals, summed = {}, {}, []
+                for pk, sweet_id, units in counters.values_list('pk', 'sweet_id', 'units'):
+                    if sweet_id in kept:
+                        summed.append(pk)
+                    else:
+                        kept[sweet_id] = pk
+                    totals[sweet_id] = totals.get(sweet_id, 0) + units
+                # Delete only the rows summed above; a shard created since is left for the next run
+                self.filter(pk__in=summed).delete()
+                self.filter(pk__in=kept.values()).update(units=Case(
+                    *[When(pk=pk, then=Value(totals[sweet_id])) for sweet_id, pk in kept.items()],
+                    output_field=models.PositiveBigIntegerField()
+                ))
+            compacted += len(pks)
+
+
+class SweetSalesCounter(models.Model):
+    """
+    One shard of a sweet's units-sold counter; the shards sum to the total.
+    """
+    sweet = models.ForeignKey(Sweet, on_delete=models.CASCADE, related_name='sales_counters')
+    shard = models.PositiveSmallIntegerField()
+    units = models.PositiveBigIntegerField(default=0)
+    
+    objects = SweetSalesCounterQuerySet.as_manager()
+    
+    def __str__(self):
+        return f"{self.sweet_id}/{self.shard}: {self.units}"
+    
+    class Meta:
+        db_table = 'sweet_sales_counters'
+        constraints = [
+            models.UniqueConstraint(fields=['sweet', 'shard'], name='sweet_sales_counters_sweet_shard_uniq'),
+        ]
+
+
+class ReservationQuerySet(models.QuerySet):
+    def active(self, now=None):
+        """
+        Holds that still count against stock.
+        """
+        return self.filter(status='active', expires_at__gt=now or timezone.now())
+    
+    def expire(self, batch_size=1000, now=None):
+        """
+        Mark lapsed holds as expired, batch_size rows per UPDATE so the
+        sweeper never holds the write lock for long. Returns the count.
+        """
+        now = now or timezone.now()
+        expired = 0
+        while True:
+            holds = list(self.filter(status='active', expires_at__lte=now).values_list('pk', 'sweet_id')[:batch_size])
+            if not holds:
+                return expired
+            expired += self.filter(pk__in=[pk for pk, _ in holds], status='active').update(status='expired')
+            Sweet.objects.release_stock({sweet_id for _, sweet_id in holds})
+
+
+class Reservation(models.Model):
+    STATUS_CHOICES = [
+        ('active', 'Active'),
+        ('confirmed', 'Confirmed'),
+        ('cancelled', 'Cancelled'),
+        ('expired', 'Expired'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reservations')
+    sweet = models.ForeignKey(Sweet, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.IntegerField(validators=[MinValueValidator(1)])
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='active')
+    # A hold stops counting against stock once it expires, swept or not
+    expires_at = models.DateTimeField()
+    order = models.OneToOneField(Order, on_delete=models.SET_NULL, null=True, blank=True, related_name='reservation')
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    objects = ReservationQuerySet.as_manager()
+    
+    def __str__(self):
+        return f"{self.user_id} - {self.sweet_id} x {self.quantity}"
+    
+    class Meta:
+        db_table = 'reservations'
+        ordering = ['-created_at', '-id']
+        indexes = [
+            # Backs the active-holds sum of a sweet
+            models.Index(fields=['sweet', 'status', 'expires_at'], name='reservations_sweet_active_idx'),
+            # Backs the expiry sweeper
+            models.Index(fields=['status', 'expires_at'], name='reservations_status_expiry_idx'),
+        ]
+
+
+class DailySweetSales(models.Model):
+    """
+    Units, revenue and order count of one sweet on one day.
+    Rebuilt from the orders table; see shop.analytics.
+    """
+    date = models.DateField()
+    sweet = models.ForeignKey(Sweet, on_delete=models.CASCADE, related_name='daily_sales')
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    order_count = models.PositiveIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.date} - {self.sweet_id}"
+    
+    class Meta:
+        db_table = 'daily_sweet_sales'
+        ordering = ['date', 'sweet']
+        constraints = [
+            # Also backs date-range reports across all sweets
+            models.UniqueConstraint(fields=['date', 'sweet'], name='daily_sweet_sales_date_sweet_uniq'),
+        ]
+
+
+class DailyCategorySales(models.Model):
+    """
+    Units, revenue and order count of one category on one day.
+    """
+    date = models.DateField()
+    category = models.CharField(max_length=50, choices=Sweet.CATEGORY_CHOICES)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    order_count = models.PositiveIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.date} - {self.category}"
+    
+    class Meta:
+        db_table = 'daily_category_sales'
+        ordering = ['date', 'category']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'category'], name='daily_category_sales_date_category_uniq'),
+        ]
+
+
+class IdempotencyKey(models.Model):
+    """
+    The first response to a POST sent with an Idempotency-Key header,
+    replayed to retries of the same request; see shop.idempotency.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=255)
+    # Hash of the method, path and body the key was first used with
+    fingerprint = models.CharField(max_length=64)
+    # Both unset while the first request is still running
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    # Lease of the running request; a retry may take the key over after it
+    locked_until = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+    
+    def __str__(self):
+        return f"{self.user_id} - {self.key}"
+    
+    class Meta:
+        db_table = 'idempotency_keys'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='idempotency_keys_user_key_uniq'),
+        ]
+        indexes = [
+            # Backs the purge of expired keys
+            models.Index(fields=['expires_at'], name='idempotency_keys_expiry_idx'),
+        ]
@@ -0,0 +1,188 @@
+"""
+On-demand cProfile profiling of single requests (see ProfilingMiddleware).
+
+A request is profiled when an admin sends an X-Profile: 1 header, or when
+it is the PROFILE_SAMPLE_EVERY-th request of its view in this process.
+Each profile is a pstats dump in PROFILE_DIR, named by the ID returned in
+the X-Profile-Id response header; only the newest PROFILE_KEEP are kept.
+
+Each profile is also folded into flame-graph stacks ("a;b;c <microseconds>"
+lines, the input of flamegraph.pl and speedscope) appended to one file per
+view, which keeps aggregating after the profiles themselves are rotated
+away. cProfile records caller/callee pairs, not whole stacks, so the
+stacks are rebuilt from the call graph, splitting a function's time among
+its callers in proportion to the time each caller spent in it.
+"""
+import io
+import itertools
+import os
+import pstats
+import re
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+
+from django.conf import settings
+
+
+PROFILE_ID_RE = re.compile(r'^\d{8}T\d{6}-[0-9a-f]{12}$')
+FOLDED_DIR = 'folded'
+# A view's folded stacks are summed into one line per stack past this size
+FOLDED_COMPACT_BYTES = 5 * 1024 * 1024
+# Stacks deeper than this, or under this share of the request's time, are dropped
+MAX_STACK_DEPTH = 80
+MIN_STACK_SHARE = 0.001
+
+_counters = defaultdict(itertools.count)
+_counters_lock = threading.Lock()
+
+
+def should_sample(view_name):
+    """
+    True for every PROFILE_SAMPLE_EVERY-th request of the view in this process.
+    """
+    every = settings.PROFILE_SAMPLE_EVERY
+    if every <= 0:
+        return False
+    with _counters_lock:
+        return next(_counters[view_name]) % every == 0
+
+
+def profile_path(profile_id):
+    """
+    Return the file of a profile ID, or None if the ID is malformed.
+    """
+    if not PROFILE_ID_RE.match(profile_id):
+        return None
+    return os.path.join(settings.PROFILE_DIR, f'{profile_id}.prof')
+
+
+def folded_path(view_name):
+    safe_name = re.sub(r'[^\w-]', '_', view_name)
+    return os.path.join(settings.PROFILE_DIR, FOLDED_DIR, f'{safe_name}.folded')
+
+
+def save_profile(profiler, view_name):
+    """
+    Store a finished profile and fold it into the view's flame graph.
+    Returns the profile ID.
+    """
+    profile_id = f'{time.strftime("%Y%m%dT%H%M%S", time.gmtime())}-{uuid.uuid4().hex[:12]}'
+    os.makedirs(os.path.join(settings.PROFILE_DIR, FOLDED_DIR), exist_ok=True)
+    stats = pstats.Stats(profiler)
+    fd, tmp = tempfile.mkstemp(dir=settings.PROFILE_DIR, prefix='.tmp-')
+    os.close(fd)
+    stats.dump_stats(tmp)
+    os.replace(tmp, profile_path(profile_id))
+
+    append_folded(view_name, folded_stacks(stats))
+    rotate_profiles()
+    return profile_id
+
+
+def rotate_profiles():
+    """
+    Delete all but the newest PROFILE_KEEP profiles; IDs sort by time.
+    """
+    names = sorted(name for name in os.listdir(settings.PROFILE_DIR) if name.endswith('.prof'))
+    for name in names[:max(len(names) - settings.PROFILE_KEEP, 0)]:
+        try:
+            os.remove(os.path.join(settings.PROFILE_DIR, name))
+        except FileNotFoundError:
+            # Another worker rotated it first
+            pass
+
+
+def frame_name(func):
+    filename, lineno, name = func
+    if filename == '~':
+        # Built-ins: '<built-in method time.sleep>', '<method 'join' of 'str' objects>'
+        return name.replace(';', ':')
+    for root in (str(settings.BASE_DIR), 'site-packages'):
+        if root in filename:
+            filename = filename.split(root, 1)[1].lstrip(os.sep)
+            break
+    return f'{filename}:{lineno}:{name}'.replace(';', ':')
+
+
+def folded_stacks(stats):
+    """
+    Rebuild flame-graph stacks from a pstats.Stats: {'a;b;c': microseconds
+    of self time}.
+    """
+    callees = defaultdict(dict)
+    roots = []
+    for func, (_, _, _, _, callers) in stats.stats.items():
+        if not callers:
+            roots.append(func)
+        for caller, edge in callers.items():
+            callees[caller][func] = edge[3]
+    # The profiler's own disable() call is not part of the request
+    roots = [func for func in roots if 'of \'_lsprof.Profiler\'' not in func[2]]
+    total = sum(stats.stats[func][3] for func in roots)
+    floor = total * MIN_STACK_SHARE
+    names = {func: frame_name(func) for func in stats.stats}
+    stacks = Counter()
+
+    def walk(func, path, seconds):
+        _, _, self_seconds, cumulative, _ = stats.stats[func]
+        share = seconds / cumulative if cumulative else 0.0
+        path = path + (names[func],)
+        stacks[';'.join(path)] += self_seconds * share
+        if len(path) >= MAX_STACK_DEPTH:
+            return
+        for callee, callee_seconds in callees[func].items():
+            # Recursive calls are already inside this frame's time
+            if callee != func and callee_seconds * share >= floor and names[callee] not in path:
+                walk(callee, path, callee_seconds * share)
+
+    for func in roots:
+        walk(func, (), stats.stats[func][3])
+    return Counter({stack: round(seconds * 1e6) for stack, seconds in stacks.items() if seconds * 1e6 >= 1})
+
+
+def append_folded(view_name, stacks):
+    path = folded_path(view_name)
+    with open(path, 'a') as f:
+        f.write(''.join(f'{stack} {micros}\n' for stack, micros in stacks.items()))
+    if os.path.getsize(path) > FOLDED_COMPACT_BYTES:
+        # Lines another worker appends while this runs may be lost; fine for sampling data
+        write_folded(path, read_folded(view_name))
+
+
+def read_folded(view_name):
+    """
+    Return the view's aggregated stacks, {'a;b;c': microseconds}.
+    """
+    stacks = Counter()
+    try:
+        with open(folded_path(view_name)) as f:
+            for line in f:
+                stack, _, micros = line.rstrip('\n').rpartition(' ')
+                if stack:
+                    stacks[stack] += int(micros)
+    except FileNotFoundError:
+        pass
+    return stacks
+
+
+def write_folded(path, stacks):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+    with os.fdopen(fd, 'w') as f:
+        f.write(''.join(f'{stack} {micros}\n' for stack, micros in sorted(stacks.items())))
+    os.replace(tmp, path)
+
+
+def format_profile(profile_id, limit=50):
+    """
+    Return the top `limit` functions of a stored profile by cumulative
+    time, as pstats prints them, or None if there is no such profile.
+    """
+    path = profile_path(profile_id)
+    if path is None or not os.path.exists(path):
+        return None
+    out = io.StringIO()
+    pstats.Stats(path, stream=out).strip_dirs().sort_stats('cumulative').print_stats(limit)
+    return out.getvalue()
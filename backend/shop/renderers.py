@@ -0,0 +1,21 @@
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    Opt-in JSON renderer for hot read endpoints (`?format=fastjson`).
+    Views that see this renderer selected build their rows with the
+    fast_serializers path. Encoding uses orjson (in requirements.txt) and
+    falls back to the standard JSONRenderer where it is not installed.
+    """
+    format = 'fastjson'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        return orjson.dumps(data, default=self.encoder_class().default)
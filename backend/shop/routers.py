@@ -0,0 +1,59 @@
+"""
+Primary/replica database routing.
+
+Writes always go to the primary (`default`). Reads go to a random
+replica from settings.DATABASE_REPLICAS only while a request that
+ReplicaRoutingMiddleware marked as replica-safe is running: safe-method
+requests to the catalog and order history views, from clients that did
+not write within the last REPLICA_PIN_SECONDS. Everything else, and any
+code outside a request (commands, shell, signals), reads the primary.
+
+Users are always read from the primary, so token versions and roles are
+never checked against a lagging copy.
+"""
+import contextvars
+import random
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+
+_use_replica = contextvars.ContextVar('use_replica', default=False)
+
+
+def use_replica(enabled=True):
+    """
+    Route reads in the current context to replicas; returns a token for
+    reset_replica().
+    """
+    return _use_replica.set(enabled)
+
+
+def reset_replica(token):
+    _use_replica.reset(token)
+
+
+def reading_from_replica():
+    return _use_replica.get()
+
+
+class PrimaryReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if not replicas or not _use_replica.get() or model._meta.label == settings.AUTH_USER_MODEL:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas are copies of the primary, so every pair of rows relates
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary through replication
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
@@ -0,0 +1,118 @@
+import re
+
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+
+FTS_TABLE = 'sweets_fts'
+# bm25 column weights: a hit in the name counts ten times a description hit
+NAME_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+_fts_available = {}
+
+
+def fts_available(using='default'):
+    """
+    Whether the SQLite FTS5 index exists on this database.
+    The answer is cached per connection alias.
+    """
+    if using not in _fts_available:
+        connection = connections[using]
+        _fts_available[using] = (
+            connection.vendor == 'sqlite'
+            and FTS_TABLE in connection.introspection.table_names()
+        )
+    return _fts_available[using]
+
+
+def build_match_query(text, columns=None):
+    """
+    Turn free text into an FTS5 MATCH expression.
+    Every word becomes a quoted prefix term, so user input can never
+    inject FTS syntax and "gul jam" matches "Gulab Jamun".
+    """
+    terms = ' '.join(f'"{word}"*' for word in re.findall(r'\w+', text))
+    if not terms:
+        return None
+    if columns:
+        return f'{{{" ".join(columns)}}} : ({terms})'
+    return terms
+
+
+def full_text_search(queryset, q=None, name=None):
+    """
+    Filter a Sweet queryset to rows matching `q` (name or description)
+    and/or `name` (name only), best matches first.
+    Uses the FTS5 index on SQLite and falls back to icontains elsewhere.
+    """
+    if not fts_available(queryset.db):
+        if q:
+            queryset = queryset.filter(Q(name__icontains=q) | Q(description__icontains=q))
+        if name:
+            queryset = queryset.filter(name__icontains=name)
+        return queryset
+
+    parts = []
+    if q:
+        parts.append(build_match_query(q))
+    if name:
+        parts.append(build_match_query(name, columns=('name',)))
+    if None in parts:
+        return queryset.none()
+    if not parts:
+        return queryset
+    match = ' AND '.join(f'({part})' for part in parts)
+
+    # A plain join lets SQLite drive the query from the FTS index and score
+    # each hit once; a correlated rank subquery re-runs MATCH per row.
+    table = queryset.model._meta.db_table
+    return queryset.extra(
+        tables=[FTS_TABLE],
+        where=[f'{FTS_TABLE}.rowid = "{table}"."id"', f'{FTS_TABLE} MATCH %s'],
+        params=[match],
+        select={'search_rank': f'bm25({FTS_TABLE}, {NAME_WEIGHT}, {DESCRIPTION_WEIGHT})'}
+    ).order_by('search_rank', '-created_at', '-id')
+
+
+def name_match_ids(queryset, name):
+    """
+    The ids of the rows of a Sweet queryset whose name matches `name`,
+    as a subquery for filtering other tables (sweet__in=...). Reads the
+    FTS5 index directly, since its join cannot run inside a subquery.
+    """
+    if not fts_available(queryset.db):
+        return queryset.filter(name__icontains=name).values('pk')
+    match = build_match_query(name, columns=('name',))
+    if match is None:
+        return queryset.none().values('pk')
+    return queryset.filter(pk__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match])).values('pk')
+
+
+def search_queryset(queryset, params):
+    """
+    Apply the search endpoint's query params to a Sweet queryset.
+    Query params: q, name, category, min_price, max_price
+    """
+    # Full-text search: q looks at name and description, name only at name
+    q = params.get('q', None)
+    name = params.get('name', None)
+    if q or name:
+        queryset = full_text_search(queryset, q=q, name=name)
+
+    # Filter by category
+    category = params.get('category', None)
+    if category:
+        queryset = queryset.filter(category=category)
+
+    # Filter by price range
+    min_price = params.get('min_price', None)
+    max_price = params.get('max_price', None)
+
+    if min_price:
+        queryset = queryset.filter(price__gte=min_price)
+    if max_price:
+        queryset = queryset.filter(price__lte=max_price)
+
+    return queryset
@@ -0,0 +1,277 @@
+"""
+Synthetic shop data at production volumes, for load tests and local
+reproductions of performance problems (see the seed_shop command).
+
+Everything is drawn from one seeded random.Random, so the same
+arguments give the same data set on an empty database. The shape is
+meant to look like a real shop, not a uniform grid:
+
+- Categories are weighted (mostly traditional sweets, few premium ones).
+- Sweet popularity follows a Zipf-like curve, so a handful of bestsellers
+  carry a large share of the orders; user activity is skewed the same way.
+- Orders are spread over the last `days` days in id order, like a table
+  that grew over time, and mostly buy one or two units.
+
+Users go through bulk_create with one precomputed password hash. Sweets,
+orders and their sales rollups are written with batched executemany
+INSERTs instead: bulk_create builds a model instance per row and, on
+SQLite, at most 999 parameters per statement, which makes a million
+orders take minutes. The rollups and units-sold counters are summed
+while the orders are generated, rather than rebuilt from the table.
+"""
+import contextlib
+import itertools
+import random
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .analytics import rebuild_sales_rollups
+from .models import DailyCategorySales, DailySweetSales, Order, Sweet, SweetSalesCounter, User
+
+
+SEED_PASSWORD = 'SweetShop123!'
+DEFAULT_BATCH_SIZE = 20000
+# SQLite page cache while seeding, in KiB; the default 2 MB thrashes on the orders indexes
+BULK_LOAD_CACHE_KIB = 256 * 1024
+
+CATEGORY_WEIGHTS = {'traditional': 40, 'festival': 25, 'modern': 20, 'premium': 15}
+PRICE_RANGES = {'traditional': (20, 300), 'festival': (50, 500), 'modern': (40, 400), 'premium': (300, 2000)}
+QUANTITY_WEIGHTS = {1: 60, 2: 20, 3: 10, 4: 5, 5: 5}
+FLAVOURS = (
+    'Kaju', 'Badam', 'Pista', 'Kesar', 'Malai', 'Chocolate', 'Mango', 'Coconut',
+    'Rose', 'Gulkand', 'Anjeer', 'Coffee', 'Orange', 'Paan', 'Dry Fruit', 'Til',
+)
+SWEETS = (
+    'Barfi', 'Ladoo', 'Halwa', 'Peda', 'Katli', 'Jamun', 'Rasgulla', 'Jalebi',
+    'Sandesh', 'Mysore Pak', 'Soan Papdi', 'Kalakand', 'Cake', 'Truffle', 'Modak', 'Chikki',
+)
+DESCRIPTION_WORDS = (
+    'fresh', 'soft', 'crunchy', 'rich', 'handmade', 'ghee', 'saffron', 'cardamom',
+    'roasted', 'nutty', 'festive', 'sugar-free', 'classic', 'layered', 'silver', 'milk',
+)
+IMAGES = ('🍬', '🍫', '🍰', '🧁', '🍩', '🍮')
+
+
+def zipf_cum_weights(count, exponent):
+    """
+    Cumulative weights of ranks 1..count under a Zipf-like law, for rng.choices.
+    """
+    return list(itertools.accumulate(1 / rank ** exponent for rank in range(1, count + 1)))
+
+
+@contextlib.contextmanager
+def bulk_load():
+    """
+    Give SQLite a large page cache for the duration of the block. Orders
+    arrive in random user and sweet order, so every insert touches a
+    random page of each index.
+    """
+    if connection.vendor != 'sqlite':
+        yield
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA cache_size')
+        (previous,) = cursor.fetchone()
+        cursor.execute(f'PRAGMA cache_size = -{BULK_LOAD_CACHE_KIB}')
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA cache_size = {previous}')
+
+
+def insert_rows(model, fields, rows, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    INSERT `rows` (tuples of database-ready values for `fields`) into the
+    table of `model`, `batch_size` rows per executemany call. Sends no
+    signals and returns nothing; read the new rows back if needed.
+    """
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(model._meta.get_field(name).column) for name in fields)
+    sql = (f'INSERT INTO {quote(model._meta.db_table)} ({columns}) '
+           f'VALUES ({", ".join(["%s"] * len(fields))})')
+    rows = iter(rows)
+    with connection.cursor() as cursor:
+        while batch := list(itertools.islice(rows, batch_size)):
+            cursor.executemany(sql, batch)
+
+
+def seed_users(count, rng, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Create `count` regular users sharing one password; return their pks.
+    """
+    first = (User.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+    password = make_password(SEED_PASSWORD)
+    User.objects.bulk_create([
+        User(username=f'shopper{first + i}', email=f'shopper{first + i}@example.com',
+             first_name=rng.choice(FLAVOURS), password=password)
+        for i in range(count)
+    ], batch_size=batch_size)
+    return list(User.objects.filter(pk__gte=first).order_by('pk').values_list('pk', flat=True))
+
+
+def seed_sweets(count, rng, created_by, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Create `count` sweets; return their (pk, price, category), in a random
+    order that doubles as the popularity ranking.
+    """
+    first = (Sweet.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    categories, weights = zip(*CATEGORY_WEIGHTS.items())
+
+    def rows():
+        for i in range(count):
+            category = rng.choices(categories, weights)[0]
+            low, high = PRICE_RANGES[category]
+            # Around 5% of the catalog is sold out
+            quantity = 0 if rng.random() < 0.05 else rng.randint(1, 500)
+            yield (
+                f'{rng.choice(FLAVOURS)} {rng.choice(SWEETS)} {first + i}',
+                ' '.join(rng.sample(DESCRIPTION_WORDS, 5)),
+                Decimal(rng.randint(low, high)), quantity, category, rng.choice(IMAGES),
+                False, now, now, created_by.pk,
+            )
+
+    insert_rows(Sweet, ('name', 'description', 'price', 'quantity', 'category', 'image',
+                        'flash_sale', 'created_at', 'updated_at', 'created_by'), rows(), batch_size)
+    sweets = list(Sweet.objects.filter(pk__gte=first).order_by('pk').values_list('pk', 'price', 'category'))
+    rng.shuffle(sweets)
+    return sweets
+
+
+def seed_orders(count, user_pks, sweets, rng, days=365, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Create `count` orders of `sweets` ((pk, price, category), most popular
+    first) by `user_pks`, evenly spread over the last `days` days. Returns
+    their sales: {(local date, sweet pk): [units, revenue, order count]}.
+    """
+    sales = defaultdict(lambda: [0, Decimal(0), 0])
+    if not count:
+        return sales
+    sweet_weights = zipf_cum_weights(len(sweets), 1.1)
+    user_weights = zipf_cum_weights(len(user_pks), 0.8)
+    quantities, quantity_weights = zip(*QUANTITY_WEIGHTS.items())
+    # total_price for every (sweet, quantity), computed once
+    totals = [(pk, {quantity: price * quantity for quantity in quantities}) for pk, price, _ in sweets]
+
+    # Order i is placed `step * i` microseconds after `start`
+    start = timezone.now() - timedelta(days=days)
+    step = days * 24 * 3600 * 10 ** 6 // count
+
+    def day_changes():
+        """Yield (local date, index of its first order) for each following day."""
+        day = timezone.localdate(start)
+        while True:
+            day += timedelta(days=1)
+            midnight = timezone.make_aware(datetime.combine(day, datetime.min.time()))
+            yield day, -(-((midnight - start) // timedelta(microseconds=1)) // step)
+
+    adapt_datetime = connection.ops.adapt_datetimefield_value
+    base = start
+    if settings.USE_TZ and not connection.features.supports_timezones:
+        # Converted once, so adapting each row skips a timezone conversion
+        base = timezone.make_naive(start, connection.timezone)
+
+    def rows():
+        changes = day_changes()
+        day = timezone.localdate(start)
+        next_day, next_change = next(changes)
+        done = 0
+        while done < count:
+            size = min(batch_size, count - done)
+            picks = zip(
+                rng.choices(totals, cum_weights=sweet_weights, k=size),
+                rng.choices(user_pks, cum_weights=user_weights, k=size),
+                rng.choices(quantities, quantity_weights, k=size),
+            )
+            for i, ((sweet_pk, prices), user_pk, quantity) in enumerate(picks, done):
+                while i >= next_change:
+                    day = next_day
+                    next_day, next_change = next(changes)
+                total_price = prices[quantity]
+                day_sales = sales[day, sweet_pk]
+                day_sales[0] += quantity
+                day_sales[1] += total_price
+                day_sales[2] += 1
+                yield quantity, total_price, adapt_datetime(base + timedelta(microseconds=step * i)), user_pk, sweet_pk
+            done += size
+
+    insert_rows(Order, ('quantity', 'total_price', 'created_at', 'user', 'sweet'), rows(), batch_size)
+    return sales
+
+
+def write_sales(sales, sweets, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Insert the daily rollups and units-sold counters of `sales`, as
+    returned by seed_orders, for sweets that had none.
+    """
+    adapt_date = connection.ops.adapt_datefield_value
+    categories = {pk: category for pk, _, category in sweets}
+    by_category = defaultdict(lambda: [0, Decimal(0), 0])
+    units_sold = defaultdict(int)
+    for (day, sweet_pk), (units, revenue, order_count) in sales.items():
+        category_sales = by_category[day, categories[sweet_pk]]
+        category_sales[0] += units
+        category_sales[1] += revenue
+        category_sales[2] += order_count
+        units_sold[sweet_pk] += units
+
+    insert_rows(DailySweetSales, ('date', 'sweet', 'units', 'revenue', 'order_count'), (
+        (adapt_date(day), sweet_pk, *totals) for (day, sweet_pk), totals in sales.items()
+    ), batch_size)
+    insert_rows(DailyCategorySales, ('date', 'category', 'units', 'revenue', 'order_count'), (
+        (adapt_date(day), category, *totals) for (day, category), totals in by_category.items()
+    ), batch_size)
+    insert_rows(SweetSalesCounter, ('sweet', 'shard', 'units'), (
+        (sweet_pk, 0, units) for sweet_pk, units in units_sold.items()
+    ), batch_size)
+
+
+def seed_shop(users, sweets, orders, days=365, seed=42, batch_size=DEFAULT_BATCH_SIZE, rollups=True,
+              progress=None):
+    """
+    Seed a shop of `users` users, `sweets` sweets and `orders` orders, plus
+    one admin owning the sweets. The sales rollups and counters follow the
+    new orders unless `rollups` is False; on a database that already had
+    sales they are rebuilt from the whole table, which is much slower.
+    `progress(step, seconds)` is called after each step. Returns the admin.
+    """
+    rng = random.Random(seed)
+
+    def step(name, func, *args):
+        started = time.perf_counter()
+        with transaction.atomic():
+            result = func(*args)
+        if progress is not None:
+            progress(name, time.perf_counter() - started)
+        return result
+
+    had_sales = any(
+        model.objects.exists() for model in (Order, DailySweetSales, DailyCategorySales, SweetSalesCounter)
+    )
+    admin = User.objects.filter(email='seed-admin@example.com').first() or User.objects.create_user(
+        username='seed-admin', email='seed-admin@example.com', first_name='Admin',
+        password=SEED_PASSWORD, role='admin'
+    )
+    with bulk_load():
+        user_pks = step(f'{users} users', seed_users, users, rng, batch_size)
+        seeded_sweets = step(f'{sweets} sweets', seed_sweets, sweets, rng, admin, batch_size)
+        if orders and not (user_pks and seeded_sweets):
+            raise ValueError('Orders need at least one user and one sweet')
+        sales = step(f'{orders} orders', seed_orders, orders, user_pks, seeded_sweets, rng, days, batch_size)
+        if not (rollups and orders):
+            return admin
+        if had_sales:
+            step('sales rollups', rebuild_sales_rollups)
+            step('sales counters', SweetSalesCounter.objects.rebuild)
+        else:
+            step('sales rollups and counters', write_sales, sales, seeded_sweets, batch_size)
+    return admin
@@ -1,6 +1,16 @@
 from rest_framework import serializers
 from django.contrib.auth.password_validation import validate_password
-from .models import User, Sweet, Order
+from .analytics import default_report_range
+from .models import User, Sweet, Order, Reservation
+from .timing import SerializationTimingMixin
+
+
+# Largest value an integer column holds on every supported database
+MAX_INTEGER = 2 ** 31 - 1
+
+# Most lines one checkout may hold; the whole basket is written while the
+# database write lock is held
+MAX_CHECKOUT_ITEMS = 100
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -21,7 +31,12 @@ class UserSerializer(serializers.ModelSerializer):
             first_name=validated_data['first_name'],
             role=validated_data.get('role', 'user')
         )
-        user.set_password(validated_data['password'])
+        # Callers that hashed the password off the request thread pass it in
+        password_hash = validated_data.get('password_hash')
+        if password_hash:
+            user.password = password_hash
+        else:
+            user.set_password(validated_data['password'])
         user.save()
         return user
 
@@ -31,13 +46,15 @@ class LoginSerializer(serializers.Serializer):
     password = serializers.CharField(write_only=True)
 
 
-class SweetSerializer(serializers.ModelSerializer):
+class SweetSerializer(SerializationTimingMixin, serializers.ModelSerializer):
     created_by_name = serializers.CharField(source='created_by.first_name', read_only=True)
+    # Stock minus active reservations; use querysets built with with_available()
+    available = serializers.IntegerField(read_only=True)
     
     class Meta:
         model = Sweet
-        fields = ('id', 'name', 'description', 'price', 'quantity', 'category', 'image', 
-                 'created_at', 'updated_at', 'created_by', 'created_by_name')
+        fields = ('id', 'name', 'description', 'price', 'quantity', 'available', 'category', 'image',
+                 'flash_sale', 'created_at', 'updated_at', 'created_by', 'created_by_name')
         read_only_fields = ('created_at', 'updated_at', 'created_by')
     
     def validate_price(self, value):
@@ -49,9 +66,22 @@ class SweetSerializer(serializers.ModelSerializer):
         if value < 0:
             raise serializers.ValidationError("Quantity cannot be negative.")
         return value
+    
+    def update(self, instance, validated_data):
+        instance = super().update(instance, validated_data)
+        # The annotated `available` predates the new quantity
+        instance.__dict__.pop('_available', None)
+        return instance
+
 
+class PopularSweetSerializer(SweetSerializer):
+    units_sold = serializers.IntegerField(read_only=True)
+    
+    class Meta(SweetSerializer.Meta):
+        fields = SweetSerializer.Meta.fields + ('units_sold',)
 
-class OrderSerializer(serializers.ModelSerializer):
+
+class OrderSerializer(SerializationTimingMixin, serializers.ModelSerializer):
     sweet_name = serializers.CharField(source='sweet.name', read_only=True)
     user_email = serializers.CharField(source='user.email', read_only=True)
     
@@ -62,8 +92,47 @@ class OrderSerializer(serializers.ModelSerializer):
 
 
 class PurchaseSerializer(serializers.Serializer):
-    quantity = serializers.IntegerField(default=1, min_value=1)
+    quantity = serializers.IntegerField(default=1, min_value=1, max_value=MAX_INTEGER)
+    # Buy the units held by this reservation instead
+    reservation = serializers.IntegerField(min_value=1, max_value=MAX_INTEGER, required=False)
+
+
+class ReserveSerializer(serializers.Serializer):
+    quantity = serializers.IntegerField(default=1, min_value=1, max_value=MAX_INTEGER)
+
+
+class ReservationSerializer(SerializationTimingMixin, serializers.ModelSerializer):
+    sweet_name = serializers.CharField(source='sweet.name', read_only=True)
+    
+    class Meta:
+        model = Reservation
+        fields = ('id', 'sweet', 'sweet_name', 'quantity', 'status', 'expires_at', 'order', 'created_at')
+        read_only_fields = fields
+
+
+class CheckoutItemSerializer(serializers.Serializer):
+    sweet = serializers.IntegerField(min_value=1, max_value=MAX_INTEGER)
+    quantity = serializers.IntegerField(default=1, min_value=1, max_value=MAX_INTEGER)
+
+
+class CheckoutSerializer(serializers.Serializer):
+    items = CheckoutItemSerializer(many=True, allow_empty=False, max_length=MAX_CHECKOUT_ITEMS)
 
 
 class RestockSerializer(serializers.Serializer):
-    quantity = serializers.IntegerField(min_value=1)
\ No newline at end of file
+    quantity = serializers.IntegerField(min_value=1, max_value=MAX_INTEGER)
+
+
+class SalesReportSerializer(serializers.Serializer):
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    group_by = serializers.ChoiceField(choices=['category', 'sweet'], default='category')
+    limit = serializers.IntegerField(min_value=1, max_value=1000, required=False)
+    
+    def validate(self, data):
+        default_start, default_end = default_report_range()
+        data.setdefault('end', default_end)
+        data.setdefault('start', min(default_start, data['end']))
+        if data['start'] > data['end']:
+            raise serializers.ValidationError("start must not be after end.")
+        return data
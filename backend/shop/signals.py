@@ -0,0 +1,21 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import invalidate_user_cache
+from .cache import invalidate_catalog
+from .flash_sale import forget_sweet
+from .models import Sweet, User
+
+
+@receiver(post_save, sender=Sweet)
+@receiver(post_delete, sender=Sweet)
+def invalidate_catalog_on_sweet_change(sender, instance, **kwargs):
+    invalidate_catalog()
+    # A toggled flash_sale or edited quantity changes the admission budget
+    forget_sweet(instance.pk)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_cache_on_user_change(sender, instance, **kwargs):
+    invalidate_user_cache(instance.pk)
@@ -0,0 +1,62 @@
+import pytest
+from django.core.cache import caches
+from rest_framework.test import APIClient
+from shop.models import Sweet, User
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    """Cached responses must not leak between tests after a DB rollback."""
+    for cache in caches.all():
+        cache.clear()
+    yield
+
+
+@pytest.fixture(autouse=True)
+def read_from_primary(settings):
+    """Replica connections cannot see the uncommitted data of a test."""
+    settings.DATABASE_REPLICAS = []
+
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+
+@pytest.fixture
+def create_user():
+    def make_user(email='user@example.com', role='user'):
+        user = User.objects.create_user(
+            username=email.split('@')[0],
+            email=email,
+            first_name='Test',
+            password='TestPass123!',
+            role=role
+        )
+        return user
+    return make_user
+
+
+@pytest.fixture
+def create_admin(create_user):
+    return create_user(email='admin@example.com', role='admin')
+
+
+@pytest.fixture
+def create_regular_user(create_user):
+    return create_user(email='user@example.com', role='user')
+
+
+@pytest.fixture
+def create_sweet(create_admin):
+    def make_sweet(**kwargs):
+        default_data = {
+            'name': 'Test Sweet',
+            'price': 100,
+            'quantity': 10,
+            'category': 'traditional',
+            'created_by': create_admin
+        }
+        default_data.update(kwargs)
+        return Sweet.objects.create(**default_data)
+    return make_sweet
@@ -0,0 +1,186 @@
+import itertools
+from datetime import datetime, timedelta
+
+import pytest
+from django.db import connection
+from django.db.models import Max, Min
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from shop import pagination
+from shop.admin import IndexedDatesQuerySet
+from shop.models import Order, User
+from shop.pagination import EstimatedCountPaginator
+
+
+@pytest.fixture
+def admin_client(create_superuser):
+    client = Client()
+    client.force_login(create_superuser)
+    return client
+
+
+@pytest.fixture
+def create_superuser():
+    return User.objects.create_superuser(
+        username='root', email='root@example.com', first_name='Root', password='TestPass123!'
+    )
+
+
+@pytest.fixture
+def create_orders(create_sweet):
+    """Create `count` orders by different users of different sweets, one day apart."""
+    numbers = itertools.count()
+
+    def make_orders(count, start=None):
+        start = start or timezone.now() - timedelta(days=count)
+        for i in range(count):
+            n = next(numbers)
+            # No password: hashing one per buyer would dominate the test time
+            user = User.objects.create(username=f'buyer{n}', email=f'buyer{n}@example.com', first_name='Buyer')
+            sweet = create_sweet(name=f'Sweet {n}', created_by=user)
+            order = Order.objects.create(user=user, sweet=sweet, quantity=1, total_price=100)
+            Order.objects.filter(pk=order.pk).update(created_at=start + timedelta(days=i))
+    return make_orders
+
+
+def changelist_queries(client, model_name, params=None):
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(reverse(f'admin:shop_{model_name}_changelist'), params or {})
+    assert response.status_code == 200
+    return [query['sql'] for query in queries]
+
+
+@pytest.mark.django_db
+class TestChangelistQueryBudget:
+    """Each changelist runs the same number of queries whatever the number of rows"""
+
+    @pytest.mark.parametrize('model_name, params, budget', [
+        ('order', {}, 11),
+        ('order', {'q': 'Sweet'}, 9),
+        ('order', {'created_at__year': 2025, 'created_at__month': 1}, 7),
+        ('sweet', {}, 6),
+        ('sweet', {'q': 'Sweet'}, 4),
+        ('user', {}, 5),
+    ])
+    def test_budget(self, admin_client, create_orders, model_name, params, budget):
+        """The date hierarchy costs one query per year, month or day listed, so the new rows share the days"""
+        start = timezone.make_aware(datetime(2025, 1, 30, 12))
+        create_orders(3, start=start)
+        # Warm up once-per-process lookups, like whether the full-text index exists
+        changelist_queries(admin_client, model_name, params)
+        few = changelist_queries(admin_client, model_name, params)
+        for _ in range(10):
+            create_orders(3, start=start)
+
+        many = changelist_queries(admin_client, model_name, params)
+
+        assert len(many) == len(few) <= budget
+
+    def test_big_table_not_counted(self, admin_client, create_orders, monkeypatch):
+        monkeypatch.setattr(pagination, 'ESTIMATED_COUNT_THRESHOLD', 0)
+        create_orders(3)
+
+        queries = changelist_queries(admin_client, 'order')
+
+        assert not [sql for sql in queries if 'COUNT(' in sql]
+
+
+@pytest.mark.django_db
+class TestOrderAdmin:
+
+    def test_search_by_exact_email(self, admin_client, create_orders):
+        create_orders(3)
+
+        response = admin_client.get(reverse('admin:shop_order_changelist'), {'q': 'buyer1@example.com'})
+
+        assert [order.user.email for order in response.context['cl'].result_list] == ['buyer1@example.com']
+
+    def test_search_by_email_prefix(self, admin_client, create_orders):
+        create_orders(3)
+
+        response = admin_client.get(reverse('admin:shop_order_changelist'), {'q': 'BUYER2'})
+
+        assert [order.user.email for order in response.context['cl'].result_list] == ['buyer2@example.com']
+
+    def test_email_search_seeks_index(self, admin_client, create_orders):
+        """Test the email prefix search reads users through the lowercased email index"""
+        create_orders(3)
+
+        with CaptureQueriesContext(connection) as queries:
+            admin_client.get(reverse('admin:shop_order_changelist'), {'q': 'Buyer2'})
+
+        search = next(query['sql'] for query in queries if 'LOWER' in query['sql'])
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {search}')
+            plan = ' '.join(str(row) for row in cursor.fetchall())
+        assert 'users_email_lower_idx' in plan
+
+    def test_search_by_sweet_name(self, admin_client, create_orders, create_user, create_sweet):
+        create_orders(2)
+        user = create_user(email='jamun@example.com')
+        Order.objects.create(user=user, sweet=create_sweet(name='Gulab Jamun'), quantity=1, total_price=100)
+
+        response = admin_client.get(reverse('admin:shop_order_changelist'), {'q': 'gul jam'})
+
+        assert [order.sweet.name for order in response.context['cl'].result_list] == ['Gulab Jamun']
+
+    def test_date_hierarchy_drilldown(self, admin_client, create_orders):
+        create_orders(3, start=timezone.make_aware(datetime(2024, 12, 31, 12)))
+
+        response = admin_client.get(reverse('admin:shop_order_changelist'), {'created_at__year': 2025})
+
+        assert [order.created_at.date().isoformat() for order in response.context['cl'].result_list] == [
+            '2025-01-02', '2025-01-01'
+        ]
+
+    def test_autocomplete_users(self, admin_client, create_orders):
+        create_orders(3)
+
+        response = admin_client.get(reverse('admin:autocomplete'), {
+            'app_label': 'shop', 'model_name': 'order', 'field_name': 'user', 'term': 'buyer2'
+        })
+
+        assert [result['text'] for result in response.json()['results']] == ['buyer2@example.com']
+
+
+@pytest.mark.django_db
+class TestIndexedDatesQuerySet:
+
+    @pytest.mark.parametrize('kind', ['year', 'month', 'day'])
+    def test_matches_django(self, create_orders, kind):
+        create_orders(40, start=timezone.make_aware(datetime(2024, 11, 20, 23, 30)))
+        indexed = IndexedDatesQuerySet(Order)
+
+        assert list(indexed.datetimes('created_at', kind)) == list(Order.objects.datetimes('created_at', kind))
+        assert list(indexed.filter(pk__lte=10).datetimes('created_at', kind)) == list(
+            Order.objects.filter(pk__lte=10).datetimes('created_at', kind)
+        )
+
+    def test_min_max_bounds(self, create_orders):
+        create_orders(5)
+        indexed = IndexedDatesQuerySet(Order)
+
+        assert indexed.aggregate(first=Min('created_at'), last=Max('created_at')) == Order.objects.aggregate(
+            first=Min('created_at'), last=Max('created_at')
+        )
+        assert IndexedDatesQuerySet(Order).none().aggregate(first=Min('created_at')) == {'first': None}
+
+
+@pytest.mark.django_db
+class TestEstimatedCountPaginator:
+
+    def test_unfiltered_big_table_estimated(self, create_orders, monkeypatch):
+        monkeypatch.setattr(pagination, 'ESTIMATED_COUNT_THRESHOLD', 0)
+        create_orders(4)
+        Order.objects.filter(pk=Order.objects.order_by('pk')[1].pk).delete()
+
+        assert EstimatedCountPaginator(Order.objects.all(), 2).count == 4
+        assert EstimatedCountPaginator(Order.objects.filter(quantity=1), 2).count == 3
+
+    def test_small_table_counted(self, create_orders):
+        create_orders(4)
+        Order.objects.filter(pk=Order.objects.order_by('pk')[1].pk).delete()
+
+        assert EstimatedCountPaginator(Order.objects.all(), 2).count == 3
@@ -0,0 +1,263 @@
+from datetime import date, timedelta
+from io import StringIO
+
+import pytest
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from shop.models import DailyCategorySales, DailySweetSales, Order, Sweet, SweetSalesCounter, SweetSalesCounterQuerySet
+
+
+def rollups(model):
+    return list(model.objects.values_list(
+        'date', 'sweet_id' if model is DailySweetSales else 'category', 'units', 'revenue', 'order_count'
+    ))
+
+
+@pytest.mark.django_db
+class TestSalesRollups:
+
+    def test_purchase_skips_rollups(self, api_client, create_regular_user, create_sweet):
+        """Test purchases never touch the per-day rollup rows"""
+        sweet = create_sweet()
+        api_client.force_authenticate(user=create_regular_user)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = api_client.post(reverse('purchase-sweet', kwargs={'pk': sweet.pk}), {'quantity': 2}, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert not [query['sql'] for query in queries if 'daily_' in query['sql']]
+
+    def test_refresh_recent_days(self, api_client, create_regular_user, create_sweet):
+        """Test the periodic rebuild adds today's purchases to the sweet and category rows"""
+        sweet = create_sweet(price=5)
+        api_client.force_authenticate(user=create_regular_user)
+        url = reverse('purchase-sweet', kwargs={'pk': sweet.pk})
+        today = timezone.localdate()
+
+        api_client.post(url, {'quantity': 2}, format='json')
+        api_client.post(url, {'quantity': 3}, format='json')
+        call_command('rebuild_sales_rollups', '--days', '1', stdout=StringIO())
+
+        assert rollups(DailySweetSales) == [(today, sweet.pk, 5, 25, 2)]
+        assert rollups(DailyCategorySales) == [(today, 'traditional', 5, 25, 2)]
+
+    def test_failed_purchase_not_counted(self, api_client, create_regular_user, create_sweet):
+        sweet = create_sweet(quantity=1)
+        api_client.force_authenticate(user=create_regular_user)
+
+        response = api_client.post(reverse('purchase-sweet', kwargs={'pk': sweet.pk}), {'quantity': 2}, format='json')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        call_command('rebuild_sales_rollups', '--days', '1', stdout=StringIO())
+        assert not DailySweetSales.objects.exists()
+
+    def test_checkout_updates_rollups(self, api_client, create_regular_user, create_sweet):
+        """Test a basket adds one row per sweet and merges categories"""
+        barfi = create_sweet(name='Barfi', price=10)
+        ladoo = create_sweet(name='Ladoo', price=4)
+        cake = create_sweet(name='Cake', price=20, category='modern')
+        api_client.force_authenticate(user=create_regular_user)
+
+        response = api_client.post(reverse('checkout'), {'items': [
+            {'sweet': barfi.pk, 'quantity': 1},
+            {'sweet': ladoo.pk, 'quantity': 2},
+            {'sweet': cake.pk, 'quantity': 1},
+        ]}, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        call_command('rebuild_sales_rollups', '--days', '1', stdout=StringIO())
+        today = timezone.localdate()
+        assert sorted(rollups(DailyCategorySales)) == [
+            (today, 'modern', 1, 20, 1),
+            (today, 'traditional', 3, 18, 2),
+        ]
+        assert DailySweetSales.objects.count() == 3
+
+    def test_refresh_leaves_older_days(self, api_client, create_regular_user, create_sweet):
+        """Test --days only rebuilds recent days and a full rebuild backfills the rest"""
+        sweet = create_sweet(price=5)
+        api_client.force_authenticate(user=create_regular_user)
+        for quantity in (1, 2):
+            api_client.post(reverse('purchase-sweet', kwargs={'pk': sweet.pk}), {'quantity': quantity}, format='json')
+        old = Order.objects.create(user=create_regular_user, sweet=sweet, quantity=4, total_price=20)
+        Order.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=3))
+        today = timezone.localdate()
+
+        call_command('rebuild_sales_rollups', '--days', '2', stdout=StringIO())
+        assert rollups(DailySweetSales) == [(today, sweet.pk, 3, 15, 2)]
+
+        call_command('rebuild_sales_rollups', stdout=StringIO())
+
+        assert rollups(DailySweetSales) == [(today - timedelta(days=3), sweet.pk, 4, 20, 1), (today, sweet.pk, 3, 15, 2)]
+        assert rollups(DailyCategorySales) == [
+            (today - timedelta(days=3), 'traditional', 4, 20, 1),
+            (today, 'traditional', 3, 15, 2),
+        ]
+
+    def test_rebuild_date_range(self, create_regular_user, create_sweet):
+        """Test a ranged rebuild leaves other days alone"""
+        sweet = create_sweet()
+        DailySweetSales.objects.create(date=date(2024, 1, 1), sweet=sweet, units=9, revenue=9, order_count=9)
+
+        call_command('rebuild_sales_rollups', '--start', '2024-01-02', stdout=StringIO())
+
+        assert DailySweetSales.objects.get().units == 9
+
+    def test_days_excludes_explicit_range(self):
+        with pytest.raises(CommandError):
+            call_command('rebuild_sales_rollups', '--days', '2', '--start', '2024-01-02', stdout=StringIO())
+
+
+@pytest.mark.django_db
+class TestSalesAnalytics:
+
+    @pytest.fixture
+    def sales(self, create_sweet):
+        barfi = create_sweet(name='Barfi')
+        cake = create_sweet(name='Cake', category='modern')
+        for day, sweet, category, units in [
+            (date(2024, 1, 1), barfi, 'traditional', 2),
+            (date(2024, 1, 2), barfi, 'traditional', 1),
+            (date(2024, 1, 2), cake, 'modern', 5),
+            (date(2024, 2, 1), cake, 'modern', 7),
+        ]:
+            DailySweetSales.objects.create(date=day, sweet=sweet, units=units, revenue=units * 10, order_count=1)
+            DailyCategorySales.objects.create(date=day, category=category, units=units,
+                                              revenue=units * 10, order_count=1)
+        return barfi, cake
+
+    def test_report_by_category(self, api_client, create_admin, sales):
+        api_client.force_authenticate(user=create_admin)
+
+        response = api_client.get(reverse('sales-analytics'), {'start': '2024-01-01', 'end': '2024-01-31'})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['totals'] == {'units': 8, 'revenue': '80.00', 'orders': 3}
+        assert [day['units'] for day in response.data['daily']] == [2, 6]
+        assert response.data['breakdown'] == [
+            {'category': 'modern', 'units': 5, 'revenue': '50.00', 'orders': 1},
+            {'category': 'traditional', 'units': 3, 'revenue': '30.00', 'orders': 2},
+        ]
+
+    def test_report_by_sweet(self, api_client, create_admin, sales):
+        barfi, cake = sales
+        api_client.force_authenticate(user=create_admin)
+
+        response = api_client.get(reverse('sales-analytics'), {
+            'start': '2024-01-01', 'end': '2024-12-31', 'group_by': 'sweet', 'limit': 1
+        })
+
+        assert response.data['breakdown'] == [
+            {'sweet': cake.pk, 'name': 'Cake', 'units': 12, 'revenue': '120.00', 'orders': 2},
+        ]
+
+    def test_report_query_count(self, api_client, create_admin, sales, django_assert_num_queries):
+        """Test the report reads only the rollups, whatever the range"""
+        api_client.force_authenticate(user=create_admin)
+
+        with django_assert_num_queries(2):
+            api_client.get(reverse('sales-analytics'), {'start': '2000-01-01', 'end': '2030-01-01'})
+
+    def test_invalid_range(self, api_client, create_admin):
+        api_client.force_authenticate(user=create_admin)
+
+        response = api_client.get(reverse('sales-analytics'), {'start': '2024-02-01', 'end': '2024-01-01'})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_regular_user_forbidden(self, api_client, create_regular_user):
+        api_client.force_authenticate(user=create_regular_user)
+
+        response = api_client.get(reverse('sales-analytics'))
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+
+@pytest.mark.django_db
+class TestSalesCounters:
+
+    def test_purchases_spread_over_shards(self, api_client, create_regular_user, create_sweet, settings):
+        """Test units sold add up across shards"""
+        settings.SALES_COUNTER_SHARDS = 4
+        sweet = create_sweet(quantity=100)
+        api_client.force_authenticate(user=create_regular_user)
+        for _ in range(20):
+            api_client.post(reverse('purchase-sweet', kwargs={'pk': sweet.pk}), {'quantity': 2}, format='json')
+
+        assert 1 < SweetSalesCounter.objects.filter(sweet=sweet).count() <= 4
+        assert Sweet.objects.get(pk=sweet.pk).units_sold == 40
+        assert Sweet.objects.with_units_sold().get(pk=sweet.pk).units_sold == 40
+
+    def test_unsold_sweet(self, create_sweet):
+        sweet = create_sweet()
+
+        assert sweet.units_sold == 0
+        assert Sweet.objects.with_units_sold().get().units_sold == 0
+
+    def test_compact_keeps_totals(self, create_sweet):
+        barfi, ladoo = create_sweet(name='Barfi'), create_sweet(name='Ladoo')
+        SweetSalesCounter.objects.bulk_create(
+            [SweetSalesCounter(sweet=barfi, shard=shard, units=shard + 1) for shard in range(4)]
+            + [SweetSalesCounter(sweet=ladoo, shard=3, units=7)]
+        )
+
+        call_command('compact_sales_counters', '--batch-size', '1', stdout=StringIO())
+
+        assert sorted(SweetSalesCounter.objects.values_list('sweet_id', 'shard', 'units')) == [
+            (barfi.pk, 0, 10), (ladoo.pk, 3, 7),
+        ]
+
+    def test_compact_keeps_shards_added_meanwhile(self, create_sweet, monkeypatch):
+        """Test a shard created after compact summed the counters is not deleted with them"""
+        sweet = create_sweet()
+        SweetSalesCounter.objects.bulk_create([SweetSalesCounter(sweet=sweet, shard=shard, units=1) for shard in range(2)])
+        delete = SweetSalesCounterQuerySet.delete
+        sales = [4]
+
+        def sell_then_delete(queryset):
+            if sales:
+                SweetSalesCounter.objects.create(sweet=sweet, shard=5, units=sales.pop())
+            return delete(queryset)
+
+        monkeypatch.setattr(SweetSalesCounterQuerySet, 'delete', sell_then_delete)
+        SweetSalesCounter.objects.compact()
+
+        assert Sweet.objects.get().units_sold == 6
+
+    def test_rebuild_from_orders(self, create_regular_user, create_sweet):
+        sweet = create_sweet()
+        Order.objects.create(user=create_regular_user, sweet=sweet, quantity=3, total_price=300)
+        Order.objects.create(user=create_regular_user, sweet=sweet, quantity=2, total_price=200)
+
+        call_command('compact_sales_counters', '--rebuild', stdout=StringIO())
+
+        assert Sweet.objects.get().units_sold == 5
+
+
+@pytest.mark.django_db
+class TestPopularSweets:
+
+    def test_most_sold_first(self, api_client, create_sweet, django_assert_num_queries):
+        barfi, ladoo, cake = create_sweet(name='Barfi'), create_sweet(name='Ladoo'), create_sweet(name='Cake')
+        SweetSalesCounter.objects.bulk_create([
+            SweetSalesCounter(sweet=barfi, shard=0, units=5),
+            SweetSalesCounter(sweet=ladoo, shard=0, units=4),
+            SweetSalesCounter(sweet=ladoo, shard=1, units=4),
+            SweetSalesCounter(sweet=cake, shard=0, units=1),
+        ])
+
+        with django_assert_num_queries(2):
+            response = api_client.get(reverse('sweet-popular'), {'limit': 2})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [(sweet['name'], sweet['units_sold']) for sweet in response.data] == [('Ladoo', 8), ('Barfi', 5)]
+        assert response.data[0]['created_by_name'] == 'Test'
+
+    def test_invalid_limit(self, api_client):
+        response = api_client.get(reverse('sweet-popular'), {'limit': 'many'})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
@@ -0,0 +1,176 @@
+import json
+from decimal import Decimal
+from urllib.parse import urlencode
+
+import pytest
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.http import HttpResponse, QueryDict
+from django.test import AsyncClient, RequestFactory
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from shop import middleware as shop_middleware
+from shop.authentication import ShopRefreshToken
+from shop.models import Sweet, Order
+from shop.search import search_queryset
+from shop.serializers import OrderSerializer, SweetSerializer
+
+
+@pytest.fixture
+def catalog(create_admin):
+    return [
+        Sweet.objects.create(name='Kaju Katli', description='Cashew fudge', price='450.5', quantity=3,
+                             category='premium', created_by=create_admin),
+        Sweet.objects.create(name='Orphan Laddu', price=12, quantity=0, created_by=None),
+        Sweet.objects.create(name='Gulab Jamun', description='Syrup soaked', price='80.00', quantity=25,
+                             created_by=create_admin),
+    ]
+
+
+def fetch(client, url, params=None, **extra):
+    response = client.get(url, params or {}, **extra)
+    assert response.status_code == 200
+    return json.loads(response.content)
+
+
+def rendered(data):
+    return json.loads(JSONRenderer().render(data))
+
+
+@pytest.mark.django_db
+class TestAsyncReadViews:
+    """The async read paths must answer exactly like the serializers"""
+
+    def test_sweet_list_matches_serializer(self, api_client, catalog):
+        expected = rendered(SweetSerializer(Sweet.objects.all(), many=True).data)
+
+        assert fetch(api_client, reverse('async-sweet-list')) == expected
+        assert fetch(api_client, reverse('async-sweet-list'), {'format': 'fastjson'}) == expected
+
+    def test_sweet_list_pages(self, api_client, catalog):
+        expected = rendered(SweetSerializer(Sweet.objects.all(), many=True).data)
+
+        page = fetch(api_client, reverse('async-sweet-list'), {'page_size': 2})
+
+        assert page['results'] == expected[:2]
+        assert fetch(api_client, page['next'])['results'] == expected[2:]
+
+    def test_sweet_detail_matches_serializer(self, api_client, catalog):
+        for sweet in catalog:
+            url = reverse('async-sweet-detail', kwargs={'pk': sweet.pk})
+            assert fetch(api_client, url) == rendered(SweetSerializer(sweet).data)
+
+    def test_sweet_detail_not_found(self, api_client):
+        response = api_client.get(reverse('async-sweet-detail', kwargs={'pk': 999}))
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_search_matches_serializer(self, api_client, catalog):
+        for params in ({'q': 'syrup'}, {'name': 'kaju'}, {'min_price': 50, 'max_price': 100}):
+            expected = SweetSerializer(search_queryset(Sweet.objects.all(), QueryDict(urlencode(params))), many=True)
+            assert fetch(api_client, reverse('async-sweet-search'), params) == rendered(expected.data)
+
+    def test_invalid_cursor(self, api_client, catalog):
+        response = api_client.get(reverse('async-sweet-list'), {'cursor': 'garbage'})
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_format_negotiated_like_sync_view(self, api_client, catalog):
+        """Test only the formats the sync view renders are accepted"""
+        url = reverse('async-sweet-detail', kwargs={'pk': catalog[0].pk})
+
+        assert api_client.get(url, {'format': 'fastjson'}).status_code == status.HTTP_404_NOT_FOUND
+        assert api_client.get(url, HTTP_ACCEPT='application/xml').status_code == status.HTTP_406_NOT_ACCEPTABLE
+
+    def test_browsable_api(self, api_client, catalog):
+        """Test browsers still get the browsable API from the sync view"""
+        response = api_client.get(reverse('async-sweet-list'), HTTP_ACCEPT='text/html')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response['Content-Type'].startswith('text/html')
+        assert b'Kaju Katli' in response.content
+
+    def test_conditional_get(self, api_client, catalog):
+        url = reverse('async-sweet-detail', kwargs={'pk': catalog[0].pk})
+        etag = api_client.get(url)['ETag']
+
+        response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_catalog_reads_are_cached(self, api_client, catalog):
+        url = reverse('async-sweet-list')
+
+        assert api_client.get(url)['X-Cache'] == 'MISS'
+        assert api_client.get(url)['X-Cache'] == 'HIT'
+        assert json.loads(api_client.get(url).content)[0]['name'] == 'Gulab Jamun'
+
+    def test_my_orders_matches_serializer(self, api_client, create_regular_user, catalog):
+        for sweet in catalog:
+            Order.objects.create(user=create_regular_user, sweet=sweet, quantity=2, total_price=Decimal(sweet.price) * 2)
+        token = ShopRefreshToken.for_user(create_regular_user).access_token
+        api_client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+        expected = rendered(OrderSerializer(Order.objects.filter(user=create_regular_user), many=True).data)
+        assert fetch(api_client, reverse('async-my-orders')) == expected
+
+    def test_my_orders_requires_token(self, api_client):
+        response = api_client.get(reverse('async-my-orders'))
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+        assert 'WWW-Authenticate' in response
+
+    def test_my_orders_rejects_revoked_token(self, api_client, create_regular_user):
+        token = ShopRefreshToken.for_user(create_regular_user).access_token
+        create_regular_user.revoke_tokens()
+
+        response = api_client.get(reverse('async-my-orders'), HTTP_AUTHORIZATION=f'Bearer {token}')
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_read_only(self, api_client, create_admin):
+        """Test writes are left to the regular routes"""
+        api_client.force_authenticate(user=create_admin)
+
+        response = api_client.post(reverse('async-sweet-list'), {'name': 'Barfi', 'price': '10.00'}, format='json')
+
+        assert response.status_code == status.HTTP_405_METHOD_NOT_ALLOWED
+        assert response['Allow'] == 'GET, HEAD'
+        assert not Sweet.objects.filter(name='Barfi').exists()
+
+
+@pytest.mark.django_db
+class TestASGIApplication:
+
+    def test_reads_through_asgi_handler(self, catalog):
+        """Test the async views run on the ASGI handler"""
+        client = AsyncClient()
+
+        async def get(url):
+            return await client.get(url)
+
+        response = async_to_sync(get)(reverse('async-sweet-list'))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert json.loads(response.content) == rendered(SweetSerializer(Sweet.objects.all(), many=True).data)
+
+    @pytest.mark.parametrize('name', [
+        'ReplicaRoutingMiddleware', 'RequestTimingMiddleware', 'MetricsMiddleware', 'ProfilingMiddleware',
+    ])
+    def test_middleware_runs_async(self, settings, name):
+        """Test the shop middleware needs no thread of its own under ASGI"""
+        settings.DATABASE_REPLICAS = ['replica1']
+        settings.REQUEST_TIMING_ENABLED = settings.METRICS_ENABLED = settings.PROFILING_ENABLED = True
+
+        async def get_response(request):
+            return HttpResponse()
+
+        middleware = getattr(shop_middleware, name)(get_response)
+
+        assert iscoroutinefunction(middleware)
+        assert async_to_sync(middleware)(RequestFactory().get('/api/sweets/')).status_code == status.HTTP_200_OK
+
+    def test_application_loads(self):
+        from sweetshop.asgi import application
+
+        assert callable(application)
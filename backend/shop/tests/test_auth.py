@@ -1,15 +1,14 @@
+import asyncio
+import threading
+
 import pytest
+from django.contrib.auth.hashers import make_password
 from django.urls import reverse
 from rest_framework import status
-from rest_framework.test import APIClient
+from shop.hashing import get_hashing_pool
 from shop.models import User
 
 
-@pytest.fixture
-def api_client():
-    return APIClient()
-
-
 @pytest.fixture
 def user_data():
     return {
@@ -144,4 +143,78 @@ class TestUserLogin:
         }
         response = api_client.post(login_url, login_data, format='json')
         
-        assert response.status_code == status.HTTP_401_UNAUTHORIZED
\ No newline at end of file
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+@pytest.fixture
+def busy_pool(settings):
+    """
+    A one-worker hashing pool with no queue, held by a blocked job.
+    """
+    settings.PASSWORD_HASHING_WORKERS = 1
+    settings.PASSWORD_HASHING_QUEUE = 0
+    started, release = threading.Event(), threading.Event()
+
+    def block():
+        started.set()
+        release.wait(5)
+
+    holder = threading.Thread(target=asyncio.run, args=(get_hashing_pool().run(block),))
+    holder.start()
+    started.wait(5)
+    yield
+    release.set()
+    holder.join()
+
+
+@pytest.mark.django_db
+class TestPasswordHashingPool:
+    
+    def test_login_rejected_when_pool_full(self, api_client, user_data, busy_pool):
+        """Test logins fail fast with 503 while every hashing slot is taken"""
+        User.objects.create_user(
+            username=user_data['username'], email=user_data['email'],
+            first_name=user_data['first_name'], password=user_data['password']
+        )
+        response = api_client.post(reverse('login'), {
+            'email': user_data['email'], 'password': user_data['password']
+        }, format='json')
+        
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert response['Retry-After'] == '1'
+    
+    def test_register_rejected_when_pool_full(self, api_client, user_data, busy_pool):
+        """Test registration fails fast with 503 and creates no user"""
+        response = api_client.post(reverse('register'), user_data, format='json')
+        
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert not User.objects.filter(email=user_data['email']).exists()
+    
+    def test_catalog_unaffected_when_pool_full(self, api_client, busy_pool):
+        """Test other endpoints keep answering while hashing is saturated"""
+        response = api_client.get(reverse('sweet-list-create'))
+        
+        assert response.status_code == status.HTTP_200_OK
+    
+    def test_outdated_hash_upgraded_on_login(self, api_client, user_data):
+        """Test login re-hashes outdated passwords without revoking tokens"""
+        user = User.objects.create_user(
+            username=user_data['username'], email=user_data['email'], first_name=user_data['first_name']
+        )
+        User.objects.filter(pk=user.pk).update(
+            password=make_password(user_data['password'], hasher='pbkdf2_sha1')
+        )
+        response = api_client.post(reverse('login'), {
+            'email': user_data['email'], 'password': user_data['password']
+        }, format='json')
+        
+        user.refresh_from_db()
+        assert response.status_code == status.HTTP_200_OK
+        assert user.password.startswith('pbkdf2_sha256$')
+        assert user.token_version == 0
+    
+    def test_login_get_not_allowed(self, api_client):
+        """Test the auth endpoints only accept POST"""
+        response = api_client.get(reverse('login'))
+        
+        assert response.status_code == status.HTTP_405_METHOD_NOT_ALLOWED
@@ -0,0 +1,157 @@
+import pytest
+from django.core.cache import caches
+from django.core.checks import run_checks
+from django.urls import reverse
+from rest_framework import status
+from shop.authentication import ShopRefreshToken, token_version_key
+from shop.models import User, Order
+
+
+def authenticate(client, user):
+    token = ShopRefreshToken.for_user(user).access_token
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+
+def user_lookups(queries):
+    return [query['sql'] for query in queries if 'FROM "users"' in query['sql']]
+
+
+@pytest.mark.django_db
+class TestStatelessJWT:
+
+    def test_token_carries_claims(self, create_admin):
+        """Test access tokens embed the claims permissions need"""
+        token = ShopRefreshToken.for_user(create_admin).access_token
+
+        assert token['role'] == 'admin'
+        assert token['email'] == 'admin@example.com'
+        assert token['ver'] == 0
+
+    def test_login_token_authorizes(self, api_client, create_admin, create_sweet):
+        """Test the token returned by login works for admin endpoints"""
+        sweet = create_sweet(quantity=5)
+        response = api_client.post(reverse('login'), {
+            'email': 'admin@example.com', 'password': 'TestPass123!'
+        }, format='json')
+        api_client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['user']['token']}")
+
+        response = api_client.post(reverse('restock-sweet', kwargs={'pk': sweet.pk}), {'quantity': 5}, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_admin_check_skips_user_lookup(self, api_client, create_admin, create_sweet, django_assert_num_queries):
+        """Test a warm token authorizes an admin call with no users query"""
+        sweet = create_sweet()
+        authenticate(api_client, create_admin)
+        url = reverse('restock-sweet', kwargs={'pk': sweet.pk})
+        api_client.post(url, {'quantity': 1}, format='json')
+
+        with django_assert_num_queries(3) as captured:
+            response = api_client.post(url, {'quantity': 1}, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert user_lookups(captured.captured_queries) == []
+
+    def test_purchase_skips_user_lookup(self, api_client, create_regular_user, create_sweet, django_assert_max_num_queries,
+                                        settings):
+        """Test repeat purchases reuse the cached user for the order"""
+        # One counter shard, so the second purchase updates the row the first created
+        settings.SALES_COUNTER_SHARDS = 1
+        sweet = create_sweet()
+        authenticate(api_client, create_regular_user)
+        url = reverse('purchase-sweet', kwargs={'pk': sweet.pk})
+        api_client.post(url, {'quantity': 1}, format='json')
+
+        with django_assert_max_num_queries(10) as captured:
+            response = api_client.post(url, {'quantity': 1}, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert user_lookups(captured.captured_queries) == []
+        assert Order.objects.filter(user=create_regular_user).count() == 2
+
+    def test_regular_user_denied(self, api_client, create_regular_user, create_sweet):
+        """Test the role claim is enforced"""
+        sweet = create_sweet()
+        authenticate(api_client, create_regular_user)
+
+        response = api_client.post(reverse('restock-sweet', kwargs={'pk': sweet.pk}), {'quantity': 1}, format='json')
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_role_change_revokes_tokens(self, api_client, create_admin, create_sweet):
+        """Test demoting an admin invalidates tokens issued before"""
+        sweet = create_sweet()
+        authenticate(api_client, create_admin)
+        url = reverse('restock-sweet', kwargs={'pk': sweet.pk})
+        assert api_client.post(url, {'quantity': 1}, format='json').status_code == status.HTTP_200_OK
+
+        admin = User.objects.get(pk=create_admin.pk)
+        admin.role = 'user'
+        admin.save(update_fields=['role'])
+
+        response = api_client.post(url, {'quantity': 1}, format='json')
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+        authenticate(api_client, User.objects.get(pk=create_admin.pk))
+        response = api_client.post(url, {'quantity': 1}, format='json')
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    def test_role_change_reaches_other_workers(self, api_client, create_admin, create_sweet, settings):
+        """Test a revocation drops the token version every worker reads"""
+        authenticate(api_client, create_admin)
+        api_client.post(reverse('restock-sweet', kwargs={'pk': create_sweet().pk}), {'quantity': 1}, format='json')
+        # A separate cache object shares no memory with this one, like another worker's
+        other_worker = caches.create_connection(settings.AUTH_CACHE_ALIAS)
+        assert other_worker.get(token_version_key(create_admin.pk)) == 0
+
+        admin = User.objects.get(pk=create_admin.pk)
+        admin.role = 'user'
+        admin.save(update_fields=['role'])
+
+        assert other_worker.get(token_version_key(create_admin.pk)) is None
+
+    def test_deactivation_revokes_tokens(self, api_client, create_regular_user):
+        """Test deactivated users cannot keep using their tokens"""
+        authenticate(api_client, create_regular_user)
+        assert api_client.get(reverse('my-orders')).status_code == status.HTTP_200_OK
+
+        user = User.objects.get(pk=create_regular_user.pk)
+        user.is_active = False
+        user.save()
+
+        assert api_client.get(reverse('my-orders')).status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_revoke_tokens(self, api_client, create_regular_user):
+        """Test revoke_tokens() invalidates existing tokens"""
+        authenticate(api_client, create_regular_user)
+        assert api_client.get(reverse('my-orders')).status_code == status.HTTP_200_OK
+
+        create_regular_user.revoke_tokens()
+
+        assert create_regular_user.token_version == 1
+        assert api_client.get(reverse('my-orders')).status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_unrelated_save_keeps_tokens(self, api_client, create_regular_user):
+        """Test saving fields outside the claims keeps tokens valid"""
+        authenticate(api_client, create_regular_user)
+        user = User.objects.get(pk=create_regular_user.pk)
+        user.username = 'renamed'
+        user.save()
+
+        assert user.token_version == 0
+        assert api_client.get(reverse('my-orders')).status_code == status.HTTP_200_OK
+
+
+class TestAuthCacheCheck:
+
+    def test_per_process_cache_rejected_in_production(self, settings):
+        """Test the system check refuses a locmem auth cache when DEBUG is off"""
+        settings.DEBUG = False
+        settings.AUTH_CACHE_ALIAS = 'default'
+
+        assert [error.id for error in run_checks(tags=['security'])] == ['shop.E003']
+
+    def test_shared_cache_accepted(self, settings):
+        settings.DEBUG = False
+
+        assert run_checks(tags=['security']) == []
@@ -0,0 +1,167 @@
+import time
+
+import pytest
+from django.core.cache import caches
+from django.core.checks import run_checks
+from django.urls import reverse
+from rest_framework import status
+from shop.cache import VERSION_KEY, stats
+
+
+@pytest.fixture(autouse=True)
+def reset_stats():
+    stats.reset()
+
+
+@pytest.mark.django_db
+class TestCatalogCache:
+
+    def test_repeat_reads_are_cached(self, api_client, create_sweet):
+        """Test the second identical read is served from the cache"""
+        sweet = create_sweet()
+        for url in (
+            reverse('sweet-list-create'),
+            reverse('sweet-detail', kwargs={'pk': sweet.pk}),
+            reverse('sweet-search') + '?category=traditional',
+        ):
+            assert api_client.get(url)['X-Cache'] == 'MISS'
+            assert api_client.get(url)['X-Cache'] == 'HIT'
+
+        assert stats.as_dict()['hits'] == 3
+        assert stats.as_dict()['misses'] == 3
+
+    def test_cached_read_skips_database(self, api_client, create_sweet, django_assert_num_queries):
+        """Test a cache hit runs no SQL"""
+        create_sweet()
+        url = reverse('sweet-list-create')
+        api_client.get(url)
+
+        with django_assert_num_queries(0):
+            response = api_client.get(url)
+        assert len(response.data) == 1
+
+    def test_purchase_invalidates(self, api_client, create_regular_user, create_sweet):
+        """Test readers see the new stock right after a purchase"""
+        sweet = create_sweet(quantity=10)
+        detail_url = reverse('sweet-detail', kwargs={'pk': sweet.pk})
+        api_client.get(detail_url)
+
+        api_client.force_authenticate(user=create_regular_user)
+        api_client.post(reverse('purchase-sweet', kwargs={'pk': sweet.pk}), {'quantity': 3}, format='json')
+
+        response = api_client.get(detail_url)
+        assert response['X-Cache'] == 'MISS'
+        assert response.data['quantity'] == 7
+
+    def test_restock_invalidates(self, api_client, create_admin, create_sweet):
+        """Test readers see the new stock right after a restock"""
+        sweet = create_sweet(quantity=5)
+        list_url = reverse('sweet-list-create')
+        api_client.get(list_url)
+
+        api_client.force_authenticate(user=create_admin)
+        api_client.post(reverse('restock-sweet', kwargs={'pk': sweet.pk}), {'quantity': 10}, format='json')
+
+        assert api_client.get(list_url).data[0]['quantity'] == 15
+
+    def test_checkout_invalidates(self, api_client, create_regular_user, create_sweet):
+        """Test readers see the new stock right after a checkout"""
+        sweet = create_sweet(quantity=5)
+        list_url = reverse('sweet-list-create')
+        api_client.get(list_url)
+
+        api_client.force_authenticate(user=create_regular_user)
+        api_client.post(reverse('checkout'), {'items': [{'sweet': sweet.pk, 'quantity': 2}]}, format='json')
+
+        assert api_client.get(list_url).data[0]['quantity'] == 3
+
+    def test_create_update_delete_invalidate(self, api_client, create_admin, create_sweet):
+        """Test admin writes through the API invalidate cached reads"""
+        sweet = create_sweet(name='Old Name')
+        list_url = reverse('sweet-list-create')
+        detail_url = reverse('sweet-detail', kwargs={'pk': sweet.pk})
+        api_client.force_authenticate(user=create_admin)
+        api_client.get(list_url)
+
+        api_client.patch(detail_url, {'name': 'New Name'}, format='json')
+        assert api_client.get(list_url).data[0]['name'] == 'New Name'
+
+        api_client.post(list_url, {'name': 'Barfi', 'price': '10.00', 'quantity': 1}, format='json')
+        assert len(api_client.get(list_url).data) == 2
+
+        api_client.delete(detail_url)
+        assert len(api_client.get(list_url).data) == 1
+
+    def test_cache_can_be_disabled(self, api_client, create_sweet, settings):
+        """Test reads bypass the cache when it is disabled"""
+        settings.CATALOG_CACHE_ENABLED = False
+        create_sweet()
+        url = reverse('sweet-list-create')
+
+        api_client.get(url)
+        response = api_client.get(url)
+
+        assert 'X-Cache' not in response
+        assert stats.as_dict()['misses'] == 0
+
+    def test_bump_from_another_worker_invalidates(self, api_client, settings, create_sweet):
+        """Test a version bumped by another process is seen here; the default cache lives on disk"""
+        create_sweet()
+        url = reverse('sweet-list-create')
+        api_client.get(url)
+        # A separate cache object shares no memory with this one, like another worker's
+        other_worker = caches.create_connection(settings.CATALOG_CACHE_ALIAS)
+
+        other_worker.set(VERSION_KEY, time.time_ns(), timeout=None)
+
+        assert api_client.get(url)['X-Cache'] == 'MISS'
+
+
+class TestCatalogCacheCheck:
+
+    def test_per_process_cache_rejected_in_production(self, settings):
+        """Test the system check refuses a locmem catalog cache when DEBUG is off"""
+        settings.DEBUG = False
+        settings.CACHES = {
+            **settings.CACHES,
+            settings.CATALOG_CACHE_ALIAS: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        }
+
+        # The auth cache shares the catalog cache (shop.E003); checks run in no set order
+        assert {error.id for error in run_checks(tags=['caches'])} == {'shop.E001', 'shop.E003'}
+
+        # The catalog ETags still use the version
+        settings.CATALOG_CACHE_ENABLED = False
+        assert {error.id for error in run_checks(tags=['caches'])} == {'shop.E001', 'shop.E003'}
+
+    def test_shared_cache_accepted(self, settings):
+        settings.DEBUG = False
+
+        assert run_checks(tags=['caches']) == []
+
+
+@pytest.mark.django_db
+class TestCacheStats:
+
+    def test_stats_as_admin(self, api_client, create_admin, create_sweet):
+        """Test admins can read the hit/miss counters"""
+        create_sweet()
+        url = reverse('sweet-list-create')
+        api_client.get(url)
+        api_client.get(url)
+        api_client.force_authenticate(user=create_admin)
+
+        response = api_client.get(reverse('cache-stats'))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['hits'] == 1
+        assert response.data['misses'] == 1
+        assert response.data['hit_ratio'] == 0.5
+
+    def test_stats_as_user(self, api_client, create_regular_user):
+        """Test regular users cannot read cache stats"""
+        api_client.force_authenticate(user=create_regular_user)
+
+        response = api_client.get(reverse('cache-stats'))
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
@@ -0,0 +1,131 @@
+import threading
+import time
+
+import pytest
+from django.db import connection
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from shop.models import Sweet, Order, Reservation
+
+
+THREADS = 8
+ATTEMPTS_PER_THREAD = 25
+INITIAL_STOCK = 100
+
+
+MAX_LOCKED_RETRIES = 1000
+
+
+def post_until_done(client, url, data=None):
+    """
+    POST, retrying while SQLite reports the database as locked. Any other
+    server error, or a lock that never clears, fails the test.
+    """
+    for _ in range(MAX_LOCKED_RETRIES):
+        response = client.post(url, data, format='json')
+        if response.status_code != status.HTTP_500_INTERNAL_SERVER_ERROR:
+            return response
+        assert 'database is locked' in response.data.get('error', ''), response.data
+        # Lock contention surfaced by SQLite; back off and retry.
+        time.sleep(0.001)
+    raise AssertionError(f'Database still locked after {MAX_LOCKED_RETRIES} retries')
+
+
+def purchase_until_done(user, url, attempts, results):
+    """
+    Fire `attempts` purchases of one unit each, retrying while SQLite
+    reports the database as locked.
+    """
+    client = APIClient()
+    client.force_authenticate(user=user)
+    try:
+        for _ in range(attempts):
+            results.append(post_until_done(client, url, {'quantity': 1}).status_code)
+    finally:
+        connection.close()
+
+
+def reserve_and_buy(user, sweet_pk, attempts, results):
+    """
+    Reserve one unit and, when the hold succeeds, confirm it.
+    """
+    client = APIClient()
+    client.force_authenticate(user=user)
+    try:
+        for _ in range(attempts):
+            response = post_until_done(client, reverse('reserve-sweet', kwargs={'pk': sweet_pk}), {'quantity': 1})
+            if response.status_code == status.HTTP_201_CREATED:
+                url = reverse('confirm-reservation', kwargs={'pk': response.data['reservation']['id']})
+                response = post_until_done(client, url)
+            results.append(response.status_code)
+    finally:
+        connection.close()
+
+
+@pytest.mark.django_db(transaction=True)
+class TestConcurrentPurchase:
+
+    def test_concurrent_purchases_never_oversell(self, create_user):
+        """Test many threads buying the same sweet never oversell it"""
+        admin = create_user(email='admin@example.com', role='admin')
+        buyer = create_user(email='buyer@example.com')
+        sweet = Sweet.objects.create(
+            name='Festival Laddu', price=10, quantity=INITIAL_STOCK,
+            category='festival', created_by=admin
+        )
+        url = reverse('purchase-sweet', kwargs={'pk': sweet.pk})
+
+        results = []
+        threads = [
+            threading.Thread(target=purchase_until_done, args=(buyer, url, ATTEMPTS_PER_THREAD, results))
+            for _ in range(THREADS)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        succeeded = results.count(status.HTTP_200_OK)
+        rejected = results.count(status.HTTP_400_BAD_REQUEST)
+        print(f"\n{succeeded} purchases in {elapsed:.2f}s "
+              f"({len(results) / elapsed:.0f} purchases/sec, {rejected} rejected)")
+
+        sweet.refresh_from_db()
+        assert len(results) == THREADS * ATTEMPTS_PER_THREAD
+        assert succeeded == INITIAL_STOCK
+        assert rejected == THREADS * ATTEMPTS_PER_THREAD - INITIAL_STOCK
+        assert sweet.quantity == 0
+        assert Order.objects.count() == INITIAL_STOCK
+
+    def test_concurrent_reservations_never_oversell(self, create_user):
+        """Test racing holds and purchases never promise more than the stock"""
+        admin = create_user(email='admin@example.com', role='admin')
+        buyer = create_user(email='buyer@example.com')
+        sweet = Sweet.objects.create(
+            name='Festival Laddu', price=10, quantity=INITIAL_STOCK,
+            category='festival', created_by=admin
+        )
+        purchase_url = reverse('purchase-sweet', kwargs={'pk': sweet.pk})
+
+        results = []
+        threads = [
+            threading.Thread(target=reserve_and_buy, args=(buyer, sweet.pk, ATTEMPTS_PER_THREAD, results))
+            for _ in range(THREADS // 2)
+        ] + [
+            threading.Thread(target=purchase_until_done, args=(buyer, purchase_url, ATTEMPTS_PER_THREAD, results))
+            for _ in range(THREADS // 2)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        sweet.refresh_from_db()
+        assert len(results) == THREADS * ATTEMPTS_PER_THREAD
+        assert results.count(status.HTTP_200_OK) == INITIAL_STOCK
+        assert sweet.quantity == 0
+        assert Order.objects.count() == INITIAL_STOCK
+        assert not Reservation.objects.filter(status='active').exists()
@@ -0,0 +1,117 @@
+import time
+
+import pytest
+from django.core.cache import caches
+from django.urls import reverse
+from rest_framework import status
+from shop.cache import VERSION_KEY
+
+
+@pytest.mark.django_db
+class TestConditionalGet:
+
+    @pytest.mark.parametrize('url_name', ['sweet-list-create', 'sweet-search'])
+    def test_collection_not_modified(self, api_client, create_sweet, url_name, django_assert_num_queries):
+        """Test a matching If-None-Match returns 304 without touching the database"""
+        create_sweet()
+        url = reverse(url_name)
+        response = api_client.get(url)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.has_header('ETag')
+        assert response.has_header('Last-Modified')
+
+        with django_assert_num_queries(0):
+            response = api_client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+        assert response.content == b''
+
+    def test_collection_etag_changes_after_write(self, api_client, create_regular_user, create_sweet):
+        """Test a purchase changes the catalog ETag"""
+        sweet = create_sweet()
+        url = reverse('sweet-list-create')
+        etag = api_client.get(url)['ETag']
+
+        api_client.force_authenticate(user=create_regular_user)
+        api_client.post(reverse('purchase-sweet', kwargs={'pk': sweet.pk}), {'quantity': 1}, format='json')
+
+        response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data[0]['quantity'] == 9
+
+    def test_collection_etag_changes_after_write_elsewhere(self, api_client, settings, create_sweet):
+        """Test a write bumped by another worker process is not answered with 304 here"""
+        settings.CATALOG_CACHE_ENABLED = False
+        create_sweet()
+        url = reverse('sweet-list-create')
+        etag = api_client.get(url)['ETag']
+        # A separate cache object shares no memory with this one, like another worker's
+        other_worker = caches.create_connection(settings.CATALOG_CACHE_ALIAS)
+
+        other_worker.set(VERSION_KEY, time.time_ns(), timeout=None)
+
+        assert api_client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == status.HTTP_200_OK
+
+    def test_detail_not_modified(self, api_client, create_sweet):
+        """Test detail conditional GET by ETag and by date"""
+        sweet = create_sweet()
+        url = reverse('sweet-detail', kwargs={'pk': sweet.pk})
+        response = api_client.get(url)
+
+        assert api_client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code == status.HTTP_304_NOT_MODIFIED
+        assert api_client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+        ).status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_detail_etag_changes_after_purchase(self, api_client, create_regular_user, create_sweet):
+        """Test stock changes produce a new detail ETag"""
+        sweet = create_sweet()
+        url = reverse('sweet-detail', kwargs={'pk': sweet.pk})
+        etag = api_client.get(url)['ETag']
+
+        api_client.force_authenticate(user=create_regular_user)
+        api_client.post(reverse('purchase-sweet', kwargs={'pk': sweet.pk}), {'quantity': 1}, format='json')
+
+        assert api_client.get(url, HTTP_IF_NONE_MATCH=etag).status_code == status.HTTP_200_OK
+
+    def test_detail_nonexistent(self, api_client):
+        """Test conditional GET of a missing sweet still 404s"""
+        url = reverse('sweet-detail', kwargs={'pk': 9999})
+        response = api_client.get(url, HTTP_IF_NONE_MATCH='"anything"')
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+class TestIfMatch:
+
+    def test_update_with_current_etag(self, api_client, create_admin, create_sweet):
+        """Test PATCH with the current ETag succeeds and returns the new one"""
+        sweet = create_sweet(name='Old Name')
+        url = reverse('sweet-detail', kwargs={'pk': sweet.pk})
+        etag = api_client.get(url)['ETag']
+        api_client.force_authenticate(user=create_admin)
+
+        response = api_client.patch(url, {'name': 'New Name'}, format='json', HTTP_IF_MATCH=etag)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response['ETag'] != etag
+        assert api_client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code == status.HTTP_304_NOT_MODIFIED
+
+    def test_update_with_stale_etag(self, api_client, create_admin, create_sweet):
+        """Test PUT/PATCH with an outdated ETag is refused with 412"""
+        sweet = create_sweet(name='Old Name')
+        url = reverse('sweet-detail', kwargs={'pk': sweet.pk})
+        etag = api_client.get(url)['ETag']
+        api_client.force_authenticate(user=create_admin)
+        api_client.patch(url, {'name': 'Someone Else'}, format='json')
+
+        patch = api_client.patch(url, {'name': 'Lost Update'}, format='json', HTTP_IF_MATCH=etag)
+        put = api_client.put(url, {
+            'name': 'Lost Update', 'price': '150.00', 'quantity': 20, 'category': 'modern'
+        }, format='json', HTTP_IF_MATCH=etag)
+
+        assert patch.status_code == status.HTTP_412_PRECONDITION_FAILED
+        assert put.status_code == status.HTTP_412_PRECONDITION_FAILED
+        sweet.refresh_from_db()
+        assert sweet.name == 'Someone Else'
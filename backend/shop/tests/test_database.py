@@ -0,0 +1,88 @@
+import sqlite3
+
+import pytest
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, transaction
+from django.db.utils import ConnectionHandler
+from django.test.utils import CaptureQueriesContext
+
+
+def configure(**database):
+    # Fill in the defaults Django adds to every DATABASES entry
+    return ConnectionHandler({'default': database}).settings['default']
+
+
+@pytest.fixture
+def production_db(tmp_path, django_db_blocker):
+    """
+    A 'production' connection configured like the production profile,
+    on a scratch file.
+    """
+    connections.settings['production'] = configure(
+        **settings.DATABASE_PROFILES['production'],
+        NAME=str(tmp_path / 'production.sqlite3')
+    )
+    with django_db_blocker.unblock():
+        yield connections['production']
+        connections['production'].close()
+    del connections['production']
+    del connections.settings['production']
+
+
+def pragma(connection, name):
+    with connection.cursor() as cursor:
+        cursor.execute(f'PRAGMA {name}')
+        return cursor.fetchone()[0]
+
+
+class TestProductionProfile:
+
+    def test_pragmas_applied_on_connect(self, production_db):
+        """Test every new connection runs the tuning PRAGMAs"""
+        assert pragma(production_db, 'journal_mode') == 'wal'
+        assert pragma(production_db, 'synchronous') == 1  # NORMAL
+        assert pragma(production_db, 'busy_timeout') == settings.SQLITE_PRAGMAS['busy_timeout']
+        assert pragma(production_db, 'cache_size') == settings.SQLITE_PRAGMAS['cache_size']
+        assert pragma(production_db, 'foreign_keys') == 1
+
+    def test_atomic_begins_immediate(self, production_db):
+        """Test atomic() blocks take the write lock up front"""
+        with CaptureQueriesContext(production_db) as captured:
+            with transaction.atomic(using='production'):
+                pragma(production_db, 'user_version')
+
+        assert captured.captured_queries[0]['sql'] == 'BEGIN IMMEDIATE'
+
+    def test_immediate_transaction_blocks_other_writers(self, production_db):
+        """Test a second writer cannot start while a transaction is open"""
+        with production_db.cursor() as cursor:
+            cursor.execute('CREATE TABLE counter (value INTEGER)')
+        other = sqlite3.connect(production_db.settings_dict['NAME'], timeout=0)
+
+        try:
+            with transaction.atomic(using='production'):
+                with pytest.raises(sqlite3.OperationalError, match='locked'):
+                    other.execute('INSERT INTO counter VALUES (1)')
+        finally:
+            other.close()
+
+    def test_invalid_transaction_mode(self, tmp_path):
+        """Test a typo in transaction_mode fails loudly"""
+        handler = ConnectionHandler({
+            'default': {
+                'ENGINE': 'sweetshop.sqlite_backend',
+                'NAME': str(tmp_path / 'broken.sqlite3'),
+                'OPTIONS': {'transaction_mode': 'IMMEDIATELY'},
+            }
+        })
+
+        with pytest.raises(ImproperlyConfigured):
+            handler['default']
+
+    def test_persistent_connections(self):
+        """Test the production profile keeps connections open"""
+        profile = settings.DATABASE_PROFILES['production']
+
+        assert profile['CONN_MAX_AGE'] > 0
+        assert profile['CONN_HEALTH_CHECKS'] is True
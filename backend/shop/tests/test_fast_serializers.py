@@ -0,0 +1,60 @@
+import json
+from decimal import Decimal
+
+import pytest
+from django.urls import reverse
+from shop.models import Sweet, Order
+
+
+@pytest.fixture
+def catalog(create_admin):
+    return [
+        Sweet.objects.create(name='Kaju Katli', description='Cashew fudge', price='450.5', quantity=3,
+                             category='premium', image='🍬', created_by=create_admin),
+        Sweet.objects.create(name='Orphan Laddu', price=12, quantity=0, created_by=None),
+        Sweet.objects.create(name='Jalebi', price='80.00', quantity=25, created_by=create_admin),
+    ]
+
+
+def fetch(client, url, params=None, fast=False):
+    params = dict(params or {})
+    if fast:
+        params['format'] = 'fastjson'
+    response = client.get(url, params)
+    assert response.status_code == 200
+    return json.loads(response.content)
+
+
+@pytest.mark.django_db
+class TestFastReadPath:
+    """The fast path must produce byte-for-byte the same JSON shape"""
+
+    def test_sweet_list_matches_serializer(self, api_client, catalog):
+        url = reverse('sweet-list-create')
+        assert fetch(api_client, url, fast=True) == fetch(api_client, url)
+
+    def test_sweet_list_pages_match_serializer(self, api_client, catalog):
+        url = reverse('sweet-list-create')
+        fast = fetch(api_client, url, {'page_size': 2}, fast=True)
+        regular = fetch(api_client, url, {'page_size': 2})
+
+        assert fast['results'] == regular['results']
+        next_page = fetch(api_client, fast['next'])
+        assert next_page['results'] == fetch(api_client, regular['next'])['results']
+
+    def test_my_orders_matches_serializer(self, api_client, create_regular_user, catalog):
+        for sweet in catalog:
+            Order.objects.create(user=create_regular_user, sweet=sweet, quantity=2, total_price=Decimal(sweet.price) * 2)
+        api_client.force_authenticate(user=create_regular_user)
+        url = reverse('my-orders')
+
+        assert fetch(api_client, url, fast=True) == fetch(api_client, url)
+
+    def test_fast_list_single_query(self, api_client, catalog, django_assert_num_queries):
+        with django_assert_num_queries(1):
+            api_client.get(reverse('sweet-list-create'), {'format': 'fastjson'})
+
+    def test_regular_json_by_default(self, api_client, catalog):
+        response = api_client.get(reverse('sweet-list-create'))
+
+        assert response.accepted_renderer.format == 'json'
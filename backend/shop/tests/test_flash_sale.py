@@ -0,0 +1,223 @@
+import threading
+from concurrent.futures import Future
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from shop.flash_sale import Admission, FlashSales, Purchase, SoldOut, get_flash_sales
+from shop.models import Order, Sweet, SweetQuerySet
+
+
+@pytest.fixture(autouse=True)
+def fresh_flash_sales(settings):
+    """Changing the setting drops the admission state of earlier tests."""
+    settings.FLASH_SALE_REFRESH_SECONDS = 60
+
+
+@pytest.fixture
+def create_sweet(create_sweet):
+    """Sweets are on flash sale unless a test says otherwise."""
+    def make_sweet(**kwargs):
+        return create_sweet(**{'flash_sale': True, **kwargs})
+    return make_sweet
+
+
+def purchase(client, sweet, quantity=1):
+    return client.post(reverse('purchase-sweet', kwargs={'pk': sweet.pk}), {'quantity': quantity}, format='json')
+
+
+@pytest.mark.django_db(transaction=True)
+class TestFlashSalePurchase:
+
+    def test_purchase_through_queue(self, api_client, create_regular_user, create_sweet):
+        sweet = create_sweet(price=5, quantity=10)
+        api_client.force_authenticate(user=create_regular_user)
+
+        response = purchase(api_client, sweet, 3)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['remaining_quantity'] == 7
+        assert response.data['order']['total_price'] == '15.00'
+        assert response.data['order']['sweet_name'] == 'Test Sweet'
+        assert get_flash_sales().is_running(sweet.pk)
+        sweet.refresh_from_db()
+        assert sweet.quantity == 7
+        assert sweet.units_sold == 3
+
+    def test_sold_out_rejected_without_queries(self, api_client, create_regular_user, create_sweet):
+        """Test requests beyond the stock never reach the database"""
+        sweet = create_sweet(quantity=2)
+        api_client.force_authenticate(user=create_regular_user)
+        assert purchase(api_client, sweet, 2).status_code == status.HTTP_200_OK
+
+        with CaptureQueriesContext(connection) as queries:
+            response = purchase(api_client, sweet)
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data['error'] == 'Insufficient quantity. Only 0 available.'
+        assert len(queries) == 0
+        assert Order.objects.count() == 1
+
+    def test_invalid_quantity(self, api_client, create_regular_user, create_sweet):
+        sweet = create_sweet()
+        api_client.force_authenticate(user=create_regular_user)
+        purchase(api_client, sweet)
+
+        response = purchase(api_client, sweet, 0)
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert Order.objects.count() == 1
+
+    def test_queue_timeout(self, api_client, create_regular_user, create_sweet, settings, monkeypatch):
+        """Test a purchase still queued after FLASH_SALE_TIMEOUT is withdrawn with a 503"""
+        settings.FLASH_SALE_TIMEOUT = 0.01
+        sweet = create_sweet()
+        api_client.force_authenticate(user=create_regular_user)
+        queued = Future()
+        monkeypatch.setattr(FlashSales, 'admit', lambda self, pk, user, quantity: queued)
+
+        response = purchase(api_client, sweet)
+
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert response['Retry-After'] == '1'
+        assert queued.cancelled()
+        assert not Order.objects.exists()
+
+    def test_saving_sweet_reloads_budget(self, api_client, create_regular_user, create_sweet):
+        """Test a restock or an ended sale is seen before the refresh interval"""
+        sweet = create_sweet(quantity=1)
+        api_client.force_authenticate(user=create_regular_user)
+        purchase(api_client, sweet)
+
+        Sweet.objects.increment_stock(sweet.pk, 1)
+        assert purchase(api_client, sweet).status_code == status.HTTP_400_BAD_REQUEST
+        sweet.refresh_from_db()
+        sweet.flash_sale = False
+        sweet.save()
+
+        assert not get_flash_sales().is_running(sweet.pk)
+        assert purchase(api_client, sweet).status_code == status.HTTP_200_OK
+
+    def test_concurrent_buyers_never_oversell(self, create_regular_user, create_sweet):
+        sweet = create_sweet(quantity=10)
+        results = []
+
+        def buy():
+            client = APIClient()
+            client.force_authenticate(user=create_regular_user)
+            try:
+                for _ in range(5):
+                    results.append(purchase(client, sweet).status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buy) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        sweet.refresh_from_db()
+        assert results.count(status.HTTP_200_OK) == 10
+        assert results.count(status.HTTP_400_BAD_REQUEST) == 20
+        assert sweet.quantity == 0
+        assert Order.objects.count() == 10
+
+
+@pytest.mark.django_db(transaction=True)
+class TestCommitter:
+
+    def test_dead_committer_replaced(self, create_regular_user, create_sweet):
+        """Test a committer thread that died is not reused"""
+        sweet = create_sweet(quantity=10)
+        flash_sales = FlashSales(batch_size=10, refresh_seconds=60)
+        dead = threading.Thread(target=lambda: None)
+        dead.start()
+        dead.join()
+        flash_sales._committer = dead
+
+        order, remaining = flash_sales.admit(sweet.pk, create_regular_user, 2).result(timeout=10)
+
+        assert flash_sales._committer is not dead
+        assert remaining == 8
+
+    def test_failing_batch_keeps_committer(self, create_regular_user, create_sweet, monkeypatch):
+        """Test one batch raising fails its buyers but not the ones after it"""
+        sweet = create_sweet(quantity=10)
+        flash_sales = FlashSales(batch_size=10, refresh_seconds=60)
+        commit_batch = flash_sales._commit_batch
+        calls = []
+
+        def fail_once(batch):
+            calls.append(batch)
+            if len(calls) == 1:
+                raise RuntimeError('boom')
+            commit_batch(batch)
+
+        monkeypatch.setattr(flash_sales, '_commit_batch', fail_once)
+
+        with pytest.raises(RuntimeError):
+            flash_sales.admit(sweet.pk, create_regular_user, 1).result(timeout=10)
+        committer = flash_sales._committer
+        order, remaining = flash_sales.admit(sweet.pk, create_regular_user, 1).result(timeout=10)
+
+        assert committer.is_alive()
+        assert flash_sales._committer is committer
+        assert order.quantity == 1
+
+
+@pytest.mark.django_db
+class TestBatchCommit:
+
+    def queue(self, sweet, user, *quantities):
+        admission = Admission(sweet)
+        admission.pending = sum(quantities)
+        return [Purchase(admission, user, quantity) for quantity in quantities]
+
+    def test_one_update_per_batch(self, create_regular_user, create_sweet):
+        """Test a batch takes its stock in one UPDATE and inserts orders together"""
+        sweet = create_sweet(quantity=10)
+        purchases = self.queue(sweet, create_regular_user, 1, 2, 3)
+
+        with CaptureQueriesContext(connection) as queries:
+            FlashSales(batch_size=10, refresh_seconds=60)._commit(purchases)
+
+        statements = [query['sql'] for query in queries]
+        assert sum(sql.startswith('UPDATE "sweets"') for sql in statements) == 1
+        assert sum(sql.startswith('INSERT INTO "orders"') for sql in statements) == 1
+        assert [purchase.future.result()[1] for purchase in purchases] == [4, 4, 4]
+        assert sorted(Order.objects.values_list('quantity', flat=True)) == [1, 2, 3]
+        assert purchases[0].admission.pending == 0
+
+    def test_stock_taken_elsewhere(self, create_regular_user, create_sweet):
+        """Test an over-admitted batch is served first come, first served"""
+        sweet = create_sweet(quantity=3)
+        purchases = self.queue(sweet, create_regular_user, 2, 2, 1)
+
+        FlashSales(batch_size=10, refresh_seconds=60)._commit(purchases)
+
+        first, second, third = purchases
+        assert first.future.result()[0].quantity == 2
+        assert third.future.result()[0].quantity == 1
+        with pytest.raises(SoldOut):
+            second.future.result()
+        assert Sweet.objects.get().quantity == 0
+        assert first.admission.loaded_at == float('-inf')
+
+    def test_stock_moved_again(self, create_regular_user, create_sweet, monkeypatch):
+        """Test no order is created when the second stock UPDATE matches no row either"""
+        sweet = create_sweet(quantity=10)
+        purchases = self.queue(sweet, create_regular_user, 1, 2)
+        monkeypatch.setattr(SweetQuerySet, 'decrement_stock', lambda self, pk, quantity: False)
+
+        FlashSales(batch_size=10, refresh_seconds=60)._commit(purchases)
+
+        for purchase in purchases:
+            with pytest.raises(SoldOut):
+                purchase.future.result()
+        assert not Order.objects.exists()
+        assert Sweet.objects.get().quantity == 10
+        assert purchases[0].admission.loaded_at == float('-inf')
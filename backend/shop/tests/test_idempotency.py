@@ -0,0 +1,217 @@
+import threading
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+from shop.idempotency import claim_key
+from shop.models import IdempotencyKey, Order, Sweet
+
+
+def purchase(client, sweet, quantity=1, key='key-1'):
+    headers = {'HTTP_IDEMPOTENCY_KEY': key} if key else {}
+    return client.post(reverse('purchase-sweet', kwargs={'pk': sweet.pk}), {'quantity': quantity},
+                       format='json', **headers)
+
+
+@pytest.mark.django_db
+class TestIdempotentPurchase:
+
+    def test_retry_replays_first_response(self, api_client, create_regular_user, create_sweet):
+        """Test a retried purchase returns the first response and buys once"""
+        sweet = create_sweet(quantity=10)
+        api_client.force_authenticate(user=create_regular_user)
+
+        first = purchase(api_client, sweet, 2)
+        retry = purchase(api_client, sweet, 2)
+
+        assert first.status_code == retry.status_code == status.HTTP_200_OK
+        assert retry.json() == first.json()
+        assert retry['Idempotent-Replayed'] == 'true'
+        assert Order.objects.count() == 1
+        sweet.refresh_from_db()
+        assert sweet.quantity == 8
+
+    def test_replay_does_not_touch_sweets(self, api_client, create_regular_user, create_sweet):
+        sweet = create_sweet()
+        api_client.force_authenticate(user=create_regular_user)
+        purchase(api_client, sweet)
+
+        with CaptureQueriesContext(connection) as queries:
+            purchase(api_client, sweet)
+
+        assert not any('"sweets"' in query['sql'] for query in queries)
+
+    def test_new_key_buys_again(self, api_client, create_regular_user, create_sweet):
+        sweet = create_sweet()
+        api_client.force_authenticate(user=create_regular_user)
+
+        purchase(api_client, sweet, key='key-1')
+        purchase(api_client, sweet, key='key-2')
+        purchase(api_client, sweet, key=None)
+
+        assert Order.objects.count() == 3
+
+    def test_keys_are_per_user(self, api_client, create_user, create_regular_user, create_sweet):
+        sweet = create_sweet()
+        api_client.force_authenticate(user=create_regular_user)
+        other = APIClient()
+        other.force_authenticate(user=create_user(email='other@example.com'))
+
+        purchase(api_client, sweet)
+        response = purchase(other, sweet)
+
+        assert 'Idempotent-Replayed' not in response
+        assert Order.objects.count() == 2
+
+    def test_key_reused_for_different_request(self, api_client, create_regular_user, create_sweet):
+        sweet = create_sweet()
+        api_client.force_authenticate(user=create_regular_user)
+        purchase(api_client, sweet, 1)
+
+        response = purchase(api_client, sweet, 3)
+
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+        assert Order.objects.count() == 1
+
+    def test_rejections_are_replayed(self, api_client, create_regular_user, create_sweet):
+        """Test a 400 is stored too, so a retry does not buy restocked units"""
+        sweet = create_sweet(quantity=1)
+        api_client.force_authenticate(user=create_regular_user)
+        assert purchase(api_client, sweet, 2).status_code == status.HTTP_400_BAD_REQUEST
+        Sweet.objects.increment_stock(sweet.pk, 5)
+
+        assert purchase(api_client, sweet, 2).status_code == status.HTTP_400_BAD_REQUEST
+        assert not Order.objects.exists()
+
+    def test_in_progress_duplicate(self, api_client, create_regular_user, create_sweet):
+        """Test a retry while the first request still runs gets 409"""
+        sweet = create_sweet()
+        api_client.force_authenticate(user=create_regular_user)
+        purchase(api_client, sweet)
+        IdempotencyKey.objects.update(response_status=None, response_body=None,
+                                      locked_until=timezone.now() + timedelta(seconds=30))
+
+        response = purchase(api_client, sweet)
+
+        assert response.status_code == status.HTTP_409_CONFLICT
+        assert response['Retry-After'] == '1'
+
+    def test_abandoned_key_taken_over_after_lease(self, api_client, create_regular_user, create_sweet):
+        """Test a key left unfinished by a crashed worker blocks retries only until its lease ends"""
+        sweet = create_sweet()
+        api_client.force_authenticate(user=create_regular_user)
+        past = timezone.now() - timedelta(seconds=1)
+        IdempotencyKey.objects.create(user=create_regular_user, key='key-1', fingerprint='x',
+                                      locked_until=past, expires_at=past)
+
+        response = purchase(api_client, sweet)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert 'Idempotent-Replayed' not in response
+        assert Order.objects.count() == 1
+
+    def test_unfinished_key_held_for_lease_only(self, create_regular_user, settings):
+        settings.IDEMPOTENCY_LOCK_SECONDS = 30
+        started = timezone.now()
+
+        record, claimed = claim_key(create_regular_user.id, 'key-1', 'x')
+
+        assert claimed
+        assert record.expires_at == record.locked_until
+        assert timedelta(seconds=30) <= record.locked_until - started < timedelta(seconds=31)
+
+    def test_ttl_starts_when_done(self, api_client, create_regular_user, create_sweet, settings):
+        """Test an unfinished key holds for the lease, a stored response for the TTL"""
+        settings.IDEMPOTENCY_LOCK_SECONDS = 30
+        sweet = create_sweet()
+        api_client.force_authenticate(user=create_regular_user)
+        started = timezone.now()
+
+        purchase(api_client, sweet)
+
+        record = IdempotencyKey.objects.get()
+        assert record.locked_until is None
+        assert record.expires_at - started >= timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL_SECONDS)
+
+    def test_expired_key_runs_again(self, api_client, create_regular_user, create_sweet):
+        sweet = create_sweet()
+        api_client.force_authenticate(user=create_regular_user)
+        purchase(api_client, sweet)
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        response = purchase(api_client, sweet)
+
+        assert 'Idempotent-Replayed' not in response
+        assert Order.objects.count() == 2
+        assert IdempotencyKey.objects.count() == 1
+
+    def test_checkout_is_idempotent(self, api_client, create_regular_user, create_sweet):
+        sweet = create_sweet()
+        api_client.force_authenticate(user=create_regular_user)
+        body = {'items': [{'sweet': sweet.pk, 'quantity': 2}]}
+
+        for _ in range(2):
+            response = api_client.post(reverse('checkout'), body, format='json', HTTP_IDEMPOTENCY_KEY='basket-1')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert Order.objects.count() == 1
+
+    def test_key_too_long(self, api_client, create_regular_user, create_sweet):
+        api_client.force_authenticate(user=create_regular_user)
+
+        response = purchase(api_client, create_sweet(), key='k' * 256)
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db(transaction=True)
+class TestConcurrentDuplicates:
+
+    def test_only_one_duplicate_executes(self, create_regular_user, create_sweet):
+        """Test duplicates racing each other buy exactly once"""
+        sweet = create_sweet(quantity=100)
+        results = []
+
+        def send():
+            client = APIClient()
+            client.force_authenticate(user=create_regular_user)
+            try:
+                results.append(purchase(client, sweet).status_code)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=send) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert Order.objects.count() == 1
+        assert status.HTTP_200_OK in results
+        assert set(results) <= {status.HTTP_200_OK, status.HTTP_409_CONFLICT}
+
+
+@pytest.mark.django_db
+class TestPurgeIdempotencyKeys:
+
+    def test_purges_expired_keys(self, create_regular_user):
+        now = timezone.now()
+        IdempotencyKey.objects.bulk_create([
+            IdempotencyKey(user=create_regular_user, key=f'old-{i}', fingerprint='x',
+                           expires_at=now - timedelta(minutes=1))
+            for i in range(5)
+        ] + [
+            IdempotencyKey(user=create_regular_user, key='fresh', fingerprint='x',
+                           expires_at=now + timedelta(minutes=1))
+        ])
+
+        call_command('purge_idempotency_keys', '--batch-size', '2', stdout=StringIO())
+
+        assert list(IdempotencyKey.objects.values_list('key', flat=True)) == ['fresh']
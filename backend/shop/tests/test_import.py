@@ -0,0 +1,159 @@
+import csv
+import json
+
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.urls import reverse
+from rest_framework import status
+from shop.models import Sweet
+
+
+@pytest.mark.django_db
+class TestImportEndpoint:
+
+    def test_import_csv_creates_and_restocks(self, api_client, create_admin, create_sweet):
+        """Test a CSV import creating new sweets and restocking existing ones"""
+        sweet = create_sweet(name='Laddu', quantity=5)
+        api_client.force_authenticate(user=create_admin)
+
+        content = (
+            'id,name,price,quantity,category\n'
+            ',Kaju Katli,450.00,20,premium\n'
+            ',Jalebi,80.00,15,traditional\n'
+            f'{sweet.pk},,,10,\n'
+        )
+        upload = SimpleUploadedFile('delivery.csv', content.encode(), content_type='text/csv')
+
+        url = reverse('sweet-import')
+        response = api_client.post(url, {'file': upload}, format='multipart')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['created'] == 2
+        assert response.data['restocked'] == 1
+        assert response.data['failed'] == 0
+        assert Sweet.objects.count() == 3
+        assert Sweet.objects.get(name='Kaju Katli').created_by == create_admin
+
+        sweet.refresh_from_db()
+        assert sweet.quantity == 15
+
+    def test_import_reports_row_errors_without_aborting(self, api_client, create_admin):
+        """Test invalid rows are reported while valid rows are applied"""
+        api_client.force_authenticate(user=create_admin)
+
+        lines = [
+            json.dumps({'name': 'Barfi', 'price': '120.00', 'quantity': 8}),
+            json.dumps({'name': 'Bad Price', 'price': '-1.00', 'quantity': 8}),
+            'not json',
+            json.dumps({'id': 9999, 'quantity': 5}),
+            json.dumps({'name': 'Peda', 'price': '60.00'}),
+        ]
+        upload = SimpleUploadedFile('delivery.ndjson', '\n'.join(lines).encode())
+
+        url = reverse('sweet-import')
+        response = api_client.post(url, {'file': upload}, format='multipart')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['created'] == 2
+        assert response.data['failed'] == 3
+        assert [error['line'] for error in response.data['errors']] == [2, 3, 4]
+        assert 'price' in response.data['errors'][0]['errors']
+        assert set(Sweet.objects.values_list('name', flat=True)) == {'Barfi', 'Peda'}
+
+    def test_import_updates_supplied_fields_only(self, api_client, create_admin, create_sweet):
+        """Test restock rows only change the fields they supply"""
+        sweet = create_sweet(name='Laddu', price=100, quantity=5, category='festival')
+        api_client.force_authenticate(user=create_admin)
+
+        upload = SimpleUploadedFile(
+            'delivery.ndjson', json.dumps({'id': sweet.pk, 'price': '110.00', 'quantity': 3}).encode()
+        )
+
+        url = reverse('sweet-import')
+        response = api_client.post(url, {'file': upload}, format='multipart')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['updated'] == 1
+
+        sweet.refresh_from_db()
+        assert float(sweet.price) == 110.00
+        assert sweet.quantity == 8
+        assert sweet.name == 'Laddu'
+        assert sweet.category == 'festival'
+
+    def test_import_invalid_utf8(self, api_client, create_admin):
+        """Test undecodable bytes stop the import with a 400 naming the line"""
+        api_client.force_authenticate(user=create_admin)
+        rows = ['name,price,quantity'] + [f'Sweet {i},10.00,{i}' for i in range(3)]
+        content = '\r\n'.join(rows).encode() + b'\r\nBad \xff Sweet,10.00,1\r\nLast Sweet,10.00,1\r\n'
+        upload = SimpleUploadedFile('delivery.csv', content)
+
+        url = reverse('sweet-import')
+        response = api_client.post(url, {'file': upload}, format='multipart')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data['line'] == 5
+        assert 'UTF-8' in response.data['error']
+        assert response.data['created'] == 3
+        assert Sweet.objects.count() == 3
+
+    def test_import_broken_csv(self, api_client, create_admin):
+        """Test a CSV the parser gives up on stops the import with a 400 naming the line"""
+        api_client.force_authenticate(user=create_admin)
+        content = 'name,price\nLaddu,10.00\n"' + 'x' * (csv.field_size_limit() + 1) + '",10.00\n'
+        upload = SimpleUploadedFile('delivery.csv', content.encode())
+
+        url = reverse('sweet-import')
+        response = api_client.post(url, {'file': upload}, format='multipart')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data['line'] == 3
+        assert 'CSV' in response.data['error']
+        assert response.data['created'] == 1
+
+    def test_import_missing_file(self, api_client, create_admin):
+        """Test import without a file"""
+        api_client.force_authenticate(user=create_admin)
+
+        url = reverse('sweet-import')
+        response = api_client.post(url, {}, format='multipart')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_import_as_user(self, api_client, create_regular_user):
+        """Test import as regular user (should fail)"""
+        api_client.force_authenticate(user=create_regular_user)
+        upload = SimpleUploadedFile('delivery.csv', b'name,price\nLaddu,10\n')
+
+        url = reverse('sweet-import')
+        response = api_client.post(url, {'file': upload}, format='multipart')
+
+        assert response.status_code == status.HTTP_403_FORBIDDEN
+        assert Sweet.objects.count() == 0
+
+
+@pytest.mark.django_db
+class TestImportCommand:
+
+    def test_import_command_in_batches(self, tmp_path, create_admin):
+        """Test the management command imports a file across several batches"""
+        path = tmp_path / 'delivery.csv'
+        rows = ['name,price,quantity'] + [f'Sweet {i},10.00,{i}' for i in range(25)]
+        path.write_text('\n'.join(rows))
+
+        call_command('import_sweets', str(path), batch_size=10, created_by=create_admin.email)
+
+        assert Sweet.objects.count() == 25
+        assert Sweet.objects.filter(created_by=create_admin).count() == 25
+
+    def test_import_command_stops_at_unreadable_line(self, tmp_path, create_admin):
+        """Test the command keeps the batches before an undecodable line and fails naming it"""
+        path = tmp_path / 'delivery.csv'
+        rows = ['name,price,quantity'] + [f'Sweet {i},10.00,{i}' for i in range(25)]
+        path.write_bytes('\n'.join(rows).encode() + b'\n\xc3(,10.00,1\n')
+
+        with pytest.raises(CommandError, match='line 27'):
+            call_command('import_sweets', str(path), batch_size=10)
+
+        assert Sweet.objects.count() == 25
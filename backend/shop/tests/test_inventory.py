@@ -1,55 +1,10 @@
 import pytest
 from django.urls import reverse
 from rest_framework import status
-from rest_framework.test import APIClient
-from shop.models import User, Sweet, Order
+from shop.models import Order
 from decimal import Decimal
 
 
-@pytest.fixture
-def api_client():
-    return APIClient()
-
-
-@pytest.fixture
-def create_user():
-    def make_user(email='user@example.com', role='user'):
-        user = User.objects.create_user(
-            username=email.split('@')[0],
-            email=email,
-            first_name='Test',
-            password='TestPass123!',
-            role=role
-        )
-        return user
-    return make_user
-
-
-@pytest.fixture
-def create_admin(create_user):
-    return create_user(email='admin@example.com', role='admin')
-
-
-@pytest.fixture
-def create_regular_user(create_user):
-    return create_user(email='user@example.com', role='user')
-
-
-@pytest.fixture
-def create_sweet(create_admin):
-    def make_sweet(**kwargs):
-        default_data = {
-            'name': 'Test Sweet',
-            'price': 100,
-            'quantity': 10,
-            'category': 'traditional',
-            'created_by': create_admin
-        }
-        default_data.update(kwargs)
-        return Sweet.objects.create(**default_data)
-    return make_sweet
-
-
 @pytest.mark.django_db
 class TestPurchase:
     
@@ -137,6 +92,28 @@ class TestPurchase:
         response = api_client.post(url, {'quantity': -1}, format='json')
         
         assert response.status_code == status.HTTP_400_BAD_REQUEST
+    
+    def test_purchase_huge_quantity(self, api_client, create_regular_user, create_sweet):
+        """Test a quantity too big for the database is rejected, not a server error"""
+        sweet = create_sweet()
+        api_client.force_authenticate(user=create_regular_user)
+        
+        url = reverse('purchase-sweet', kwargs={'pk': sweet.pk})
+        response = api_client.post(url, {'quantity': 2 ** 63}, format='json')
+        
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'quantity' in response.data
+    
+    def test_purchase_huge_reservation_id(self, api_client, create_regular_user, create_sweet):
+        """Test a reservation id too big for the database is rejected, not a server error"""
+        sweet = create_sweet()
+        api_client.force_authenticate(user=create_regular_user)
+        
+        url = reverse('purchase-sweet', kwargs={'pk': sweet.pk})
+        response = api_client.post(url, {'reservation': 2 ** 63}, format='json')
+        
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'reservation' in response.data
 
 
 @pytest.mark.django_db
@@ -186,6 +163,16 @@ class TestRestock:
         response = api_client.post(url, {'quantity': -5}, format='json')
         
         assert response.status_code == status.HTTP_400_BAD_REQUEST
+    
+    def test_restock_huge_quantity(self, api_client, create_admin, create_sweet):
+        """Test a restock too big for the database is rejected, not a server error"""
+        sweet = create_sweet()
+        api_client.force_authenticate(user=create_admin)
+        
+        url = reverse('restock-sweet', kwargs={'pk': sweet.pk})
+        response = api_client.post(url, {'quantity': 2 ** 63}, format='json')
+        
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
 
 
 @pytest.mark.django_db
@@ -213,3 +200,125 @@ class TestOrders:
         response = api_client.get(url)
         
         assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+@pytest.mark.django_db
+class TestCheckout:
+    
+    def test_checkout_success(self, api_client, create_regular_user, create_sweet):
+        """Test buying several sweets in one checkout"""
+        api_client.force_authenticate(user=create_regular_user)
+        laddu = create_sweet(name='Laddu', quantity=10, price=50)
+        barfi = create_sweet(name='Barfi', quantity=5, price=80)
+        
+        url = reverse('checkout')
+        response = api_client.post(url, {'items': [
+            {'sweet': laddu.pk, 'quantity': 3},
+            {'sweet': barfi.pk, 'quantity': 2},
+        ]}, format='json')
+        
+        assert response.status_code == status.HTTP_200_OK
+        assert len(response.data['orders']) == 2
+        assert response.data['total_price'] == '310.00'
+        assert Order.objects.count() == 2
+        
+        laddu.refresh_from_db()
+        barfi.refresh_from_db()
+        assert laddu.quantity == 7
+        assert barfi.quantity == 3
+    
+    def test_checkout_merges_duplicate_lines(self, api_client, create_regular_user, create_sweet):
+        """Test repeated lines for one sweet become a single order"""
+        api_client.force_authenticate(user=create_regular_user)
+        sweet = create_sweet(quantity=10, price=100)
+        
+        url = reverse('checkout')
+        response = api_client.post(url, {'items': [
+            {'sweet': sweet.pk, 'quantity': 2},
+            {'sweet': sweet.pk, 'quantity': 1},
+        ]}, format='json')
+        
+        assert response.status_code == status.HTTP_200_OK
+        order = Order.objects.get()
+        assert order.quantity == 3
+        assert order.total_price == Decimal('300.00')
+    
+    def test_checkout_is_all_or_nothing(self, api_client, create_regular_user, create_sweet):
+        """Test one short line rolls back the whole basket"""
+        api_client.force_authenticate(user=create_regular_user)
+        laddu = create_sweet(name='Laddu', quantity=10)
+        barfi = create_sweet(name='Barfi', quantity=1)
+        
+        url = reverse('checkout')
+        response = api_client.post(url, {'items': [
+            {'sweet': laddu.pk, 'quantity': 3},
+            {'sweet': barfi.pk, 'quantity': 2},
+        ]}, format='json')
+        
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'Insufficient quantity' in response.data['error']
+        assert response.data['sweets'] == [barfi.pk]
+        assert Order.objects.count() == 0
+        
+        laddu.refresh_from_db()
+        assert laddu.quantity == 10
+    
+    def test_checkout_nonexistent_sweet(self, api_client, create_regular_user, create_sweet):
+        """Test checkout with an unknown sweet"""
+        api_client.force_authenticate(user=create_regular_user)
+        sweet = create_sweet()
+        
+        url = reverse('checkout')
+        response = api_client.post(url, {'items': [
+            {'sweet': sweet.pk, 'quantity': 1},
+            {'sweet': 9999, 'quantity': 1},
+        ]}, format='json')
+        
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        assert response.data['sweets'] == [9999]
+        assert Order.objects.count() == 0
+    
+    def test_checkout_huge_numbers(self, api_client, create_regular_user, create_sweet):
+        """Test a sweet ID or quantity too big for the database is rejected, not a server error"""
+        api_client.force_authenticate(user=create_regular_user)
+        sweet = create_sweet()
+        
+        url = reverse('checkout')
+        huge_quantity = api_client.post(url, {'items': [{'sweet': sweet.pk, 'quantity': 2 ** 63}]}, format='json')
+        huge_sweet = api_client.post(url, {'items': [{'sweet': 2 ** 63, 'quantity': 1}]}, format='json')
+        
+        assert huge_quantity.status_code == status.HTTP_400_BAD_REQUEST
+        assert huge_sweet.status_code == status.HTTP_400_BAD_REQUEST
+        assert Order.objects.count() == 0
+    
+    def test_checkout_too_many_items(self, api_client, create_regular_user, create_sweet):
+        """Test a basket longer than MAX_CHECKOUT_ITEMS is rejected before any write"""
+        api_client.force_authenticate(user=create_regular_user)
+        sweet = create_sweet(quantity=1000)
+        
+        url = reverse('checkout')
+        line = {'sweet': sweet.pk, 'quantity': 1}
+        response = api_client.post(url, {'items': [line] * 101}, format='json')
+        
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'items' in response.data
+        assert Order.objects.count() == 0
+        assert api_client.post(url, {'items': [line] * 100}, format='json').status_code == status.HTTP_200_OK
+    
+    def test_checkout_empty_basket(self, api_client, create_regular_user):
+        """Test checkout with no items"""
+        api_client.force_authenticate(user=create_regular_user)
+        
+        url = reverse('checkout')
+        response = api_client.post(url, {'items': []}, format='json')
+        
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+    
+    def test_checkout_unauthenticated(self, api_client, create_sweet):
+        """Test checkout without authentication"""
+        sweet = create_sweet()
+        
+        url = reverse('checkout')
+        response = api_client.post(url, {'items': [{'sweet': sweet.pk, 'quantity': 1}]}, format='json')
+        
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
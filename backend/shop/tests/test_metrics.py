@@ -0,0 +1,191 @@
+import re
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.core.checks import run_checks
+from django.test import AsyncClient
+from django.urls import reverse
+from shop import metrics
+from shop.authentication import ShopRefreshToken
+from shop.metrics import Registry, render
+
+
+@pytest.fixture(autouse=True)
+def fresh_registry(settings):
+    """Changing a metrics setting drops the registry, so each test counts from zero."""
+    settings.METRICS_ENABLED = True
+    settings.METRICS_DIR = None
+    settings.METRICS_TOKEN = 'scrape-secret'
+    return settings
+
+
+def scrape(client, **headers):
+    headers.setdefault('HTTP_AUTHORIZATION', 'Bearer scrape-secret')
+    response = client.get(reverse('metrics'), **headers)
+    assert response.status_code == 200
+    return response
+
+
+def samples(text):
+    """Parse the exposition format into {'name{labels}': value}."""
+    return {
+        series: float(value)
+        for series, value in re.findall(r'^([^#\s]\S*) (\S+)$', text, re.MULTILINE)
+    }
+
+
+def asgi_get(url, **kwargs):
+    """GET through the ASGI handler, which runs the middleware async."""
+    async def get():
+        return await AsyncClient().get(url, **kwargs)
+    return async_to_sync(get)()
+
+
+@pytest.mark.django_db
+class TestMetricsEndpoint:
+
+    def test_request_counts_and_latency(self, api_client, create_sweet):
+        create_sweet()
+        api_client.get(reverse('sweet-list-create'))
+        api_client.get(reverse('sweet-list-create'))
+        api_client.get(reverse('sweet-detail', kwargs={'pk': 999}))
+
+        response = scrape(api_client)
+
+        assert response['Content-Type'] == metrics.CONTENT_TYPE
+        text = response.content.decode()
+        values = samples(text)
+        assert values['shop_http_requests_total{method="GET",status="200",view="sweet-list-create"}'] == 2
+        assert values['shop_http_requests_total{method="GET",status="404",view="sweet-detail"}'] == 1
+        assert values['shop_http_request_duration_seconds_count{method="GET",view="sweet-list-create"}'] == 2
+        assert values['shop_http_request_duration_seconds_bucket{method="GET",view="sweet-list-create",le="+Inf"}'] == 2
+        assert '# TYPE shop_http_request_duration_seconds histogram' in text
+
+    def test_requests_counted_under_asgi(self, api_client, create_sweet):
+        create_sweet()
+        asgi_get(reverse('sweet-list-create'))
+
+        values = samples(scrape(api_client).content.decode())
+
+        assert values['shop_http_requests_total{method="GET",status="200",view="sweet-list-create"}'] == 1
+
+    def test_purchase_outcomes(self, api_client, create_regular_user, create_sweet):
+        sweet = create_sweet(quantity=3)
+        api_client.force_authenticate(user=create_regular_user)
+        url = reverse('purchase-sweet', kwargs={'pk': sweet.pk})
+
+        api_client.post(url, {'quantity': 2}, format='json')
+        api_client.post(url, {'quantity': 5}, format='json')
+
+        values = samples(scrape(api_client).content.decode())
+        assert values['shop_purchases_total{outcome="success"}'] == 1
+        assert values['shop_purchases_total{outcome="insufficient_stock"}'] == 1
+        assert values['shop_purchased_units_total'] == 2
+
+    def test_checkout_outcome(self, api_client, create_regular_user, create_sweet):
+        first, second = create_sweet(name='A'), create_sweet(name='B')
+        api_client.force_authenticate(user=create_regular_user)
+
+        api_client.post(reverse('checkout'), {
+            'items': [{'sweet': first.pk, 'quantity': 1}, {'sweet': second.pk, 'quantity': 2}]
+        }, format='json')
+
+        values = samples(scrape(api_client).content.decode())
+        assert values['shop_purchases_total{outcome="success"}'] == 1
+        assert values['shop_purchased_units_total'] == 3
+
+    def test_restock_volume(self, api_client, create_admin, create_sweet):
+        sweet = create_sweet()
+        api_client.force_authenticate(user=create_admin)
+
+        api_client.post(reverse('restock-sweet', kwargs={'pk': sweet.pk}), {'quantity': 40}, format='json')
+        api_client.post(reverse('restock-sweet', kwargs={'pk': sweet.pk}), {'quantity': 2}, format='json')
+
+        values = samples(scrape(api_client).content.decode())
+        assert values['shop_restocks_total'] == 2
+        assert values['shop_restocked_units_total'] == 42
+
+    def test_catalog_cache_hit_ratio(self, api_client, settings, create_sweet):
+        settings.CATALOG_CACHE_ENABLED = True
+        create_sweet()
+        for _ in range(4):
+            api_client.get(reverse('sweet-list-create'))
+
+        values = samples(scrape(api_client).content.decode())
+        assert values['shop_cache_requests_total{cache="catalog",result="hit"}'] == 3
+        assert values['shop_cache_hit_ratio{cache="catalog"}'] == 0.75
+
+    def test_token_required(self, api_client):
+        assert api_client.get(reverse('metrics')).status_code == 401
+        assert api_client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong').status_code == 401
+        scrape(api_client, HTTP_AUTHORIZATION='Bearer scrape-secret')
+
+    def test_admins_only_without_token(self, api_client, settings, create_admin, create_regular_user):
+        """Test metrics are not public when no METRICS_TOKEN is set"""
+        settings.METRICS_TOKEN = ''
+
+        def bearer(user):
+            return f'Bearer {ShopRefreshToken.for_user(user).access_token}'
+
+        assert api_client.get(reverse('metrics')).status_code == 401
+        assert api_client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer ').status_code == 401
+        assert api_client.get(reverse('metrics'), HTTP_AUTHORIZATION=bearer(create_regular_user)).status_code == 401
+        scrape(api_client, HTTP_AUTHORIZATION=bearer(create_admin))
+
+    def test_disabled(self, api_client, settings):
+        settings.METRICS_ENABLED = False
+
+        assert api_client.get(reverse('metrics')).status_code == 404
+
+
+class TestMetricsDirCheck:
+
+    def test_several_workers_without_dir_warned(self, settings):
+        settings.WEB_CONCURRENCY = 4
+
+        assert [warning.id for warning in run_checks(tags=['metrics'])] == ['shop.W001']
+
+    def test_shared_dir_or_single_worker_accepted(self, settings, tmp_path):
+        assert run_checks(tags=['metrics']) == []
+
+        settings.WEB_CONCURRENCY = 4
+        settings.METRICS_DIR = str(tmp_path)
+        assert run_checks(tags=['metrics']) == []
+
+
+class TestRegistry:
+
+    def test_processes_sharing_a_directory_are_summed(self, tmp_path):
+        """Test a scrape sees the counts of every registry writing to the directory"""
+        first, second = Registry(str(tmp_path)), Registry(str(tmp_path))
+        first.inc('shop_restocks_total')
+        second.inc('shop_restocks_total', 2)
+        first.observe('shop_http_request_duration_seconds', 0.02, view='sweet-detail', method='GET')
+        second.observe('shop_http_request_duration_seconds', 3, view='sweet-detail', method='GET')
+        second.flush()
+
+        values = samples(render(first.collect()))
+
+        assert values['shop_restocks_total'] == 3
+        labels = 'method="GET",view="sweet-detail"'
+        assert values[f'shop_http_request_duration_seconds_bucket{{{labels},le="0.01"}}'] == 0
+        assert values[f'shop_http_request_duration_seconds_bucket{{{labels},le="0.025"}}'] == 1
+        assert values[f'shop_http_request_duration_seconds_bucket{{{labels},le="5.0"}}'] == 2
+        assert values[f'shop_http_request_duration_seconds_sum{{{labels}}}'] == 3.02
+        assert values[f'shop_http_request_duration_seconds_count{{{labels}}}'] == 2
+
+    def test_connection_reuse_ratio(self):
+        registry = Registry()
+        for _ in range(4):
+            registry.inc('shop_http_requests_total', view='sweet-detail', method='GET', status='200')
+        registry.inc('shop_db_connections_opened_total', alias='default')
+
+        values = samples(render(registry.collect()))
+
+        assert values['shop_db_connection_reuse_ratio'] == 0.75
+
+    def test_label_values_escaped(self):
+        registry = Registry()
+        registry.inc('shop_idempotency_conflicts_total', view='say "hi"\\')
+
+        assert 'view="say \\"hi\\"\\\\"' in render(registry.collect())
@@ -0,0 +1,91 @@
+import pytest
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from shop.models import Sweet, Order
+
+
+def collect_pages(client, url, params):
+    """Follow `next` links and return every page's results."""
+    pages = []
+    response = client.get(url, params)
+    while True:
+        assert response.status_code == status.HTTP_200_OK
+        pages.append(response.data['results'])
+        if response.data['next'] is None:
+            return pages
+        response = client.get(response.data['next'])
+
+
+@pytest.mark.django_db
+class TestKeysetPagination:
+
+    def test_unpaginated_by_default(self, api_client, create_sweet):
+        """Test the list stays a plain list without pagination params"""
+        create_sweet(name='Sweet 1')
+
+        url = reverse('sweet-list-create')
+        response = api_client.get(url)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert isinstance(response.data, list)
+
+    def test_list_pages_cover_all_sweets(self, api_client, create_sweet):
+        """Test following cursors visits every sweet once, newest first"""
+        sweets = [create_sweet(name=f'Sweet {i}') for i in range(7)]
+        # Identical timestamps must still be split correctly by id
+        Sweet.objects.filter(pk__in=[s.pk for s in sweets[2:5]]).update(created_at=timezone.now())
+
+        url = reverse('sweet-list-create')
+        pages = collect_pages(api_client, url, {'page_size': 3})
+
+        assert [len(page) for page in pages] == [3, 3, 1]
+        ids = [item['id'] for page in pages for item in page]
+        expected = list(Sweet.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        assert ids == expected
+
+    def test_search_is_paginated(self, api_client, create_sweet):
+        """Test search results can be paged with filters applied"""
+        for i in range(5):
+            create_sweet(name=f'Modern {i}', category='modern')
+        create_sweet(name='Traditional', category='traditional')
+
+        url = reverse('sweet-search')
+        pages = collect_pages(api_client, url, {'category': 'modern', 'page_size': 2})
+
+        assert [len(page) for page in pages] == [2, 2, 1]
+        assert all(item['category'] == 'modern' for page in pages for item in page)
+
+    def test_my_orders_paginated(self, api_client, create_regular_user, create_user, create_sweet):
+        """Test order history pages only include the user's own orders"""
+        user = create_regular_user
+        other = create_user(email='other@example.com')
+        sweet = create_sweet()
+        for _ in range(5):
+            Order.objects.create(user=user, sweet=sweet, quantity=1, total_price=100)
+        Order.objects.create(user=other, sweet=sweet, quantity=1, total_price=100)
+        api_client.force_authenticate(user=user)
+
+        url = reverse('my-orders')
+        pages = collect_pages(api_client, url, {'page_size': 2})
+
+        assert [len(page) for page in pages] == [2, 2, 1]
+        assert all(item['user'] == user.pk for page in pages for item in page)
+
+    def test_invalid_cursor(self, api_client):
+        """Test a malformed cursor is rejected"""
+        url = reverse('sweet-list-create')
+        response = api_client.get(url, {'cursor': 'not-a-cursor'})
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_page_queries_use_composite_indexes(self, create_regular_user):
+        """Test the keyset queries are served from the composite indexes"""
+        now = timezone.now()
+        sweets_plan = Sweet.objects.filter(created_at__lte=now).order_by('-created_at', '-id').explain()
+        orders_plan = Order.objects.filter(
+            user=create_regular_user, created_at__lte=now
+        ).order_by('-created_at', '-id').explain()
+
+        assert 'sweets_created_id_idx' in sweets_plan
+        assert 'orders_user_created_id_idx' in orders_plan
@@ -0,0 +1,188 @@
+import cProfile
+import os
+import pstats
+from types import SimpleNamespace
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.test import AsyncClient
+from django.urls import reverse
+from shop import profiling
+from shop.authentication import ShopRefreshToken
+
+
+@pytest.fixture
+def profiling_on(settings, tmp_path):
+    """The middleware is loaded with the client's first request."""
+    settings.PROFILING_ENABLED = True
+    settings.PROFILE_DIR = str(tmp_path)
+    settings.PROFILE_SAMPLE_EVERY = 0
+    profiling._counters.clear()
+    return settings
+
+
+def bearer(user):
+    return f'Bearer {ShopRefreshToken.for_user(user).access_token}'
+
+
+def asgi_get(url, **kwargs):
+    """GET through the ASGI handler, which runs the middleware async."""
+    async def get():
+        return await AsyncClient().get(url, **kwargs)
+    return async_to_sync(get)()
+
+
+@pytest.mark.django_db
+class TestProfilingMiddleware:
+
+    def test_admin_header_profiles_request(self, api_client, profiling_on, create_admin, create_sweet):
+        sweet = create_sweet()
+
+        response = api_client.get(reverse('sweet-detail', kwargs={'pk': sweet.pk}),
+                                  HTTP_X_PROFILE='1', HTTP_AUTHORIZATION=bearer(create_admin))
+
+        profile_id = response['X-Profile-Id']
+        stats = pstats.Stats(profiling.profile_path(profile_id))
+        assert any(name == 'to_representation' for _, _, name in stats.stats)
+
+    def test_profiles_orm_under_asgi(self, profiling_on, create_admin, create_sweet):
+        """Test an async view's queries, run on its sync_to_async() thread, are profiled"""
+        sweet = create_sweet()
+
+        response = asgi_get(reverse('async-sweet-detail', kwargs={'pk': sweet.pk}),
+                            headers={'X-Profile': '1', 'Authorization': bearer(create_admin)})
+
+        stats = pstats.Stats(profiling.profile_path(response['X-Profile-Id']))
+        assert any(name == '_execute' for _, _, name in stats.stats)
+
+    def test_header_ignored_for_regular_users(self, api_client, profiling_on, create_regular_user, create_sweet):
+        sweet = create_sweet()
+
+        response = api_client.get(reverse('sweet-detail', kwargs={'pk': sweet.pk}),
+                                  HTTP_X_PROFILE='1', HTTP_AUTHORIZATION=bearer(create_regular_user))
+        anonymous = api_client.get(reverse('sweet-detail', kwargs={'pk': sweet.pk}), HTTP_X_PROFILE='1')
+
+        assert 'X-Profile-Id' not in response
+        assert 'X-Profile-Id' not in anonymous
+        assert not [name for name in os.listdir(profiling_on.PROFILE_DIR) if name.endswith('.prof')]
+
+    def test_disabled_by_default(self, api_client, create_admin, create_sweet):
+        sweet = create_sweet()
+
+        response = api_client.get(reverse('sweet-detail', kwargs={'pk': sweet.pk}),
+                                  HTTP_X_PROFILE='1', HTTP_AUTHORIZATION=bearer(create_admin))
+
+        assert 'X-Profile-Id' not in response
+
+    def test_samples_one_in_n_per_view(self, api_client, profiling_on, create_sweet):
+        profiling_on.PROFILE_SAMPLE_EVERY = 3
+        sweet = create_sweet()
+
+        details = [api_client.get(reverse('sweet-detail', kwargs={'pk': sweet.pk})) for _ in range(6)]
+        listing = api_client.get(reverse('sweet-list-create'))
+
+        assert ['X-Profile-Id' in response for response in details] == [True, False, False, True, False, False]
+        assert 'X-Profile-Id' in listing
+
+    def test_old_profiles_rotated(self, api_client, profiling_on, create_sweet):
+        profiling_on.PROFILE_SAMPLE_EVERY = 1
+        profiling_on.PROFILE_KEEP = 2
+        sweet = create_sweet()
+
+        for _ in range(4):
+            api_client.get(reverse('sweet-detail', kwargs={'pk': sweet.pk}))
+
+        assert len([name for name in os.listdir(profiling_on.PROFILE_DIR) if name.endswith('.prof')]) == 2
+
+
+@pytest.mark.django_db
+class TestProfileViews:
+
+    def test_profile_report(self, api_client, profiling_on, create_admin, create_sweet):
+        sweet = create_sweet()
+        api_client.credentials(HTTP_AUTHORIZATION=bearer(create_admin))
+        profile_id = api_client.post(reverse('purchase-sweet', kwargs={'pk': sweet.pk}), {'quantity': 1},
+                                     format='json', HTTP_X_PROFILE='1')['X-Profile-Id']
+
+        report = api_client.get(reverse('request-profile', kwargs={'profile_id': profile_id}))
+        raw = api_client.get(reverse('request-profile', kwargs={'profile_id': profile_id}), {'download': '1'})
+
+        assert report.status_code == 200
+        assert 'purchase_sweet' in report.content.decode()
+        assert b''.join(raw.streaming_content) == open(profiling.profile_path(profile_id), 'rb').read()
+
+    def test_profile_admin_only(self, api_client, profiling_on, create_regular_user):
+        api_client.force_authenticate(user=create_regular_user)
+
+        response = api_client.get(reverse('request-profile', kwargs={'profile_id': '20240101T000000-0123456789ab'}))
+
+        assert response.status_code == 403
+
+    def test_unknown_or_malformed_profile(self, api_client, profiling_on, create_admin):
+        api_client.force_authenticate(user=create_admin)
+
+        for profile_id in ('20240101T000000-0123456789ab', '..%2F..%2Fsettings'):
+            response = api_client.get(reverse('request-profile', kwargs={'profile_id': profile_id}))
+            assert response.status_code == 404
+
+    def test_flamegraph_aggregates_profiles(self, api_client, profiling_on, create_admin, create_sweet):
+        profiling_on.PROFILE_SAMPLE_EVERY = 1
+        sweet = create_sweet()
+        for _ in range(3):
+            api_client.get(reverse('sweet-detail', kwargs={'pk': sweet.pk}))
+        api_client.force_authenticate(user=create_admin)
+
+        response = api_client.get(reverse('view-flamegraph', kwargs={'view_name': 'sweet-detail'}))
+
+        lines = response.content.decode().splitlines()
+        stacks = [line.rpartition(' ')[0] for line in lines]
+        assert len(stacks) == len(set(stacks))
+        assert any('to_representation' in stack for stack in stacks)
+        assert all(int(line.rpartition(' ')[2]) > 0 for line in lines)
+
+    def test_flamegraph_unknown_view(self, api_client, profiling_on, create_admin):
+        api_client.force_authenticate(user=create_admin)
+
+        response = api_client.get(reverse('view-flamegraph', kwargs={'view_name': 'sweet-detail'}))
+
+        assert response.status_code == 404
+
+
+class TestFoldedStacks:
+
+    def test_time_split_by_caller(self):
+        """Test a callee shared by two callers is charged to each stack by that caller's share"""
+        root, light, heavy, leaf, inner = (('app.py', line, name) for line, name in enumerate(
+            ('root', 'light', 'heavy', 'leaf', 'inner')
+        ))
+        # func: (primitive calls, calls, self seconds, cumulative seconds, {caller: same for that caller})
+        stats = SimpleNamespace(stats={
+            root: (1, 1, 0.0, 10.0, {}),
+            light: (1, 1, 0.0, 2.0, {root: (1, 1, 0.0, 2.0)}),
+            heavy: (1, 1, 1.0, 8.0, {root: (1, 1, 1.0, 8.0)}),
+            leaf: (4, 4, 4.5, 9.0, {light: (1, 1, 1.0, 2.0), heavy: (3, 3, 3.5, 7.0)}),
+            inner: (4, 4, 4.5, 4.5, {leaf: (4, 4, 4.5, 4.5)}),
+        })
+
+        stacks = profiling.folded_stacks(stats)
+
+        assert stacks == {
+            'app.py:0:root;app.py:1:light;app.py:3:leaf': 1_000_000,
+            'app.py:0:root;app.py:1:light;app.py:3:leaf;app.py:4:inner': 1_000_000,
+            'app.py:0:root;app.py:2:heavy': 1_000_000,
+            'app.py:0:root;app.py:2:heavy;app.py:3:leaf': 3_500_000,
+            'app.py:0:root;app.py:2:heavy;app.py:3:leaf;app.py:4:inner': 3_500_000,
+        }
+
+    def test_real_profile(self):
+        def leaf():
+            return sum(range(100000))
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        leaf()
+        profiler.disable()
+
+        stacks = profiling.folded_stacks(pstats.Stats(profiler))
+
+        assert stacks and all(stack.split(';')[0].endswith(':leaf') for stack in stacks)
@@ -0,0 +1,136 @@
+import pytest
+from django.urls import reverse
+from shop.models import User, Sweet, Order
+from shop.search import fts_available
+
+
+# Pinned SQL query counts per endpoint. They must not depend on the number
+# of rows returned; if one of these fails, a serializer field probably
+# started loading a relation the view's queryset does not fetch.
+ROW_COUNTS = [1, 20]
+
+
+def serialized(response):
+    """Check a response came from a DRF view's serializer, not the fast path."""
+    assert 'view' in response.renderer_context
+    assert response.accepted_renderer.format == 'json'
+    return response
+
+
+@pytest.fixture
+def make_sweets():
+    def make(count):
+        # Every sweet has a different creator, the worst case for created_by_name
+        creators = User.objects.bulk_create([
+            User(username=f'creator{i}', email=f'creator{i}@example.com', first_name=f'Creator {i}', role='admin')
+            for i in range(count)
+        ])
+        return Sweet.objects.bulk_create([
+            Sweet(name=f'Sweet {i}', price=10, quantity=100, created_by=creator)
+            for i, creator in enumerate(creators)
+        ])
+    return make
+
+
+@pytest.mark.django_db
+class TestQueryCounts:
+    """Budgets for the DRF views and their SweetSerializer/OrderSerializer querysets"""
+
+    @pytest.mark.parametrize('rows', ROW_COUNTS)
+    def test_sweet_list(self, api_client, make_sweets, rows, django_assert_num_queries):
+        make_sweets(rows)
+        with django_assert_num_queries(1):
+            response = serialized(api_client.get(reverse('sweet-list-create')))
+        assert len(response.data) == rows
+        assert response.data[0]['created_by_name'].startswith('Creator')
+
+    @pytest.mark.parametrize('rows', ROW_COUNTS)
+    def test_sweet_list_paginated(self, api_client, make_sweets, rows, django_assert_num_queries):
+        make_sweets(rows)
+        with django_assert_num_queries(1):
+            serialized(api_client.get(reverse('sweet-list-create'), {'page_size': 50}))
+
+    @pytest.mark.parametrize('rows', ROW_COUNTS)
+    def test_sweet_search(self, api_client, make_sweets, rows, django_assert_num_queries):
+        make_sweets(rows)
+        fts_available()  # one-off, per-process index probe
+        with django_assert_num_queries(1):
+            response = serialized(api_client.get(reverse('sweet-search'), {'q': 'sweet', 'max_price': 50}))
+        assert len(response.data) == rows
+
+    def test_sweet_detail(self, api_client, make_sweets, django_assert_num_queries):
+        sweet, = make_sweets(1)
+        # One query for the ETag/Last-Modified validators, one for the row
+        with django_assert_num_queries(2):
+            response = serialized(api_client.get(reverse('sweet-detail', kwargs={'pk': sweet.pk})))
+        assert response.data['created_by_name'] == 'Creator 0'
+
+    @pytest.mark.parametrize('rows', ROW_COUNTS)
+    def test_my_orders(self, api_client, create_regular_user, make_sweets, rows, django_assert_num_queries):
+        sweets = make_sweets(rows)
+        Order.objects.bulk_create([
+            Order(user=create_regular_user, sweet=sweet, quantity=1, total_price=10) for sweet in sweets
+        ])
+        api_client.force_authenticate(user=create_regular_user)
+
+        with django_assert_num_queries(1):
+            response = serialized(api_client.get(reverse('my-orders')))
+        assert len(response.data) == rows
+        assert response.data[0]['sweet_name'].startswith('Sweet')
+        assert response.data[0]['user_email'] == create_regular_user.email
+
+    def test_restock(self, api_client, create_admin, make_sweets, django_assert_num_queries):
+        sweet, = make_sweets(1)
+        api_client.force_authenticate(user=create_admin)
+        # Load the sweet, increment, re-read stock
+        with django_assert_num_queries(3):
+            api_client.post(reverse('restock-sweet', kwargs={'pk': sweet.pk}), {'quantity': 5}, format='json')
+
+
+@pytest.mark.django_db
+class TestFastPathQueryCounts:
+    """Budgets for the values_list() fast path: ?format=fastjson and /api/async/"""
+
+    @pytest.mark.parametrize('rows', ROW_COUNTS)
+    @pytest.mark.parametrize('url_name, params', [
+        ('sweet-list-create', {'format': 'fastjson'}),
+        ('async-sweet-list', {}),
+        ('async-sweet-list', {'page_size': 50}),
+    ])
+    def test_sweet_list(self, api_client, make_sweets, rows, url_name, params, django_assert_num_queries):
+        make_sweets(rows)
+        with django_assert_num_queries(1):
+            response = api_client.get(reverse(url_name), params)
+        assert response.status_code == 200
+
+    @pytest.mark.parametrize('rows', ROW_COUNTS)
+    def test_sweet_search(self, api_client, make_sweets, rows, django_assert_num_queries):
+        make_sweets(rows)
+        fts_available()
+        with django_assert_num_queries(1):
+            response = api_client.get(reverse('async-sweet-search'), {'q': 'sweet', 'max_price': 50})
+        assert len(response.json()) == rows
+
+    def test_sweet_detail(self, api_client, make_sweets, django_assert_num_queries):
+        sweet, = make_sweets(1)
+        with django_assert_num_queries(2):
+            response = api_client.get(reverse('async-sweet-detail', kwargs={'pk': sweet.pk}))
+        assert response.json()['created_by_name'] == 'Creator 0'
+
+    @pytest.mark.parametrize('rows', ROW_COUNTS)
+    @pytest.mark.parametrize('url_name, params', [
+        ('my-orders', {'format': 'fastjson'}),
+        ('async-my-orders', {}),
+    ])
+    def test_my_orders(self, api_client, create_regular_user, make_sweets, rows, url_name, params,
+                       django_assert_num_queries):
+        sweets = make_sweets(rows)
+        Order.objects.bulk_create([
+            Order(user=create_regular_user, sweet=sweet, quantity=1, total_price=10) for sweet in sweets
+        ])
+        api_client.force_authenticate(user=create_regular_user)
+
+        with django_assert_num_queries(1):
+            response = api_client.get(reverse(url_name), params)
+        assert len(response.json()) == rows
+        assert response.json()[0]['sweet_name'].startswith('Sweet')
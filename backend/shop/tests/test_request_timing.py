@@ -0,0 +1,106 @@
+import logging
+import re
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.db import connection
+from django.test import AsyncClient
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+
+@pytest.fixture
+def timing(settings):
+    """The middleware is loaded with the client's first request."""
+    settings.REQUEST_TIMING_ENABLED = True
+    settings.SLOW_REQUEST_MS = 60_000
+    return settings
+
+
+def server_timing(response):
+    return {
+        name: (float(duration), description)
+        for name, duration, description in re.findall(
+            r'([\w-]+);dur=([\d.]+)(?:;desc="([^"]*)")?', response['Server-Timing']
+        )
+    }
+
+
+def asgi_get(url, **kwargs):
+    """GET through the ASGI handler, which runs the middleware async."""
+    async def get():
+        return await AsyncClient().get(url, **kwargs)
+    return async_to_sync(get)()
+
+
+@pytest.mark.django_db
+class TestRequestTiming:
+
+    def test_disabled_by_default(self, api_client, create_sweet):
+        create_sweet()
+
+        response = api_client.get(reverse('sweet-list-create'))
+
+        assert 'Server-Timing' not in response
+
+    def test_server_timing_header(self, api_client, timing, create_regular_user, create_sweet):
+        sweet = create_sweet()
+        api_client.force_authenticate(user=create_regular_user)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = api_client.post(reverse('purchase-sweet', kwargs={'pk': sweet.pk}), {'quantity': 1},
+                                       format='json')
+
+        metrics = server_timing(response)
+        assert set(metrics) == {'db', 'db-slowest', 'serialize', 'app', 'total'}
+        assert metrics['db'][1] == f'{len(queries)} queries'
+        assert metrics['db-slowest'][0] <= metrics['db'][0] <= metrics['total'][0]
+
+    def test_server_timing_under_asgi(self, timing, create_sweet):
+        """Test the queries of an async view, run on its sync_to_async() thread, are counted"""
+        create_sweet()
+
+        response = asgi_get(reverse('sweet-list-create'))
+
+        metrics = server_timing(response)
+        assert metrics['db'][1] == '1 queries'
+        assert metrics['db'][0] <= metrics['total'][0]
+
+    def test_serialization_time_measured(self, api_client, timing, create_sweet):
+        for i in range(50):
+            create_sweet(name=f'Sweet {i}')
+
+        response = api_client.get(reverse('sweet-list-create'))
+
+        metrics = server_timing(response)
+        assert metrics['serialize'][0] > 0
+        assert metrics['db'][0] + metrics['serialize'][0] <= metrics['total'][0]
+
+    def test_serialization_time_measured_on_fast_path(self, timing, create_sweet):
+        """Test the fast_serializers rows of the async views are timed too"""
+        for i in range(50):
+            create_sweet(name=f'Sweet {i}')
+
+        response = asgi_get(reverse('async-sweet-list'))
+
+        assert server_timing(response)['serialize'][0] > 0
+
+    def test_slow_request_logged(self, api_client, timing, create_sweet, caplog):
+        timing.SLOW_REQUEST_MS = 0
+        create_sweet()
+
+        with caplog.at_level(logging.WARNING, logger='shop.requests'):
+            api_client.get(reverse('sweet-list-create'))
+
+        (record,) = caplog.records
+        assert record.timing['view'] == 'sweet-list-create'
+        assert record.timing['status'] == 200
+        assert record.timing['queries'] == 1
+        assert 'SELECT' in record.timing['slowest_query']
+        assert 'GET /api/sweets/ (sweet-list-create)' in record.getMessage()
+
+    def test_fast_request_not_logged(self, api_client, timing, caplog):
+        with caplog.at_level(logging.WARNING, logger='shop.requests'):
+            api_client.get(reverse('sweet-list-create'))
+
+        assert not caplog.records
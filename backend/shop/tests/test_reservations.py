@@ -0,0 +1,278 @@
+from datetime import timedelta
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APIClient
+from shop.cache import LAPSE_KEY, VERSION_KEY, get_catalog_cache, get_catalog_version
+from shop.models import Order, Reservation, Sweet
+
+
+def reserve(client, sweet, quantity):
+    return client.post(reverse('reserve-sweet', kwargs={'pk': sweet.pk}), {'quantity': quantity}, format='json')
+
+
+def available(sweet):
+    return Sweet.objects.with_available().values_list('available', flat=True).get(pk=sweet.pk)
+
+
+@pytest.mark.django_db
+class TestReserve:
+
+    def test_reserve_holds_stock(self, api_client, create_regular_user, create_sweet, settings):
+        """Test a reservation lowers availability but not stock on hand"""
+        settings.RESERVATION_TTL_SECONDS = 60
+        sweet = create_sweet(quantity=10)
+        api_client.force_authenticate(user=create_regular_user)
+
+        response = reserve(api_client, sweet, 4)
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data['reservation']['status'] == 'active'
+        reservation = Reservation.objects.get()
+        assert timedelta(seconds=59) < reservation.expires_at - timezone.now() <= timedelta(seconds=60)
+        sweet.refresh_from_db()
+        assert sweet.quantity == 10
+        assert available(sweet) == 6
+
+    def test_reserve_more_than_available(self, api_client, create_regular_user, create_sweet):
+        sweet = create_sweet(quantity=5)
+        api_client.force_authenticate(user=create_regular_user)
+        reserve(api_client, sweet, 3)
+
+        response = reserve(api_client, sweet, 3)
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'Only 2 available' in response.data['error']
+
+    def test_reserve_huge_quantity(self, api_client, create_regular_user, create_sweet):
+        sweet = create_sweet(quantity=5)
+        api_client.force_authenticate(user=create_regular_user)
+
+        response = reserve(api_client, sweet, 2 ** 63)
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'quantity' in response.data
+
+    def test_reserve_requires_auth(self, api_client, create_sweet):
+        response = reserve(api_client, create_sweet(), 1)
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_held_units_not_sold_to_others(self, api_client, create_user, create_regular_user, create_sweet):
+        """Test a purchase without a hold cannot take reserved units"""
+        sweet = create_sweet(quantity=5)
+        api_client.force_authenticate(user=create_regular_user)
+        reserve(api_client, sweet, 4)
+
+        other = APIClient()
+        other.force_authenticate(user=create_user(email='other@example.com'))
+        url = reverse('purchase-sweet', kwargs={'pk': sweet.pk})
+
+        assert other.post(url, {'quantity': 2}, format='json').status_code == status.HTTP_400_BAD_REQUEST
+        assert other.post(url, {'quantity': 1}, format='json').status_code == status.HTTP_200_OK
+
+    def test_checkout_respects_holds(self, api_client, create_user, create_regular_user, create_sweet):
+        sweet = create_sweet(quantity=5)
+        api_client.force_authenticate(user=create_regular_user)
+        reserve(api_client, sweet, 4)
+
+        other = APIClient()
+        other.force_authenticate(user=create_user(email='other@example.com'))
+        response = other.post(reverse('checkout'), {'items': [{'sweet': sweet.pk, 'quantity': 2}]}, format='json')
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert 'only 1 available' in response.data['error']
+
+    def test_expired_hold_releases_stock(self, api_client, create_regular_user, create_sweet):
+        sweet = create_sweet(quantity=5)
+        api_client.force_authenticate(user=create_regular_user)
+        reserve(api_client, sweet, 5)
+        Reservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        assert available(sweet) == 5
+
+
+@pytest.mark.django_db
+class TestConfirm:
+
+    def test_confirm_consumes_hold(self, api_client, create_regular_user, create_sweet):
+        """Test confirming buys the held units and links the order"""
+        sweet = create_sweet(quantity=5, price=10)
+        api_client.force_authenticate(user=create_regular_user)
+        reservation_id = reserve(api_client, sweet, 3).data['reservation']['id']
+
+        response = api_client.post(reverse('confirm-reservation', kwargs={'pk': reservation_id}))
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['remaining_quantity'] == 2
+        reservation = Reservation.objects.get()
+        assert reservation.status == 'confirmed'
+        assert reservation.order.quantity == 3
+        assert available(sweet) == 2
+
+    def test_purchase_with_reservation(self, api_client, create_regular_user, create_sweet):
+        sweet = create_sweet(quantity=3)
+        api_client.force_authenticate(user=create_regular_user)
+        reservation_id = reserve(api_client, sweet, 3).data['reservation']['id']
+
+        response = api_client.post(reverse('purchase-sweet', kwargs={'pk': sweet.pk}),
+                                   {'reservation': reservation_id}, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['remaining_quantity'] == 0
+
+    def test_confirm_twice(self, api_client, create_regular_user, create_sweet):
+        sweet = create_sweet(quantity=5)
+        api_client.force_authenticate(user=create_regular_user)
+        url = reverse('confirm-reservation', kwargs={'pk': reserve(api_client, sweet, 1).data['reservation']['id']})
+        api_client.post(url)
+
+        response = api_client.post(url)
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert Order.objects.count() == 1
+
+    def test_confirm_expired(self, api_client, create_regular_user, create_sweet):
+        sweet = create_sweet(quantity=5)
+        api_client.force_authenticate(user=create_regular_user)
+        reservation_id = reserve(api_client, sweet, 1).data['reservation']['id']
+        Reservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        response = api_client.post(reverse('confirm-reservation', kwargs={'pk': reservation_id}))
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert not Order.objects.exists()
+
+    def test_confirm_other_users_reservation(self, api_client, create_user, create_regular_user, create_sweet):
+        sweet = create_sweet()
+        api_client.force_authenticate(user=create_regular_user)
+        reservation_id = reserve(api_client, sweet, 1).data['reservation']['id']
+
+        other = APIClient()
+        other.force_authenticate(user=create_user(email='other@example.com'))
+        response = other.post(reverse('confirm-reservation', kwargs={'pk': reservation_id}))
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_cancel_releases_stock(self, api_client, create_regular_user, create_sweet):
+        sweet = create_sweet(quantity=5)
+        api_client.force_authenticate(user=create_regular_user)
+        url = reverse('cancel-reservation', kwargs={'pk': reserve(api_client, sweet, 5).data['reservation']['id']})
+
+        assert api_client.post(url).status_code == status.HTTP_200_OK
+        assert available(sweet) == 5
+        assert api_client.post(url).status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+class TestAvailableField:
+    """The catalog shows what is free to buy, and refreshes when holds change"""
+
+    def test_list_and_detail_show_available(self, api_client, create_regular_user, create_sweet):
+        sweet = create_sweet(quantity=10)
+        api_client.force_authenticate(user=create_regular_user)
+        reserve(api_client, sweet, 4)
+
+        listed = api_client.get(reverse('sweet-list-create')).data[0]
+        detail = api_client.get(reverse('sweet-detail', kwargs={'pk': sweet.pk})).data
+
+        assert (listed['quantity'], listed['available']) == (10, 6)
+        assert (detail['quantity'], detail['available']) == (10, 6)
+
+    def test_available_is_read_only(self, api_client, create_admin, create_sweet):
+        sweet = create_sweet(quantity=10)
+        api_client.force_authenticate(user=create_admin)
+
+        response = api_client.patch(reverse('sweet-detail', kwargs={'pk': sweet.pk}),
+                                    {'quantity': 7, 'available': 99}, format='json')
+
+        assert response.status_code == status.HTTP_200_OK
+        assert (response.data['quantity'], response.data['available']) == (7, 7)
+
+    def test_cached_reads_follow_holds(self, api_client, create_regular_user, create_sweet):
+        sweet = create_sweet(quantity=10)
+        api_client.force_authenticate(user=create_regular_user)
+        detail_url = reverse('sweet-detail', kwargs={'pk': sweet.pk})
+        etag = api_client.get(detail_url)['ETag']
+        api_client.get(reverse('sweet-list-create'))
+
+        reservation_id = reserve(api_client, sweet, 4).data['reservation']['id']
+
+        assert api_client.get(detail_url, HTTP_IF_NONE_MATCH=etag).status_code == status.HTTP_200_OK
+        assert api_client.get(reverse('sweet-list-create')).data[0]['available'] == 6
+
+        api_client.post(reverse('cancel-reservation', kwargs={'pk': reservation_id}))
+
+        assert api_client.get(detail_url).data['available'] == 10
+        assert api_client.get(reverse('sweet-list-create')).data[0]['available'] == 10
+
+    def test_sweep_refreshes_cached_reads(self, api_client, create_regular_user, create_sweet):
+        sweet = create_sweet(quantity=10)
+        api_client.force_authenticate(user=create_regular_user)
+        reserve(api_client, sweet, 4)
+        url = reverse('sweet-detail', kwargs={'pk': sweet.pk})
+        etag = api_client.get(url)['ETag']
+        Reservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        Reservation.objects.expire()
+
+        response = api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['available'] == 10
+
+    def test_lapsed_hold_refreshes_cached_reads(self, api_client, create_regular_user, create_sweet):
+        """Test a hold that runs out shows up at once, before the sweeper marks it expired"""
+        sweet = create_sweet(quantity=10)
+        api_client.force_authenticate(user=create_regular_user)
+        reserve(api_client, sweet, 4)
+        # The hold was taken ten minutes ago
+        Sweet.objects.update(updated_at=timezone.now() - timedelta(minutes=10))
+        detail_url = reverse('sweet-detail', kwargs={'pk': sweet.pk})
+        etag = api_client.get(detail_url)['ETag']
+        assert api_client.get(reverse('sweet-list-create')).data[0]['available'] == 6
+        # ...and has just run out
+        lapsed_at = timezone.now() - timedelta(seconds=1)
+        Reservation.objects.update(expires_at=lapsed_at)
+        get_catalog_cache().set(LAPSE_KEY, lapsed_at.timestamp(), timeout=None)
+
+        response = api_client.get(detail_url, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data['available'] == 10
+        assert api_client.get(reverse('sweet-list-create')).data[0]['available'] == 10
+        assert Reservation.objects.get().status == 'active'
+
+    def test_lapse_moves_on_to_next_hold(self, api_client, create_regular_user, create_sweet):
+        sweet = create_sweet(quantity=10)
+        api_client.force_authenticate(user=create_regular_user)
+        reserve(api_client, sweet, 1)
+        reserve(api_client, sweet, 2)
+        first, second = Reservation.objects.order_by('id')
+        Reservation.objects.filter(pk=first.pk).update(expires_at=timezone.now() - timedelta(seconds=1))
+        get_catalog_cache().set(LAPSE_KEY, 0, timeout=None)
+        version = get_catalog_cache().get(VERSION_KEY)
+
+        assert get_catalog_version() != version
+        assert get_catalog_cache().get(LAPSE_KEY) == second.expires_at.timestamp()
+
+
+@pytest.mark.django_db
+class TestExpireReservations:
+
+    def test_expires_in_batches(self, create_regular_user, create_sweet):
+        sweet = create_sweet()
+        past = timezone.now() - timedelta(minutes=1)
+        Reservation.objects.bulk_create(
+            [Reservation(user=create_regular_user, sweet=sweet, quantity=1, expires_at=past) for _ in range(5)]
+            + [Reservation(user=create_regular_user, sweet=sweet, quantity=1,
+                           expires_at=timezone.now() + timedelta(minutes=1))]
+        )
+
+        call_command('expire_reservations', '--batch-size', '2', stdout=StringIO())
+
+        assert Reservation.objects.filter(status='expired').count() == 5
+        assert Reservation.objects.filter(status='active').count() == 1
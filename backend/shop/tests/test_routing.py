@@ -0,0 +1,180 @@
+import json
+from io import StringIO
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.core.cache import caches
+from django.core.checks import run_checks
+from django.core.management import CommandError, call_command
+from django.db import connections
+from django.db.utils import ConnectionHandler
+from django.test import AsyncClient
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+from shop.authentication import ShopRefreshToken
+from shop.middleware import PIN_COOKIE, pin_key
+from shop.models import User, Sweet
+from shop.routers import PrimaryReplicaRouter, reset_replica, use_replica
+
+
+@pytest.fixture
+def replica(tmp_path, settings):
+    """
+    A 'replica1' alias backed by its own, initially empty, SQLite file.
+    Replaces the test mirror of the same name when DB_REPLICAS is set.
+    """
+    previous = connections.settings.get('replica1')
+    if previous is not None:
+        connections['replica1'].close()
+        del connections['replica1']
+    connections.settings['replica1'] = ConnectionHandler({'default': {
+        **connections['default'].settings_dict,
+        'NAME': str(tmp_path / 'replica1.sqlite3'),
+    }}).settings['default']
+    settings.DATABASE_REPLICAS = ['replica1']
+    settings.REPLICA_PIN_SECONDS = 5
+    yield 'replica1'
+    connections['replica1'].close()
+    del connections['replica1']
+    if previous is None:
+        del connections.settings['replica1']
+    else:
+        connections.settings['replica1'] = previous
+
+
+@pytest.fixture
+def api_client(replica):
+    # Created after the replica is configured so the routing middleware loads
+    return APIClient()
+
+
+def sync_replicas():
+    call_command('sync_replicas', stdout=StringIO())
+
+
+def bearer(user):
+    return {'HTTP_AUTHORIZATION': f'Bearer {ShopRefreshToken.for_user(user).access_token}'}
+
+
+def names(response):
+    assert response.status_code == status.HTTP_200_OK
+    return [sweet['name'] for sweet in response.data]
+
+
+class TestPrimaryReplicaRouter:
+
+    def test_reads_primary_by_default(self, settings):
+        settings.DATABASE_REPLICAS = ['replica1']
+
+        assert PrimaryReplicaRouter().db_for_read(Sweet) == 'default'
+
+    def test_reads_replica_when_enabled(self, settings):
+        settings.DATABASE_REPLICAS = ['replica1']
+        token = use_replica()
+        try:
+            assert PrimaryReplicaRouter().db_for_read(Sweet) == 'replica1'
+            assert PrimaryReplicaRouter().db_for_read(User) == 'default'
+            assert PrimaryReplicaRouter().db_for_write(Sweet) == 'default'
+        finally:
+            reset_replica(token)
+
+    def test_no_replicas_configured(self, settings):
+        settings.DATABASE_REPLICAS = []
+        token = use_replica()
+        try:
+            assert PrimaryReplicaRouter().db_for_read(Sweet) == 'default'
+        finally:
+            reset_replica(token)
+
+
+def asgi_get(url, **kwargs):
+    """GET through the ASGI handler, which runs the middleware async."""
+    async def get():
+        return await AsyncClient().get(url, **kwargs)
+    return async_to_sync(get)()
+
+
+@pytest.mark.django_db(transaction=True)
+class TestReplicaReads:
+
+    def test_catalog_reads_from_replica(self, api_client, replica, create_admin):
+        """Test list reads see the replica until it is synced"""
+        sync_replicas()
+        Sweet.objects.create(name='Barfi', price=10, quantity=5, created_by=create_admin)
+        url = reverse('sweet-list-create')
+
+        assert names(api_client.get(url)) == []
+
+        sync_replicas()
+        assert names(api_client.get(url)) == ['Barfi']
+
+    def test_catalog_reads_from_replica_under_asgi(self, replica, create_admin):
+        sync_replicas()
+        Sweet.objects.create(name='Barfi', price=10, quantity=5, created_by=create_admin)
+
+        assert json.loads(asgi_get(reverse('sweet-list-create')).content) == []
+
+    def test_writer_reads_own_writes(self, api_client, replica, create_admin):
+        """Test an admin sees the sweet they just created"""
+        sync_replicas()
+        api_client.credentials(**bearer(create_admin))
+        url = reverse('sweet-list-create')
+
+        response = api_client.post(url, {'name': 'Barfi', 'price': '10.00', 'quantity': 1}, format='json')
+        assert response.status_code == status.HTTP_201_CREATED
+        assert PIN_COOKIE in response.cookies
+
+        assert names(api_client.get(url)) == ['Barfi']
+        # Other clients keep reading the (stale) replica
+        assert names(APIClient().get(url)) == []
+
+    def test_token_client_pinned_without_cookie(self, replica, create_regular_user, create_admin):
+        """Test clients that drop cookies are pinned by user id"""
+        sweet = Sweet.objects.create(name='Barfi', price=10, quantity=5, created_by=create_admin)
+        sync_replicas()
+        headers = bearer(create_regular_user)
+
+        response = APIClient().post(reverse('purchase-sweet', kwargs={'pk': sweet.pk}), {'quantity': 1},
+                                    format='json', **headers)
+        assert response.status_code == status.HTTP_200_OK
+
+        response = APIClient().get(reverse('my-orders'), **headers)
+        assert len(response.data) == 1
+
+    def test_token_pin_shared_by_workers(self, replica, settings, create_regular_user, create_admin):
+        """Test a pin set by one worker is read back through the shared cache"""
+        sweet = Sweet.objects.create(name='Barfi', price=10, quantity=5, created_by=create_admin)
+        sync_replicas()
+        headers = bearer(create_regular_user)
+        APIClient().post(reverse('purchase-sweet', kwargs={'pk': sweet.pk}), {'quantity': 1},
+                         format='json', **headers)
+        # A separate cache object shares no memory with this one, like another worker's
+        other_worker = caches.create_connection(settings.REPLICA_PIN_CACHE_ALIAS)
+
+        assert other_worker.get(pin_key(create_regular_user.pk))
+
+    def test_per_process_pin_cache_rejected(self, settings):
+        """Test the system check refuses a locmem pin cache in production"""
+        settings.DEBUG = False
+        settings.DATABASE_REPLICAS = ['replica1']
+        settings.REPLICA_PIN_CACHE_ALIAS = 'default'
+
+        assert [error.id for error in run_checks(tags=['database'])] == ['shop.E002']
+
+    def test_replica_pin_expires(self, api_client, replica, settings, create_admin):
+        """Test a pin of zero seconds sends the next read back to the replica"""
+        settings.REPLICA_PIN_SECONDS = 0
+        sync_replicas()
+        api_client.credentials(**bearer(create_admin))
+        url = reverse('sweet-list-create')
+        api_client.post(url, {'name': 'Barfi', 'price': '10.00', 'quantity': 1}, format='json')
+        api_client.cookies.pop(PIN_COOKIE, None)
+
+        assert names(api_client.get(url)) == []
+
+    def test_sync_requires_replicas(self, settings):
+        settings.DATABASE_REPLICAS = []
+
+        with pytest.raises(CommandError, match='No replicas configured'):
+            call_command('sync_replicas')
@@ -0,0 +1,102 @@
+import pytest
+from django.urls import reverse
+from rest_framework import status
+from shop import search
+
+
+@pytest.fixture
+def without_fts(monkeypatch):
+    monkeypatch.setitem(search._fts_available, 'default', False)
+
+
+def names(response):
+    return [item['name'] for item in response.data]
+
+
+@pytest.mark.django_db
+class TestFullTextSearch:
+    """Test cases for the full-text search backend"""
+
+    def test_search_matches_description(self, api_client, create_sweet):
+        """Test q searches descriptions as well as names"""
+        create_sweet(name='Gulab Jamun', description='Fried milk dumplings in rose syrup')
+        create_sweet(name='Kaju Katli', description='Cashew fudge')
+
+        url = reverse('sweet-search')
+        response = api_client.get(url, {'q': 'rose'})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert names(response) == ['Gulab Jamun']
+
+    def test_search_prefix_matching(self, api_client, create_sweet):
+        """Test every word matches as a prefix"""
+        create_sweet(name='Gulab Jamun')
+        create_sweet(name='Gulkand Barfi')
+
+        url = reverse('sweet-search')
+        response = api_client.get(url, {'q': 'gul jam'})
+
+        assert names(response) == ['Gulab Jamun']
+
+    def test_name_matches_rank_first(self, api_client, create_sweet):
+        """Test a name hit ranks above a description hit"""
+        create_sweet(name='Rasmalai', description='Soft cheese patties like rasgulla')
+        create_sweet(name='Rasgulla', description='Spongy cheese balls')
+
+        url = reverse('sweet-search')
+        response = api_client.get(url, {'q': 'rasgulla'})
+
+        assert names(response) == ['Rasgulla', 'Rasmalai']
+
+    def test_name_param_ignores_description(self, api_client, create_sweet):
+        """Test name only searches the name column"""
+        create_sweet(name='Jalebi', description='Crisp and sweet')
+        create_sweet(name='Crisp Chikki')
+
+        url = reverse('sweet-search')
+        response = api_client.get(url, {'name': 'crisp'})
+
+        assert names(response) == ['Crisp Chikki']
+
+    def test_search_with_filters(self, api_client, create_sweet):
+        """Test full-text search combines with category and price filters"""
+        create_sweet(name='Festival Laddu', category='festival', price=50)
+        create_sweet(name='Premium Laddu', category='premium', price=500)
+        create_sweet(name='Festival Barfi', category='festival', price=80)
+
+        url = reverse('sweet-search')
+        response = api_client.get(url, {'q': 'laddu', 'category': 'festival', 'max_price': 100})
+
+        assert names(response) == ['Festival Laddu']
+
+    def test_index_follows_updates_and_deletes(self, api_client, create_sweet):
+        """Test the index is kept in sync with writes"""
+        sweet = create_sweet(name='Peda')
+        url = reverse('sweet-search')
+
+        sweet.name = 'Mysore Pak'
+        sweet.save()
+        assert names(api_client.get(url, {'q': 'peda'})) == []
+        assert names(api_client.get(url, {'q': 'mysore'})) == ['Mysore Pak']
+
+        sweet.delete()
+        assert names(api_client.get(url, {'q': 'mysore'})) == []
+
+    def test_search_input_cannot_inject_syntax(self, api_client, create_sweet):
+        """Test FTS operators in user input are treated as words"""
+        create_sweet(name='Gulab Jamun')
+
+        url = reverse('sweet-search')
+        response = api_client.get(url, {'q': 'gulab" OR NEAR(*'})
+
+        assert response.status_code == status.HTTP_200_OK
+
+    def test_fallback_without_fts(self, api_client, create_sweet, without_fts):
+        """Test the icontains fallback used on other databases"""
+        create_sweet(name='Gulab Jamun', description='Rose syrup')
+        create_sweet(name='Jalebi')
+
+        url = reverse('sweet-search')
+
+        assert names(api_client.get(url, {'q': 'rose'})) == ['Gulab Jamun']
+        assert names(api_client.get(url, {'name': 'ulab'})) == ['Gulab Jamun']
@@ -0,0 +1,91 @@
+from collections import Counter
+from io import StringIO
+
+import pytest
+from django.core.management import CommandError, call_command
+from shop.analytics import rebuild_sales_rollups
+from shop.models import DailyCategorySales, DailySweetSales, Order, Sweet, SweetSalesCounter, User
+from shop.seeding import SEED_PASSWORD
+
+
+def seed(*args):
+    out = StringIO()
+    call_command('seed_shop', *args, stdout=out)
+    return out.getvalue()
+
+
+def sales_snapshot():
+    return (
+        sorted(DailySweetSales.objects.values_list('date', 'sweet_id', 'units', 'revenue', 'order_count')),
+        sorted(DailyCategorySales.objects.values_list('date', 'category', 'units', 'revenue', 'order_count')),
+        sorted(SweetSalesCounter.objects.values_list('sweet_id', 'units')),
+    )
+
+
+@pytest.mark.django_db
+class TestSeedShop:
+
+    def test_seeds_requested_volumes(self):
+        output = seed('--users', '30', '--sweets', '50', '--orders', '2000', '--days', '10')
+
+        assert 'Seeded the shop' in output
+        assert User.objects.filter(role='user').count() == 30
+        assert User.objects.filter(role='admin').count() == 1
+        assert Sweet.objects.count() == 50
+        assert Order.objects.count() == 2000
+        assert not Order.objects.exclude(total_price__gt=0).exists()
+
+    def test_users_can_log_in(self):
+        seed('--users', '2', '--sweets', '1', '--orders', '1')
+
+        assert all(user.check_password(SEED_PASSWORD) for user in User.objects.all())
+
+    def test_popularity_is_skewed(self):
+        """Test a few bestsellers carry a large share of the orders"""
+        seed('--users', '20', '--sweets', '100', '--orders', '5000')
+
+        top = Counter(Order.objects.values_list('sweet_id', flat=True)).most_common(5)
+
+        assert sum(count for _, count in top) > 5000 * 0.3
+
+    def test_rollups_match_rebuild(self):
+        """Test the rollups written while seeding equal a rebuild from the orders"""
+        seed('--users', '20', '--sweets', '30', '--orders', '3000', '--days', '40')
+        seeded = sales_snapshot()
+
+        rebuild_sales_rollups()
+        SweetSalesCounter.objects.rebuild()
+
+        assert seeded == sales_snapshot()
+        assert len(seeded[0]) > 40
+
+    def test_same_seed_same_data(self):
+        seed('--users', '5', '--sweets', '10', '--orders', '100', '--seed', '7')
+        first = list(Sweet.objects.order_by('pk').values_list('name', 'price', 'category'))
+        Order.objects.all().delete()
+        Sweet.objects.all().delete()
+        User.objects.all().delete()
+
+        seed('--users', '5', '--sweets', '10', '--orders', '100', '--seed', '7')
+
+        # Names carry the pk, which keeps counting up after the deletes
+        second = list(Sweet.objects.order_by('pk').values_list('name', 'price', 'category'))
+        assert [row[1:] for row in first] == [row[1:] for row in second]
+        assert [row[0].rsplit(' ', 1)[0] for row in first] == [row[0].rsplit(' ', 1)[0] for row in second]
+
+    def test_existing_orders_are_kept_in_rollups(self):
+        """Test seeding a database that already has orders rebuilds the rollups"""
+        seed('--users', '5', '--sweets', '5', '--orders', '200')
+
+        seed('--users', '5', '--sweets', '5', '--orders', '300')
+
+        assert DailySweetSales.objects.count() and sum(
+            DailySweetSales.objects.values_list('order_count', flat=True)
+        ) == 500
+        assert sum(SweetSalesCounter.objects.values_list('units', flat=True)) == sum(
+            Order.objects.values_list('quantity', flat=True)
+        )
+
+    def test_orders_need_users_and_sweets(self):
+        with pytest.raises(CommandError):
+            seed('--users', '0', '--sweets', '5', '--orders', '10')
@@ -0,0 +1,96 @@
+"""
+Per-request timing for RequestTimingMiddleware.
+
+The middleware puts a RequestTiming in a context variable for the whole
+request; serializers add the time they spend turning objects into
+response data to it through timed_serialization(). Both the DRF
+serializers (SerializationTimingMixin) and the fast_serializers row
+formatters are timed, so the async fast path reports its serialization
+too. Queries run while serializing (lazy querysets, related objects) are
+counted as database time, not serialization time. Outside a timed
+request the hooks cost one context variable lookup.
+"""
+import contextlib
+import contextvars
+import time
+
+
+_request_timing = contextvars.ContextVar('request_timing', default=None)
+
+
+class QueryTimer:
+    """
+    Database execute wrapper counting and timing the queries of one request.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.slowest = 0.0
+        self.slowest_sql = None
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.count += 1
+            self.duration += elapsed
+            if elapsed >= self.slowest:
+                self.slowest = elapsed
+                self.slowest_sql = sql
+
+
+class RequestTiming:
+    """
+    The queries and serialization time of one request.
+    """
+
+    def __init__(self):
+        self.queries = QueryTimer()
+        self.serialization = 0.0
+        self.serializing = False
+
+
+def start_timing(timing):
+    """
+    Time the serializers run in the current context; returns a token for
+    stop_timing().
+    """
+    return _request_timing.set(timing)
+
+
+def stop_timing(token):
+    _request_timing.reset(token)
+
+
+@contextlib.contextmanager
+def timed_serialization():
+    """
+    Add the time of the block, less its queries, to the request's
+    serialization time. Nested blocks are counted once, by the outermost.
+    """
+    timing = _request_timing.get()
+    if timing is None or timing.serializing:
+        yield
+        return
+    timing.serializing = True
+    queries = timing.queries.duration
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started - (timing.queries.duration - queries)
+        timing.serialization += max(elapsed, 0.0)
+        timing.serializing = False
+
+
+class SerializationTimingMixin:
+    """
+    Count a serializer's to_representation() as serialization time.
+    """
+
+    def to_representation(self, instance):
+        with timed_serialization():
+            return super().to_representation(instance)
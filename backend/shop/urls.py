@@ -1,20 +1,45 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 urlpatterns = [
     # Auth endpoints
-    path('auth/register/', views.register, name='register'),
-    path('auth/login/', views.login, name='login'),
+    path('auth/register/', async_views.register, name='register'),
+    path('auth/login/', async_views.login, name='login'),
     
     # Sweet endpoints
     path('sweets/', views.SweetListCreateView.as_view(), name='sweet-list-create'),
     path('sweets/<int:pk>/', views.SweetDetailView.as_view(), name='sweet-detail'),
     path('sweets/search/', views.search_sweets, name='sweet-search'),
+    path('sweets/popular/', views.popular_sweets, name='sweet-popular'),
+    path('sweets/import/', views.import_sweets_file, name='sweet-import'),
     
     # Inventory endpoints
     path('sweets/<int:pk>/purchase/', views.purchase_sweet, name='purchase-sweet'),
     path('sweets/<int:pk>/restock/', views.restock_sweet, name='restock-sweet'),
     
+    # Reservations
+    path('sweets/<int:pk>/reserve/', views.reserve_sweet, name='reserve-sweet'),
+    path('reservations/<int:pk>/confirm/', views.confirm_reservation, name='confirm-reservation'),
+    path('reservations/<int:pk>/cancel/', views.cancel_reservation, name='cancel-reservation'),
+    
     # Orders
     path('orders/my/', views.my_orders, name='my-orders'),
+    path('orders/checkout/', views.checkout, name='checkout'),
+    
+    # Analytics
+    path('analytics/sales/', views.sales_analytics, name='sales-analytics'),
+    
+    # Cache
+    path('cache/stats/', views.catalog_cache_stats, name='cache-stats'),
+    
+    # Monitoring
+    path('metrics/', views.prometheus_metrics, name='metrics'),
+    path('profiles/<str:profile_id>/', views.request_profile, name='request-profile'),
+    path('profiles/views/<str:view_name>/flamegraph/', views.view_flamegraph, name='view-flamegraph'),
+    
+    # Async read endpoints, for ASGI deployments
+    path('async/sweets/', async_views.sweet_list, name='async-sweet-list'),
+    path('async/sweets/<int:pk>/', async_views.sweet_detail, name='async-sweet-detail'),
+    path('async/sweets/search/', async_views.search_sweets, name='async-sweet-search'),
+    path('async/orders/my/', async_views.my_orders, name='async-my-orders'),
 ]
\ No newline at end of file
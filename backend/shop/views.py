@@ -1,156 +1,198 @@
 from rest_framework import status, generics, filters
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
+from rest_framework.exceptions import APIException
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
-from rest_framework_simplejwt.tokens import RefreshToken
-from django.contrib.auth import authenticate
-from django.db.models import Q
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
+from django.db.models import Q, Sum
 from django.db import transaction
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.utils.http import quote_etag
+from django.views.decorators.http import condition, require_GET
+import concurrent.futures
+import hmac
+import os
+from datetime import timedelta
 
-from .models import User, Sweet, Order
+from .models import Sweet, Order, Reservation, SweetSalesCounter
 from .serializers import (
-    UserSerializer, LoginSerializer, SweetSerializer, 
-    OrderSerializer, PurchaseSerializer, RestockSerializer
+    SweetSerializer, PopularSweetSerializer,
+    OrderSerializer, PurchaseSerializer, RestockSerializer, CheckoutSerializer, SalesReportSerializer,
+    ReserveSerializer, ReservationSerializer
 )
 from .permissions import IsAdminUser, IsAdminOrReadOnly
+from .authentication import StatelessJWTAuthentication, get_request_user
+from .analytics import record_sales, sales_report
+from .flash_sale import SoldOut, forget_sweet, get_flash_sales
+from .idempotency import idempotent
+from . import metrics, profiling
+from .importers import FORMATS, UnreadableFile, decode_lines, guess_format, import_sweets
+from .pagination import KeysetPagination
+from .search import search_queryset
+from .cache import cached_response, invalidate_catalog, note_hold_expiry, stats as cache_stats
+from .fast_serializers import ORDER_COLUMNS, SWEET_COLUMNS, order_rows, sweet_rows
+from .renderers import FastJSONRenderer
+from .conditional import (
+    catalog_etag, catalog_last_modified, make_sweet_etag, sweet_etag, sweet_last_modified
+)
 
 
-# ============= AUTH VIEWS =============
+# ============= SWEET VIEWS =============
 
-@api_view(['POST'])
-@permission_classes([AllowAny])
-def register(request):
-    """
-    Register a new user.
-    """
-    serializer = UserSerializer(data=request.data)
-    if serializer.is_valid():
-        user = serializer.save()
-        
-        # Generate tokens
-        refresh = RefreshToken.for_user(user)
-        
-        return Response({
-            'message': 'User registered successfully',
-            'user': {
-                'id': user.id,
-                'email': user.email,
-                'name': user.first_name,
-                'role': user.role,
-                'token': str(refresh.access_token)
-            }
-        }, status=status.HTTP_201_CREATED)
-    
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+# The fast renderer is opt-in: clients ask for it with ?format=fastjson
+READ_RENDERER_CLASSES = [*api_settings.DEFAULT_RENDERER_CLASSES, FastJSONRenderer]
 
 
-@api_view(['POST'])
-@permission_classes([AllowAny])
-def login(request):
+def fast_list_response(request, queryset, columns, format_rows):
     """
-    Login user and return JWT token.
+    Build a list response from values_list() rows, paginated like the
+    regular path when the client asks for pages.
     """
-    serializer = LoginSerializer(data=request.data)
-    if serializer.is_valid():
-        email = serializer.validated_data['email']
-        password = serializer.validated_data['password']
-        
-        try:
-            user = User.objects.get(email=email)
-            
-            # Check password using Django's built-in method
-            if user.check_password(password):
-                refresh = RefreshToken.for_user(user)
-                
-                return Response({
-                    'message': 'Login successful',
-                    'user': {
-                        'id': user.id,
-                        'email': user.email,
-                        'name': user.first_name,
-                        'role': user.role,
-                        'token': str(refresh.access_token)
-                    }
-                }, status=status.HTTP_200_OK)
-            else:
-                return Response({
-                    'error': 'Invalid credentials'
-                }, status=status.HTTP_401_UNAUTHORIZED)
-                
-        except User.DoesNotExist:
-            return Response({
-                'error': 'Invalid credentials'
-            }, status=status.HTTP_401_UNAUTHORIZED)
-    
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    paginator = KeysetPagination()
+    page = paginator.paginate_queryset(queryset.values_list(*columns, named=True), request)
+    if page is not None:
+        return paginator.get_paginated_response(format_rows(page))
+    return Response(format_rows(queryset.values_list(*columns)), status=status.HTTP_200_OK)
 
 
-# ============= SWEET VIEWS =============
+catalog_condition = condition(etag_func=catalog_etag, last_modified_func=catalog_last_modified)
+sweet_condition = condition(etag_func=sweet_etag, last_modified_func=sweet_last_modified)
+
 
+@method_decorator(catalog_condition, name='get')
 class SweetListCreateView(generics.ListCreateAPIView):
     """
-    GET: List all sweets
+    GET: List all sweets (cursor-paginated when `cursor` or `page_size` is given)
     POST: Create a new sweet (Admin only)
     """
-    queryset = Sweet.objects.all()
     serializer_class = SweetSerializer
     permission_classes = [IsAdminOrReadOnly]
+    pagination_class = KeysetPagination
+    renderer_classes = READ_RENDERER_CLASSES
+    
+    def get_queryset(self):
+        # Built per request: which holds are still active depends on the time
+        return Sweet.objects.select_related('created_by').with_available()
+    
+    def list(self, request, *args, **kwargs):
+        return cached_response(request, lambda: self.build_list(request, *args, **kwargs))
+    
+    def build_list(self, request, *args, **kwargs):
+        if isinstance(request.accepted_renderer, FastJSONRenderer):
+            return fast_list_response(request, self.get_queryset(), SWEET_COLUMNS, sweet_rows)
+        return super().list(request, *args, **kwargs)
     
     def perform_create(self, serializer):
-        serializer.save(created_by=self.request.user)
+        serializer.save(created_by=get_request_user(self.request))
 
 
+@method_decorator(sweet_condition, name='get')
+@method_decorator(sweet_condition, name='put')
+@method_decorator(sweet_condition, name='patch')
 class SweetDetailView(generics.RetrieveUpdateDestroyAPIView):
     """
-    GET: Retrieve a sweet
-    PUT/PATCH: Update a sweet (Admin only)
+    GET: Retrieve a sweet (supports If-None-Match / If-Modified-Since)
+    PUT/PATCH: Update a sweet (Admin only, honors If-Match)
     DELETE: Delete a sweet (Admin only)
     """
-    queryset = Sweet.objects.all()
     serializer_class = SweetSerializer
     permission_classes = [IsAdminOrReadOnly]
+    
+    def get_queryset(self):
+        # Built per request: which holds are still active depends on the time
+        return Sweet.objects.select_related('created_by').with_available()
+    
+    def retrieve(self, request, *args, **kwargs):
+        return cached_response(request, lambda: super(SweetDetailView, self).retrieve(request, *args, **kwargs))
+    
+    def update(self, request, *args, **kwargs):
+        response = super().update(request, *args, **kwargs)
+        # Hand back the new validator so the client can chain If-Match writes
+        sweet = self.updated_sweet
+        response['ETag'] = quote_etag(make_sweet_etag(sweet.pk, sweet.updated_at))
+        return response
+    
+    def perform_update(self, serializer):
+        self.updated_sweet = serializer.save()
 
 
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@catalog_condition
 def search_sweets(request):
     """
-    Search sweets by name, category, or price range.
-    Query params: name, category, min_price, max_price
+    Search sweets by name, description, category, or price range.
+    Text searches use the full-text index: words match by prefix and the
+    best matches come first (unless the results are paginated).
+    Query params: q, name, category, min_price, max_price, cursor, page_size
     """
-    queryset = Sweet.objects.all()
-    
-    # Search by name
-    name = request.query_params.get('name', None)
-    if name:
-        queryset = queryset.filter(name__icontains=name)
-    
-    # Filter by category
-    category = request.query_params.get('category', None)
-    if category:
-        queryset = queryset.filter(category=category)
-    
-    # Filter by price range
-    min_price = request.query_params.get('min_price', None)
-    max_price = request.query_params.get('max_price', None)
+    return cached_response(request, lambda: _search_sweets(request))
+
+
+def _search_sweets(request):
+    queryset = search_queryset(Sweet.objects.select_related('created_by').with_available(), request.query_params)
     
-    if min_price:
-        queryset = queryset.filter(price__gte=min_price)
-    if max_price:
-        queryset = queryset.filter(price__lte=max_price)
+    paginator = KeysetPagination()
+    page = paginator.paginate_queryset(queryset, request)
+    if page is not None:
+        return paginator.get_paginated_response(SweetSerializer(page, many=True).data)
     
     serializer = SweetSerializer(queryset, many=True)
     return Response(serializer.data, status=status.HTTP_200_OK)
 
 
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@catalog_condition
+def popular_sweets(request):
+    """
+    Best-selling sweets, most units sold first, from the sharded sales counters.
+    Query params: limit (default 10, max 100)
+    """
+    return cached_response(request, lambda: _popular_sweets(request))
+
+
+def _popular_sweets(request):
+    try:
+        limit = min(max(int(request.query_params.get('limit', 10)), 1), 100)
+    except ValueError:
+        return Response({
+            'error': 'limit must be a number'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    totals = SweetSalesCounter.objects.values('sweet_id').annotate(total=Sum('units')).order_by('-total', 'sweet_id')
+    totals = {row['sweet_id']: row['total'] for row in totals[:limit]}
+    sweets = Sweet.objects.select_related('created_by').with_available().in_bulk(list(totals))
+    
+    popular = []
+    for pk, total in totals.items():
+        if pk in sweets:
+            sweets[pk]._units_sold = total
+            popular.append(sweets[pk])
+    return Response(PopularSweetSerializer(popular, many=True).data, status=status.HTTP_200_OK)
+
+
 # ============= INVENTORY VIEWS =============
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@idempotent
 def purchase_sweet(request, pk):
     """
     Purchase a sweet, decreasing its quantity.
+    Body: {"quantity": <n>}, or {"reservation": <id>} to buy the units a reservation holds
+    Headers: Idempotency-Key (optional; retries with the same key replay the first response)
     """
+    # A sweet this process already has on flash sale needs no lookup
+    if get_flash_sales().is_running(pk):
+        response = _flash_purchase(request, pk)
+        if response is not None:
+            return response
+    
     try:
         sweet = Sweet.objects.get(pk=pk)
     except Sweet.DoesNotExist:
@@ -162,40 +204,124 @@ def purchase_sweet(request, pk):
     if not serializer.is_valid():
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
-    quantity = serializer.validated_data.get('quantity', 1)
+    reservation_id = serializer.validated_data.get('reservation')
+    if reservation_id is None:
+        if sweet.flash_sale:
+            response = _flash_purchase(request, pk, serializer)
+            if response is not None:
+                return response
+        return _place_order(request, sweet, serializer.validated_data.get('quantity', 1))
     
-    # Check if enough quantity available
-    if sweet.quantity < quantity:
+    try:
+        reservation = Reservation.objects.get(pk=reservation_id, user_id=request.user.id, sweet=sweet)
+    except Reservation.DoesNotExist:
         return Response({
-            'error': f'Insufficient quantity. Only {sweet.quantity} available.'
-        }, status=status.HTTP_400_BAD_REQUEST)
-    
+            'error': 'Reservation not found'
+        }, status=status.HTTP_404_NOT_FOUND)
+    return _place_order(request, sweet, reservation.quantity, reservation)
+
+
+def _place_order(request, sweet, quantity, reservation=None):
+    """
+    Buy `quantity` units of `sweet`, consuming `reservation` if given.
+    """
     # Create order and update quantity in a transaction
     try:
         with transaction.atomic():
-            # Decrease quantity
-            sweet.quantity -= quantity
-            sweet.save()
+            Sweet.objects.lock_stock([sweet.pk])
+            # Claiming the hold releases its units to this purchase; only an
+            # active hold can be claimed, and only once.
+            if reservation is not None and not Reservation.objects.active().filter(
+                pk=reservation.pk
+            ).update(status='confirmed'):
+                metrics.count_purchase('conflict')
+                return Response({
+                    'error': 'Reservation is no longer active'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            
+            # Decrease quantity with a conditional UPDATE; the affected-row
+            # count tells us whether enough unreserved stock was left.
+            if not Sweet.objects.decrement_stock(sweet.pk, quantity):
+                available = Sweet.objects.with_available().filter(pk=sweet.pk).values_list('available', flat=True).first()
+                # Give a claimed hold back
+                transaction.set_rollback(True)
+                metrics.count_purchase('insufficient_stock')
+                return Response({
+                    'error': f'Insufficient quantity. Only {available or 0} available.'
+                }, status=status.HTTP_400_BAD_REQUEST)
             
             # Create order
             total_price = sweet.price * quantity
             order = Order.objects.create(
-                user=request.user,
+                user=get_request_user(request),
                 sweet=sweet,
                 quantity=quantity,
                 total_price=total_price
             )
+            if reservation is not None:
+                Reservation.objects.filter(pk=reservation.pk).update(order=order)
+            record_sales([order])
+            
+            remaining_quantity = Sweet.objects.filter(pk=sweet.pk).values_list('quantity', flat=True).get()
+            invalidate_catalog()
+            metrics.count_purchase('success', quantity)
             
             return Response({
                 'message': 'Purchase successful',
                 'order': OrderSerializer(order).data,
-                'remaining_quantity': sweet.quantity
+                'remaining_quantity': remaining_quantity
             }, status=status.HTTP_200_OK)
     
     except Exception as e:
+        metrics.count_purchase('error')
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def _flash_purchase(request, pk, serializer=None):
+    """
+    Buy through the flash-sale queue. Returns None when the purchase has
+    to take the regular path: it names a reservation, or the sale ended.
+    """
+    if serializer is None:
+        serializer = PurchaseSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    if serializer.validated_data.get('reservation') is not None:
+        return None
+    
+    try:
+        future = get_flash_sales().admit(pk, get_request_user(request), serializer.validated_data.get('quantity', 1))
+        if future is None:
+            return None
+        try:
+            order, remaining_quantity = future.result(timeout=settings.FLASH_SALE_TIMEOUT)
+        except concurrent.futures.TimeoutError:  # Not the builtin one before Python 3.11
+            # Still queued: withdraw it. Already committing: wait for the outcome.
+            if future.cancel():
+                metrics.count_purchase('conflict')
+                return Response({
+                    'error': 'Too many purchases in flight, please retry'
+                }, status=status.HTTP_503_SERVICE_UNAVAILABLE, headers={'Retry-After': '1'})
+            order, remaining_quantity = future.result()
+    except SoldOut as e:
+        metrics.count_purchase('insufficient_stock')
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        metrics.count_purchase('error')
         return Response({
             'error': str(e)
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    metrics.count_purchase('success', order.quantity)
+    return Response({
+        'message': 'Purchase successful',
+        'order': OrderSerializer(order).data,
+        'remaining_quantity': remaining_quantity
+    }, status=status.HTTP_200_OK)
 
 
 @api_view(['POST'])
@@ -205,7 +331,7 @@ def restock_sweet(request, pk):
     Restock a sweet, increasing its quantity (Admin only).
     """
     try:
-        sweet = Sweet.objects.get(pk=pk)
+        sweet = Sweet.objects.select_related('created_by').get(pk=pk)
     except Sweet.DoesNotExist:
         return Response({
             'error': 'Sweet not found'
@@ -217,9 +343,16 @@ def restock_sweet(request, pk):
     
     quantity = serializer.validated_data['quantity']
     
-    # Increase quantity
-    sweet.quantity += quantity
-    sweet.save()
+    # Increase quantity without overwriting concurrent purchases
+    Sweet.objects.increment_stock(sweet.pk, quantity)
+    invalidate_catalog()
+    forget_sweet(sweet.pk)
+    metrics.inc('shop_restocks_total')
+    metrics.inc('shop_restocked_units_total', quantity)
+    # Re-read the new stock, and how much of it is free of holds, in one query
+    sweet.quantity, sweet.updated_at, sweet.available = Sweet.objects.with_available().values_list(
+        'quantity', 'updated_at', 'available'
+    ).get(pk=sweet.pk)
     
     return Response({
         'message': 'Restock successful',
@@ -227,12 +360,332 @@ def restock_sweet(request, pk):
     }, status=status.HTTP_200_OK)
 
 
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def import_sweets_file(request):
+    """
+    Bulk create and restock sweets from an uploaded CSV or NDJSON file (Admin only).
+    Rows with an `id` restock that sweet; rows without one create a sweet.
+    Query params: file_format (csv or ndjson, guessed from the file name if omitted)
+    """
+    upload = request.FILES.get('file')
+    if upload is None:
+        return Response({
+            'error': 'No file uploaded'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    fmt = request.query_params.get('file_format') or guess_format(upload.name)
+    if fmt not in FORMATS:
+        return Response({
+            'error': f'Unsupported format. Use one of: {", ".join(FORMATS)}'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    # Stream the upload line by line instead of reading it into memory
+    try:
+        result = import_sweets(decode_lines(upload.file), fmt, created_by=get_request_user(request))
+    except UnreadableFile as e:
+        # Rows before the bad line are applied; report them with the line
+        return Response({
+            'error': str(e),
+            'line': e.line_number,
+            **e.result
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response({
+        'message': 'Import finished',
+        **result
+    }, status=status.HTTP_200_OK)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@renderer_classes(READ_RENDERER_CLASSES)
 def my_orders(request):
     """
     Get all orders for the authenticated user.
+    Query params: cursor, page_size
     """
-    orders = Order.objects.filter(user=request.user)
+    orders = Order.objects.filter(user_id=request.user.id).select_related('sweet', 'user')
+    
+    if isinstance(request.accepted_renderer, FastJSONRenderer):
+        return fast_list_response(request, orders, ORDER_COLUMNS, order_rows)
+    
+    paginator = KeysetPagination()
+    page = paginator.paginate_queryset(orders, request)
+    if page is not None:
+        return paginator.get_paginated_response(OrderSerializer(page, many=True).data)
+    
     serializer = OrderSerializer(orders, many=True)
-    return Response(serializer.data, status=status.HTTP_200_OK)
\ No newline at end of file
+    return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@idempotent
+def checkout(request):
+    """
+    Purchase several sweets in one all-or-nothing transaction.
+    Body: {"items": [{"sweet": <id>, "quantity": <n>}, ...]}
+    Headers: Idempotency-Key (optional)
+    """
+    serializer = CheckoutSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    # Merge repeated lines for the same sweet and sort by id, so concurrent
+    # checkouts always touch rows in the same order and cannot deadlock.
+    quantities = {}
+    for item in serializer.validated_data['items']:
+        quantities[item['sweet']] = quantities.get(item['sweet'], 0) + item['quantity']
+    quantities = dict(sorted(quantities.items()))
+    
+    sweets = Sweet.objects.in_bulk(list(quantities))
+    missing = [pk for pk in quantities if pk not in sweets]
+    if missing:
+        return Response({
+            'error': 'Sweet not found',
+            'sweets': missing
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    try:
+        with transaction.atomic():
+            Sweet.objects.lock_stock(quantities)
+            
+            # One conditional UPDATE for the whole basket
+            stocked = Sweet.objects.decrement_stock_many(quantities)
+            if stocked:
+                user = get_request_user(request)
+                orders = Order.objects.bulk_create([
+                    Order(
+                        user=user,
+                        sweet=sweets[pk],
+                        quantity=quantity,
+                        total_price=sweets[pk].price * quantity
+                    )
+                    for pk, quantity in quantities.items()
+                ])
+                record_sales(orders)
+                invalidate_catalog()
+            else:
+                transaction.set_rollback(True)
+    
+    except Exception as e:
+        metrics.count_purchase('error')
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    if not stocked:
+        available = dict(Sweet.objects.with_available().filter(pk__in=quantities).values_list('pk', 'available'))
+        short = [pk for pk, quantity in quantities.items() if available.get(pk, 0) < quantity]
+        metrics.count_purchase('insufficient_stock')
+        return Response({
+            'error': 'Insufficient quantity for: ' + ', '.join(
+                f'{sweets[pk].name} (only {available.get(pk, 0)} available)' for pk in short
+            ),
+            'sweets': short
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    metrics.count_purchase('success', sum(quantities.values()))
+    return Response({
+        'message': 'Checkout successful',
+        'orders': OrderSerializer(orders, many=True).data,
+        'total_price': str(sum(order.total_price for order in orders))
+    }, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def catalog_cache_stats(request):
+    """
+    Hit/miss counters of the catalog response cache for this worker (Admin only).
+    """
+    return Response({
+        'backend': settings.CACHES[settings.CATALOG_CACHE_ALIAS]['BACKEND'],
+        'enabled': settings.CATALOG_CACHE_ENABLED,
+        **cache_stats.as_dict()
+    }, status=status.HTTP_200_OK)
+
+
+# ============= MONITORING VIEWS =============
+
+def can_scrape_metrics(request):
+    if settings.METRICS_TOKEN and hmac.compare_digest(
+        request.headers.get('Authorization', ''), f'Bearer {settings.METRICS_TOKEN}'
+    ):
+        return True
+    try:
+        return IsAdminUser().has_permission(Request(request, authenticators=[StatelessJWTAuthentication()]), None)
+    except APIException:
+        return False
+
+
+@require_GET
+def prometheus_metrics(request):
+    """
+    Request, purchase, restock, cache and connection metrics of every
+    worker process on this host, in the Prometheus text format
+    (METRICS_TOKEN holders and admins only).
+    Headers: Authorization: Bearer <METRICS_TOKEN or an admin's access token>
+    """
+    registry = metrics.get_registry()
+    if registry is None:
+        raise Http404
+    
+    # A plain Django view: scrapers are not API users, and the text
+    # format needs no content negotiation
+    if not can_scrape_metrics(request):
+        return JsonResponse({
+            'error': 'Metrics need the metrics token or an admin token'
+        }, status=status.HTTP_401_UNAUTHORIZED)
+    
+    return HttpResponse(metrics.render(registry.collect()), content_type=metrics.CONTENT_TYPE)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def request_profile(request, profile_id):
+    """
+    A stored request profile: the top functions by cumulative time as text (Admin only).
+    Query params: limit (default 50), download=1 for the raw pstats file (for snakeviz and the like)
+    """
+    path = profiling.profile_path(profile_id)
+    if path is None or not os.path.exists(path):
+        return Response({
+            'error': 'Profile not found'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    if request.query_params.get('download') == '1':
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=f'{profile_id}.prof')
+    try:
+        limit = int(request.query_params.get('limit', 50))
+    except ValueError:
+        return Response({
+            'error': 'limit must be an integer'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    return HttpResponse(profiling.format_profile(profile_id, limit), content_type='text/plain; charset=utf-8')
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def view_flamegraph(request, view_name):
+    """
+    Folded stacks of every profiled request of a view, summed (Admin only).
+    Feed them to flamegraph.pl or speedscope; values are microseconds.
+    """
+    stacks = profiling.read_folded(view_name)
+    if not stacks:
+        return Response({
+            'error': 'No profiles for this view'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    lines = ''.join(f'{stack} {micros}\n' for stack, micros in sorted(stacks.items()))
+    return HttpResponse(lines, content_type='text/plain; charset=utf-8')
+
+
+# ============= RESERVATION VIEWS =============
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@idempotent
+def reserve_sweet(request, pk):
+    """
+    Hold units of a sweet for RESERVATION_TTL_SECONDS so nobody else can buy them.
+    Buy them with the confirm endpoint (or `reservation` in a purchase) before the hold expires.
+    """
+    try:
+        sweet = Sweet.objects.get(pk=pk)
+    except Sweet.DoesNotExist:
+        return Response({
+            'error': 'Sweet not found'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    serializer = ReserveSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    quantity = serializer.validated_data['quantity']
+    
+    try:
+        with transaction.atomic():
+            Sweet.objects.lock_stock([sweet.pk])
+            if not Sweet.objects.hold_stock(sweet.pk, quantity):
+                available = Sweet.objects.with_available().filter(pk=sweet.pk).values_list('available', flat=True).first()
+                return Response({
+                    'error': f'Insufficient quantity. Only {available or 0} available.'
+                }, status=status.HTTP_400_BAD_REQUEST)
+            
+            reservation = Reservation.objects.create(
+                user_id=request.user.id,
+                sweet=sweet,
+                quantity=quantity,
+                expires_at=timezone.now() + timedelta(seconds=settings.RESERVATION_TTL_SECONDS)
+            )
+            # The hold lowers the sweet's `available`, and raises it again when it runs out
+            invalidate_catalog()
+            note_hold_expiry(reservation.expires_at)
+    
+    except Exception as e:
+        return Response({
+            'error': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    return Response({
+        'message': 'Reservation created',
+        'reservation': ReservationSerializer(reservation).data
+    }, status=status.HTTP_201_CREATED)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def confirm_reservation(request, pk):
+    """
+    Buy the units held by a reservation.
+    """
+    try:
+        reservation = Reservation.objects.select_related('sweet').get(pk=pk, user_id=request.user.id)
+    except Reservation.DoesNotExist:
+        return Response({
+            'error': 'Reservation not found'
+        }, status=status.HTTP_404_NOT_FOUND)
+    
+    return _place_order(request, reservation.sweet, reservation.quantity, reservation)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def cancel_reservation(request, pk):
+    """
+    Release the units held by a reservation.
+    """
+    reservations = Reservation.objects.filter(pk=pk, user_id=request.user.id)
+    if not reservations.active().update(status='cancelled'):
+        if not reservations.exists():
+            return Response({
+                'error': 'Reservation not found'
+            }, status=status.HTTP_404_NOT_FOUND)
+        return Response({
+            'error': 'Reservation is no longer active'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
+    Sweet.objects.release_stock(reservations.values_list('sweet_id', flat=True))
+    
+    return Response({
+        'message': 'Reservation cancelled'
+    }, status=status.HTTP_200_OK)
+
+
+# ============= ANALYTICS VIEWS =============
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def sales_analytics(request):
+    """
+    Units, revenue and order counts for a date range, from the daily rollups (Admin only).
+    Query params: start, end (YYYY-MM-DD, default the last 30 days), group_by (category or sweet), limit
+    """
+    serializer = SalesReportSerializer(data=request.query_params)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response(sales_report(**serializer.validated_data), status=status.HTTP_200_OK)
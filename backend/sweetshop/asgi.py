@@ -0,0 +1,19 @@
+"""
+ASGI config for sweetshop project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with an ASGI server, for example:
+
+    uvicorn sweetshop.asgi:application --workers 4
+
+For more information on this file, see
+https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sweetshop.settings')
+
+application = get_asgi_application()
\ No newline at end of file
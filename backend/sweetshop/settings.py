@@ -27,14 +27,18 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'shop.middleware.RequestTimingMiddleware',
+    'shop.middleware.MetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'shop.middleware.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'shop.middleware.ProfilingMiddleware',
 ]
 
 ROOT_URLCONF = 'sweetshop.urls'
@@ -56,14 +60,159 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'sweetshop.wsgi.application'
+ASGI_APPLICATION = 'sweetshop.asgi.application'
 
-DATABASES = {
+# DB_PROFILE picks the database configuration:
+# - default: plain SQLite, a new connection per request.
+# - production: SQLite tuned for concurrent readers and writers (WAL,
+#   relaxed fsync, mmap, a larger page cache), BEGIN IMMEDIATE for
+#   atomic() blocks and persistent connections (DB_CONN_MAX_AGE seconds).
+DB_PROFILE = os.environ.get('DB_PROFILE', 'default')
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,  # KiB
+    'temp_store': 'MEMORY',
+}
+
+DATABASE_PROFILES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
+    },
+    'production': {
+        'ENGINE': 'sweetshop.sqlite_backend',
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'init_command': ';'.join(f'PRAGMA {name} = {value}' for name, value in SQLITE_PRAGMAS.items()),
+        },
+    },
+}
+
+DATABASES = {
+    'default': {
+        **DATABASE_PROFILES[DB_PROFILE],
         'NAME': BASE_DIR / 'db.sqlite3',
+        # A file-backed test database lets concurrency tests share it
+        # across threads (in-memory SQLite uses table-level locks).
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
+# DB_REPLICAS: number of read replicas, stored next to the primary as
+# db_replica1.sqlite3, db_replica2.sqlite3, ... Catalog and order-history
+# reads go to a replica (see shop/routers.py); `manage.py sync_replicas`
+# copies the primary onto them. A client that writes reads from the
+# primary for the next REPLICA_PIN_SECONDS.
+DATABASE_REPLICAS = [f'replica{i}' for i in range(1, int(os.environ.get('DB_REPLICAS', 0)) + 1)]
+for alias in DATABASE_REPLICAS:
+    DATABASES[alias] = {
+        **DATABASES['default'],
+        'NAME': BASE_DIR / f'db_{alias}.sqlite3',
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['shop.routers.PrimaryReplicaRouter']
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 5))
+
+# Caches
+# The catalog cache holds versioned sweets list/detail/search responses.
+# CATALOG_CACHE_BACKEND: file (default, shared by all workers on a host),
+# db (shared by every host; run `manage.py createcachetable` first) or
+# locmem (per process, so only for a single-process DEBUG server: other
+# workers would miss version bumps and serve stale stock).
+CATALOG_CACHE_ENABLED = os.environ.get('CATALOG_CACHE_ENABLED', 'True') == 'True'
+CATALOG_CACHE_ALIAS = 'catalog'
+CATALOG_CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'sweetshop-catalog',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('CATALOG_CACHE_LOCATION', str(BASE_DIR / '.cache' / 'catalog')),
+    },
+    'db': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'catalog_cache',
+    },
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    CATALOG_CACHE_ALIAS: {
+        **CATALOG_CACHE_BACKENDS[os.environ.get('CATALOG_CACHE_BACKEND', 'file')],
+        'TIMEOUT': int(os.environ.get('CATALOG_CACHE_TIMEOUT', 300)),
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+# Token clients that write are pinned to the primary through this cache.
+# It must be shared by every worker, like the catalog cache it reuses.
+REPLICA_PIN_CACHE_ALIAS = CATALOG_CACHE_ALIAS
+
+# Users' token versions (and the User rows behind get_request_user) are
+# cached here for AUTH_CACHE_TIMEOUT seconds. Revoking a token deletes the
+# entry, so the cache must be shared by every worker, like the catalog
+# cache it reuses; a per-process one would honor revoked tokens elsewhere.
+AUTH_CACHE_ALIAS = CATALOG_CACHE_ALIAS
+AUTH_CACHE_TIMEOUT = int(os.environ.get('AUTH_CACHE_TIMEOUT', 60))
+
+# Login and register hash passwords on a bounded pool (see shop/hashing.py):
+# WORKERS hashes run at once, QUEUE more may wait, the rest get a 503.
+PASSWORD_HASHING_WORKERS = int(os.environ.get('PASSWORD_HASHING_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+PASSWORD_HASHING_QUEUE = int(os.environ.get('PASSWORD_HASHING_QUEUE', 32))
+
+# Counter rows per sweet for units sold; more shards, less contention on bestsellers
+SALES_COUNTER_SHARDS = int(os.environ.get('SALES_COUNTER_SHARDS', 8))
+
+# How long a stock reservation holds its units before they return to sale
+RESERVATION_TTL_SECONDS = int(os.environ.get('RESERVATION_TTL_SECONDS', 600))
+
+# Per-request SQL and timing figures in a Server-Timing header, and a
+# warning on the shop.requests logger for requests slower than SLOW_REQUEST_MS
+REQUEST_TIMING_ENABLED = os.environ.get('REQUEST_TIMING_ENABLED', 'False') == 'True'
+SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', 500))
+
+# Prometheus metrics at /api/metrics/, for admins and for scrapers sending
+# "Authorization: Bearer <METRICS_TOKEN>". With several worker processes,
+# point METRICS_DIR at a directory they share (emptied on deploy): each
+# process writes its counts there every METRICS_FLUSH_SECONDS and a scrape
+# sums them. WEB_CONCURRENCY, the worker count gunicorn and uvicorn read,
+# is only used to warn when that directory is missing.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True') == 'True'
+METRICS_DIR = os.environ.get('METRICS_DIR') or None
+METRICS_FLUSH_SECONDS = float(os.environ.get('METRICS_FLUSH_SECONDS', 1))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', 1))
+
+# cProfile profiling of single requests (see shop.profiling): admins send an
+# X-Profile: 1 header, and every PROFILE_SAMPLE_EVERY-th request of each view
+# is profiled too (0 = never). The newest PROFILE_KEEP profiles stay in PROFILE_DIR.
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'False') == 'True'
+PROFILE_DIR = os.environ.get('PROFILE_DIR', str(BASE_DIR / 'profiles'))
+PROFILE_KEEP = int(os.environ.get('PROFILE_KEEP', 500))
+PROFILE_SAMPLE_EVERY = int(os.environ.get('PROFILE_SAMPLE_EVERY', 0))
+
+# Flash-sale purchases: orders written per batch, seconds a buyer waits in
+# the queue before a 503, and how often the in-memory stock budget is re-read
+FLASH_SALE_BATCH_SIZE = int(os.environ.get('FLASH_SALE_BATCH_SIZE', 500))
+FLASH_SALE_TIMEOUT = float(os.environ.get('FLASH_SALE_TIMEOUT', 10))
+FLASH_SALE_REFRESH_SECONDS = float(os.environ.get('FLASH_SALE_REFRESH_SECONDS', 2))
+
+# How long the response to a POST with an Idempotency-Key is replayed
+IDEMPOTENCY_KEY_TTL_SECONDS = int(os.environ.get('IDEMPOTENCY_KEY_TTL_SECONDS', 24 * 60 * 60))
+# How long a request holds its Idempotency-Key before a retry may take it
+# over; keep it a few seconds above the WSGI/ASGI server's worker timeout
+IDEMPOTENCY_LOCK_SECONDS = int(os.environ.get('IDEMPOTENCY_LOCK_SECONDS', 35))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -91,7 +240,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework Settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'shop.authentication.StatelessJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
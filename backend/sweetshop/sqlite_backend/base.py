@@ -0,0 +1,59 @@
+"""
+SQLite backend for the production database profile.
+
+Adds two OPTIONS that Django's own SQLite backend only understands from
+Django 5.1 on, with the same meaning:
+
+- ``init_command``: semicolon-separated statements (PRAGMAs) run on
+  every new connection, before Django uses it.
+- ``transaction_mode``: ``DEFERRED``, ``IMMEDIATE`` or ``EXCLUSIVE``,
+  used to open the transaction of every atomic() block.
+
+``IMMEDIATE`` takes the write lock when the transaction starts instead
+of at its first write. A deferred transaction that read first and then
+tries to write fails straight away with "database is locked" when
+another connection is writing, because SQLite cannot wait for the lock
+without risking a deadlock; an immediate one simply waits out
+busy_timeout like any other writer.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        options = self.settings_dict['OPTIONS']
+        self.init_command = options.get('init_command')
+        self.transaction_mode = options.get('transaction_mode')
+        if self.transaction_mode is not None:
+            self.transaction_mode = self.transaction_mode.upper()
+            if self.transaction_mode not in TRANSACTION_MODES:
+                raise ImproperlyConfigured(
+                    f"settings.DATABASES['{self.alias}']['OPTIONS']['transaction_mode'] is "
+                    f"{options['transaction_mode']!r}, but must be one of: {', '.join(TRANSACTION_MODES)}."
+                )
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        kwargs.pop('init_command', None)
+        kwargs.pop('transaction_mode', None)
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        if self.init_command:
+            for command in self.init_command.split(';'):
+                if command.strip():
+                    conn.execute(command)
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode is None:
+            super()._start_transaction_under_autocommit()
+        else:
+            self.cursor().execute(f'BEGIN {self.transaction_mode}')